@@ -1,252 +1,291 @@
 ### --- --- --- IMPORTS & SETUP
 import utils.extract_resume
-from langchain.chat_models import ChatOpenAI
+import utils.llm_client
 from langchain.prompts.chat import (
     ChatPromptTemplate,
     HumanMessagePromptTemplate,
     SystemMessagePromptTemplate,
 )
 import json
-    
 
-# ---------------------------- OBJECTIVE ------------------------------------------
-def create_objective_openai(current_objective, experience, skills):
-    model_name = "gpt-3.5-turbo-0613"
+MODEL_NAME = "gpt-3.5-turbo-0613"
 
-    chat = ChatOpenAI(model_name=model_name,
-                              temperature=0)
 
-    system_template = ("""Create what could be a resume's objective, using the following information. 
-    Let the objective be 3-5 sentences. Do not mention the word objective.""")
+def _chat_prompt(system_template, human_template):
+    return ChatPromptTemplate.from_messages(
+            [SystemMessagePromptTemplate.from_template(system_template),
+             HumanMessagePromptTemplate.from_template(human_template)]
+        )
 
-    system_message_prompt = SystemMessagePromptTemplate.from_template(
-            system_template)
 
-    human_template = """Current Objective: {current_objective}
+# ---------------------------- OBJECTIVE ------------------------------------------
+objective_prompt = _chat_prompt(
+    system_template="""Create what could be a resume's objective, using the following information.
+    Let the objective be 3-5 sentences. Do not mention the word objective.""",
+    human_template="""Current Objective: {current_objective}
 Experience: {experience}
-Skills: {skills}"""
+Skills: {skills}""")
 
-    human_message_prompt = HumanMessagePromptTemplate.from_template(
-            human_template)
-    
-    chat_prompt = ChatPromptTemplate.from_messages(
-            [system_message_prompt, human_message_prompt]
-        )
 
+def create_objective_openai(current_objective, experience, skills):
     # get a chat completion from the formatted messages
-    response = chat(
-            chat_prompt.format_prompt(
-                current_objective=current_objective,
-                experience=experience,
-                skills=skills
-            ).to_messages()
+    return utils.llm_client.complete(
+            "objective", objective_prompt, MODEL_NAME, temperature=0,
+            current_objective=current_objective,
+            experience=experience,
+            skills=skills
         )
 
-    return response.content
-
-# ---------------------------- WORK EXPERIENCE ------------------------------------------
 
-def create_job_summary_openai(current_job, skills):
-    model_name = "gpt-3.5-turbo-0613"
+async def acreate_objective_openai(current_objective, experience, skills):
+    return await utils.llm_client.acomplete(
+            "objective", objective_prompt, MODEL_NAME, temperature=0,
+            current_objective=current_objective,
+            experience=experience,
+            skills=skills
+        )
 
-    chat = ChatOpenAI(model_name=model_name,
-                              temperature=0)
 
-    system_template = ("""Create a 2-3 line work experience summary using the following information:""")
+def astream_objective_openai(current_objective, experience, skills):
+    """Streams the enhanced objective: an async iterator of its text as the model generates it."""
+    return utils.llm_client.astream(
+            "objective", objective_prompt, MODEL_NAME, temperature=0,
+            current_objective=current_objective,
+            experience=experience,
+            skills=skills
+        )
 
-    system_message_prompt = SystemMessagePromptTemplate.from_template(
-            system_template)
+# ---------------------------- WORK EXPERIENCE ------------------------------------------
 
-    human_template = """Current Job summary : {job_summary}
+job_summary_prompt = _chat_prompt(
+    system_template="""Create a 2-3 line work experience summary using the following information:""",
+    human_template="""Current Job summary : {job_summary}
 Current Job title: {job_title}
-Skills: {skills}"""
-
-    human_message_prompt = HumanMessagePromptTemplate.from_template(
-            human_template)
-    
-    chat_prompt = ChatPromptTemplate.from_messages(
-            [system_message_prompt, human_message_prompt]
-        )       
-    
+Skills: {skills}""")
+
+
+def create_job_summary_openai(current_job, skills):
     # get a chat completion from the formatted messages
-    response = chat(
-                chat_prompt.format_prompt(
-                        job_summary=current_job.job_summary,
-                        job_title=current_job.job_title,
-                        skills=skills
-                        ).to_messages()
-                )
-    return response.content
+    return utils.llm_client.complete(
+            "job_summary", job_summary_prompt, MODEL_NAME, temperature=0,
+            job_summary=current_job.job_summary,
+            job_title=current_job.job_title,
+            skills=skills
+        )
 
-# ---------------------------- PROJECT EXPERIENCE ------------------------------------------
 
-# project_experience (including project_name, project_description),
+async def acreate_job_summary_openai(current_job, skills):
+    return await utils.llm_client.acomplete(
+            "job_summary", job_summary_prompt, MODEL_NAME, temperature=0,
+            job_summary=current_job.job_summary,
+            job_title=current_job.job_title,
+            skills=skills
+        )
 
-# Generate project_description for each project in project_experience, using current project_name and project_description.
-def create_project_description_openai(project_name, project_description, skills):
-    model_name = "gpt-3.5-turbo-0613"
+job_summaries_batch_prompt = _chat_prompt(
+    system_template="""Create a 2-3 line work experience summary for each numbered work experience below, using its current job title and summary and the listed skills.
+    Return a JSON object with a "summaries" list containing one entry per work experience, keyed by its number.
+    output_format:
+    {{
+    "summaries": [
+    {{"index": 0, "summary": "summary for work experience 0"}},
+    {{"index": 1, "summary": "summary for work experience 1"}}
+    ]
+    }}""",
+    human_template="""Skills: {skills}
+Work experiences:
+{experiences}""")
+
+
+def format_job_batch(experiences):
+    # Number each experience so the batched response can be matched back by index
+    return "\n\n".join(
+        f"[{i}] Current Job title: {exp.job_title}\nCurrent Job summary : {exp.job_summary}"
+        for i, exp in enumerate(experiences))
+
+
+def create_job_summaries_batch_openai(experiences, skills):
+    """Enhances every work experience in one call; experiences is the text from format_job_batch()."""
+    return utils.llm_client.complete(
+            "job_summaries_batch", job_summaries_batch_prompt, MODEL_NAME, temperature=0,
+            experiences=experiences,
+            skills=skills
+        )
 
-    chat = ChatOpenAI(model_name=model_name,
-                      temperature=0)
 
-    system_template = (
-        """Create 1 line project description using the following information""")
+async def acreate_job_summaries_batch_openai(experiences, skills):
+    return await utils.llm_client.acomplete(
+            "job_summaries_batch", job_summaries_batch_prompt, MODEL_NAME, temperature=0,
+            experiences=experiences,
+            skills=skills
+        )
 
-    system_message_prompt = SystemMessagePromptTemplate.from_template(
-        system_template)
+# ---------------------------- PROJECT EXPERIENCE ------------------------------------------
 
-    human_template = """Current Project description : {project_description}
+# project_experience (including project_name, project_description),
+
+project_description_prompt = _chat_prompt(
+    system_template="""Create 1 line project description using the following information""",
+    human_template="""Current Project description : {project_description}
 Current Project name: {project_name}
-Skills: {skills}"""
+Skills: {skills}""")
 
-    human_message_prompt = HumanMessagePromptTemplate.from_template(
-        human_template)
 
-    chat_prompt = ChatPromptTemplate.from_messages(
-        [system_message_prompt, human_message_prompt]
+# Generate project_description for each project in project_experience, using current project_name and project_description.
+def create_project_description_openai(project_name, project_description, skills):
+    # get a chat completion from the formatted messages
+    return utils.llm_client.complete(
+        "project_description", project_description_prompt, MODEL_NAME, temperature=0,
+        project_description=project_description,
+        project_name=project_name,
+        skills=skills
     )
 
-    # get a chat completion from the formatted messages
-    response = chat(
-        chat_prompt.format_prompt(
 
-            project_description=project_description,
-            project_name=project_name,
-            skills=skills
-        ).to_messages()
+async def acreate_project_description_openai(project_name, project_description, skills):
+    return await utils.llm_client.acomplete(
+        "project_description", project_description_prompt, MODEL_NAME, temperature=0,
+        project_description=project_description,
+        project_name=project_name,
+        skills=skills
     )
-    return response.content
 
 
-# Create two project experiences, if project_experience is empty, create new project_experience
-def create_full_project_experience_openai(skills):
-    model_name = "gpt-3.5-turbo-0613"
+project_descriptions_batch_prompt = _chat_prompt(
+    system_template="""Create 1 line project description for each numbered project below, using its current project name and description and the listed skills.
+    Return a JSON object with a "summaries" list containing one entry per project, keyed by its number.
+    output_format:
+    {{
+    "summaries": [
+    {{"index": 0, "summary": "description for project 0"}},
+    {{"index": 1, "summary": "description for project 1"}}
+    ]
+    }}""",
+    human_template="""Skills: {skills}
+Projects:
+{projects}""")
+
+
+def format_project_batch(projects):
+    return "\n\n".join(
+        f"[{i}] Current Project name: {project.project_name}\nCurrent Project description : {project.project_description}"
+        for i, project in enumerate(projects))
+
+
+def create_project_descriptions_batch_openai(projects, skills):
+    """Enhances every project in one call; projects is the text from format_project_batch()."""
+    return utils.llm_client.complete(
+        "project_descriptions_batch", project_descriptions_batch_prompt, MODEL_NAME, temperature=0,
+        projects=projects,
+        skills=skills
+    )
 
-    chat = ChatOpenAI(model_name=model_name,
-                      temperature=0)
 
-    # project_experience (including project_name, project_description),
-    system_template = ("""Create two "project_experience" using the following information. "project_experience" is list of dict, each dict having keys "project_name" and "project_description".env
-output_format : 
-{{                       
-"project_experience":{{      
+async def acreate_project_descriptions_batch_openai(projects, skills):
+    return await utils.llm_client.acomplete(
+        "project_descriptions_batch", project_descriptions_batch_prompt, MODEL_NAME, temperature=0,
+        projects=projects,
+        skills=skills
+    )
+
+
+# project_experience (including project_name, project_description),
+full_project_experience_prompt = _chat_prompt(
+    system_template="""Create two "project_experience" using the following information. "project_experience" is list of dict, each dict having keys "project_name" and "project_description".env
+output_format :
+{{
+"project_experience":{{
 [
 {{
-    "project_name": "project_name_1",    
-    "project_description": "project_description_1"                       
+    "project_name": "project_name_1",
+    "project_description": "project_description_1"
 }},
 {{
 "project_name": "project_name_2",
 "project_description": "project_description_2"
 }}
 ]}}
-}}""")
-
-    system_message_prompt = SystemMessagePromptTemplate.from_template(
-        system_template)
-
-    human_template = """Skills: {skills}"""
-
-    human_message_prompt = HumanMessagePromptTemplate.from_template(
-        human_template)
+}}""",
+    human_template="""Skills: {skills}""")
 
-    chat_prompt = ChatPromptTemplate.from_messages(
-        [system_message_prompt, human_message_prompt]
-    )
 
+# Create two project experiences, if project_experience is empty, create new project_experience
+def create_full_project_experience_openai(skills):
     # get a chat completion from the formatted messages
-    response = chat(
-        chat_prompt.format_prompt(
-            skills=skills
-        ).to_messages()
+    return utils.llm_client.complete(
+        "full_project_experience", full_project_experience_prompt, MODEL_NAME, temperature=0,
+        skills=skills
     )
-    return response.content
 
 
+async def acreate_full_project_experience_openai(skills):
+    return await utils.llm_client.acomplete(
+        "full_project_experience", full_project_experience_prompt, MODEL_NAME, temperature=0,
+        skills=skills
+    )
 
-# ---------------------------- SKILLS ------------------------------------------
 
-def create_full_skills_openai(experience, projects):
-    model_name = "gpt-3.5-turbo-0613"
-
-    chat = ChatOpenAI(model_name=model_name,
-                      temperature=0)
-
-    system_template = (
-        """Create skills that could help a person get more engaging jobs. 
-        The output format should be a dict with the key "skills", and values provided in a list containing the skills you've generated.
-        Please do not start each skill with the same word, we were having issues with 'enhanced' being mentioned at the start, which we don't want.
-        output_format:
-        {{
-        "skills": [
-        "enhanced skill goes here",
-        "another enhanced skill",
-        ... # and so on
-        ]
-        }}"""
-    )
 
-    system_message_prompt = SystemMessagePromptTemplate.from_template(
-        system_template)
+# ---------------------------- SKILLS ------------------------------------------
 
-    human_template = """Work experiences: {experience}
-                        Project history: {projects}"""
+full_skills_prompt = _chat_prompt(
+    system_template="""Create skills that could help a person get more engaging jobs.
+    The output format should be a dict with the key "skills", and values provided in a list containing the skills you've generated.
+    Please do not start each skill with the same word, we were having issues with 'enhanced' being mentioned at the start, which we don't want.
+    output_format:
+    {{
+    "skills": [
+    "enhanced skill goes here",
+    "another enhanced skill",
+    ... # and so on
+    ]
+    }}""",
+    human_template="""Work experiences: {experience}
+                    Project history: {projects}""")
 
-    human_message_prompt = HumanMessagePromptTemplate.from_template(
-        human_template)
-    
-    chat_prompt = ChatPromptTemplate.from_messages(
-        [system_message_prompt, human_message_prompt]
-    )
 
+def create_full_skills_openai(experience, projects):
     # get a chat completion from the formatted messages
-    response = chat(
-        chat_prompt.format_prompt(
-            experience=experience,
-            projects=projects
-        ).to_messages()
+    return utils.llm_client.complete(
+        "full_skills", full_skills_prompt, MODEL_NAME, temperature=0,
+        experience=experience,
+        projects=projects
     )
 
-    return response.content
 
-def generate_enhanced_skills_openai(skills):
-    model_name = "gpt-3.5-turbo-0613"
-
-    chat = ChatOpenAI(model_name=model_name,
-                      temperature=0)
-
-    system_template = (
-        """Enhance and generate a few more skills that could help a person get more engaging jobs. 
-        The output format should be a dict with the key "skills", and values provided in a list containing the skills you've generated.
-        Please do not start each skill with the same word, we were having issues with 'enhanced' being mentioned at the start, which we don't want.
-        output_format:
-        {{
-        "skills": [
-        "enhanced skill goes here",
-        "another enhanced skill",
-        ... # and so on
-        ]
-        }}"""
+async def acreate_full_skills_openai(experience, projects):
+    return await utils.llm_client.acomplete(
+        "full_skills", full_skills_prompt, MODEL_NAME, temperature=0,
+        experience=experience,
+        projects=projects
     )
 
-    system_message_prompt = SystemMessagePromptTemplate.from_template(
-        system_template)
 
-    human_template = """Skills to reference and enhance: {skills}"""
+enhanced_skills_prompt = _chat_prompt(
+    system_template="""Enhance and generate a few more skills that could help a person get more engaging jobs.
+    The output format should be a dict with the key "skills", and values provided in a list containing the skills you've generated.
+    Please do not start each skill with the same word, we were having issues with 'enhanced' being mentioned at the start, which we don't want.
+    output_format:
+    {{
+    "skills": [
+    "enhanced skill goes here",
+    "another enhanced skill",
+    ... # and so on
+    ]
+    }}""",
+    human_template="""Skills to reference and enhance: {skills}""")
 
-    human_message_prompt = HumanMessagePromptTemplate.from_template(
-        human_template)
-    
-    chat_prompt = ChatPromptTemplate.from_messages(
-        [system_message_prompt, human_message_prompt]
-    )
 
+def generate_enhanced_skills_openai(skills):
     # get a chat completion from the formatted messages
-    response = chat(
-        chat_prompt.format_prompt(
-            skills=skills
-        ).to_messages()
+    return utils.llm_client.complete(
+        "enhanced_skills", enhanced_skills_prompt, MODEL_NAME, temperature=0,
+        skills=skills
     )
 
-    return response.content    
 
+async def agenerate_enhanced_skills_openai(skills):
+    return await utils.llm_client.acomplete(
+        "enhanced_skills", enhanced_skills_prompt, MODEL_NAME, temperature=0,
+        skills=skills
+    )
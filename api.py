@@ -1,18 +1,34 @@
 import utils.utils_file
 import utils.extract_resume
+import utils.llm_client
+import utils.pre_extract
+import utils.pdf_pool
+import utils.upload_limit
+import utils.session_store
+import utils.job_queue
+import utils.batch_ingest
+import utils.rate_limit
+import utils.circuit_breaker
 from utils.dataclass import ResumeText, ResumeModel, BasicInfoModel, WorkExperienceModel, EducationModel, ProjectExperienceModel
 from utils.mirror_class import Resume
+import asyncio
 import json
 import tiktoken
 import openai 
 from dotenv import load_dotenv
 import os
 import logging
-import shutil
 import json
+import shutil
+import uuid
+import re
+from typing import List, Literal, Optional
 
-from fastapi import FastAPI, Request, UploadFile
+from fastapi import FastAPI, Header, HTTPException, Request, Response, UploadFile
+from starlette.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from pydantic import ValidationError
 
 from functions import *
 
@@ -32,6 +48,19 @@ origins = [
     "*",
 ]
 
+# Largest accepted /upload-file/ body
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(10 * 1024 * 1024)))
+app.add_middleware(utils.upload_limit.MaxBodySizeMiddleware, max_bytes=UPLOAD_MAX_BYTES, paths=["/upload-file/"])
+# Largest accepted /batch/ingest/ body (all of its files together)
+BATCH_UPLOAD_MAX_BYTES = int(os.getenv("BATCH_UPLOAD_MAX_BYTES", str(500 * 1024 * 1024)))
+app.add_middleware(utils.upload_limit.MaxBodySizeMiddleware, max_bytes=BATCH_UPLOAD_MAX_BYTES, paths=["/batch/ingest/"])
+
+# Uploads answer with the session's id in this header, and later requests pass it back to work on that resume
+SESSION_HEADER = "X-Session-Id"
+# The ids SessionStore.create() issues (uuid4 hex); anything else is refused with a 422. Only the uploads create sessions
+# (when sent without an id), so a well-formed id the store doesn't know is answered with a 404 everywhere
+SESSION_ID_PATTERN = r"^[0-9a-f]{32}$"
+
 # allow access with cors
 app.add_middleware(
     CORSMiddleware,
@@ -39,8 +68,24 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[SESSION_HEADER],
 )
 
+@app.on_event("startup")
+def _startup():
+    job_workers.start()
+
+@app.on_event("shutdown")
+def _shutdown():
+    job_workers.stop()
+    utils.pdf_pool.shutdown()
+
+# While the LLM circuit breaker is open, requests that need the LLM (and have no cached reply) fail fast with a 503
+@app.exception_handler(utils.circuit_breaker.CircuitOpenError)
+def _circuit_open(request: Request, e: utils.circuit_breaker.CircuitOpenError):
+    return JSONResponse(status_code=503, content={'status': 'unavailable', 'detail': str(e)},
+                        headers={'Retry-After': str(max(1, round(e.retry_after)))})
+
 logging.basicConfig(
     filename='app.log',
     level=logging.DEBUG,
@@ -49,64 +94,194 @@ logging.basicConfig(
 )
 
 # API Methods:
-## All enhance methods take the latest version of the resume from the front end, and enhance the requested portion
+## All enhance methods take the latest version of the resume from the front end, and enhance the requested portion.
+## With a session id the body can be left out to enhance the session's stored resume, and the enhanced portion is saved back to it
 @app.post('/enhance-objective/')
-def _enhance_objective(resume: Resume):
+async def _enhance_objective(resume: Optional[Resume] = None, session_id: Optional[str] = Header(None, alias=SESSION_HEADER, pattern=SESSION_ID_PATTERN)):
     # Get localised resume model, then enhance
-    resume_model = parse_resume(resume)
-    enhance_objective(resume_model)
+    resume_model = await run_in_threadpool(request_resume, resume, session_id)
+    await aenhance_objective(resume_model)
+    await save_to_session(session_id, resume_model, 'objective')
     return {'status': 'success',
             'response': resume_model.model_dump()['objective']}
 
 @app.post('/enhance-experience/')
-def _enhance_experience(resume: Resume):
-    # Get localised resume model, then enhance
-    resume_model = parse_resume(resume)
-    enhance_experience(resume_model)
+async def _enhance_experience(resume: Optional[Resume] = None, mode: Optional[Literal['per_item', 'batch']] = None,
+                              session_id: Optional[str] = Header(None, alias=SESSION_HEADER, pattern=SESSION_ID_PATTERN)):
+    # Get localised resume model, then enhance (mode picks per-item or batched LLM calls, default from ENHANCE_MODE)
+    resume_model = await run_in_threadpool(request_resume, resume, session_id)
+    await aenhance_experience(resume_model, mode, session_memo(session_id))
+    await save_to_session(session_id, resume_model, 'work_experience')
     # Revert to OpenResume's resume model for work experiences
-    work_experiences = resume_model.model_dump()['work_experience']
-    f_work_experiences = [{
-        'company': exp["company"],
-        'jobTitle': exp["job_title"],
-        'date': exp["duration"],
-        'descriptions': exp["job_summary"].split('\n'),
-    } for exp in work_experiences]
     return {'status': 'success',
-            'response': f_work_experiences}
+            'response': format_work_experiences(resume_model)}
 
 @app.post('/enhance-projects/')
-def _enhance_project(resume: Resume):
-    # Get localised resume model, then enhance
-    resume_model = parse_resume(resume)
-    enhance_project(resume_model)
+async def _enhance_project(resume: Optional[Resume] = None, mode: Optional[Literal['per_item', 'batch']] = None,
+                           session_id: Optional[str] = Header(None, alias=SESSION_HEADER, pattern=SESSION_ID_PATTERN)):
+    # Get localised resume model, then enhance (mode picks per-item or batched LLM calls, default from ENHANCE_MODE)
+    resume_model = await run_in_threadpool(request_resume, resume, session_id)
+    await aenhance_project(resume_model, mode, session_memo(session_id))
+    await save_to_session(session_id, resume_model, 'project_experience')
     # Revert to OpenResume's resume model for projects
-    projects = resume_model.model_dump()['project_experience']
-    f_projects = [{
-        'project': proj["project_name"],
-        'date': "Add Date",
-        'descriptions': proj["project_description"].split('\n'),
-    } for proj in projects]
     return {'status': 'success',
-            'response': f_projects}
+            'response': format_projects(resume_model, date="Add Date")}
 
 @app.post('/enhance-skills')
-def _enhance_skills(resume: Resume):
+async def _enhance_skills(resume: Optional[Resume] = None, session_id: Optional[str] = Header(None, alias=SESSION_HEADER, pattern=SESSION_ID_PATTERN)):
     # Get localised resume model, then enhance
-    resume_model = parse_resume(resume)
-    enhance_skills(resume_model)
+    resume_model = await run_in_threadpool(request_resume, resume, session_id)
+    await aenhance_skills(resume_model, session_memo(session_id))
+    await save_to_session(session_id, resume_model, 'skills')
+    return {'status': 'success',
+            'response': format_enhanced_skills(resume_model)}
+
+# Parses the resume once and enhances every section in one request: experience, projects and skills concurrently,
+# then the objective from the enhanced skills (see functions.ENHANCE_STAGES). Returns the whole resume in OpenResume's
+# format with the enhanced sections, plus each stage's start offset, duration and status in seconds
+@app.post('/enhance-all/')
+async def _enhance_all(resume: Optional[Resume] = None, mode: Optional[Literal['per_item', 'batch']] = None,
+                       session_id: Optional[str] = Header(None, alias=SESSION_HEADER, pattern=SESSION_ID_PATTERN)):
+    resume_model = await run_in_threadpool(request_resume, resume, session_id)
+    resume_model, timings = await aenhance_all(resume_model, mode, session_memo(session_id))
+    if all(timings[stage]['status'] == 'unavailable' for stage in ENHANCE_STAGES):
+        raise utils.circuit_breaker.CircuitOpenError(utils.circuit_breaker.LLM_BREAKER_OPEN_SECONDS)
+    await save_to_session(session_id, resume_model, 'objective', 'work_experience', 'project_experience', 'skills')
+    open_resume_model = get_resume(resume_model)
+    open_resume_model['skills']['descriptions'] = format_enhanced_skills(resume_model)
+    return {'status': 'success',
+            'response': open_resume_model,
+            'timings': timings}
+
+## Streaming versions of the enhance endpoints, as Server-Sent Events: the objective arrives as "token" events while it's
+## generated, experiences and projects as one "item" event each ({index, item}) as soon as that item is enhanced.
+## Every stream ends with a "done" event holding the same body as the non-streaming endpoint (or an "error" event)
+@app.post('/enhance-objective/stream')
+async def _stream_objective(resume: Optional[Resume] = None, session_id: Optional[str] = Header(None, alias=SESSION_HEADER, pattern=SESSION_ID_PATTERN)):
+    resume_model = await run_in_threadpool(request_resume, resume, session_id)
+
+    async def events():
+        async for chunk in astream_objective(resume_model):
+            yield sse_event('token', {'token': chunk})
+        await save_to_session(session_id, resume_model, 'objective')
+        yield sse_event('done', {'status': 'success', 'response': resume_model.objective})
+    return event_stream(events())
+
+@app.post('/enhance-experience/stream')
+async def _stream_experience(resume: Optional[Resume] = None, session_id: Optional[str] = Header(None, alias=SESSION_HEADER, pattern=SESSION_ID_PATTERN)):
+    resume_model = await run_in_threadpool(request_resume, resume, session_id)
+
+    async def events():
+        async for index, experience in astream_experience(resume_model, session_memo(session_id)):
+            yield sse_event('item', {'index': index, 'item': format_work_experience(experience)})
+        await save_to_session(session_id, resume_model, 'work_experience')
+        yield sse_event('done', {'status': 'success', 'response': format_work_experiences(resume_model)})
+    return event_stream(events())
+
+@app.post('/enhance-projects/stream')
+async def _stream_projects(resume: Optional[Resume] = None, session_id: Optional[str] = Header(None, alias=SESSION_HEADER, pattern=SESSION_ID_PATTERN)):
+    resume_model = await run_in_threadpool(request_resume, resume, session_id)
+
+    async def events():
+        async for index, project in astream_project(resume_model, session_memo(session_id)):
+            yield sse_event('item', {'index': index, 'item': format_project(project, date="Add Date")})
+        await save_to_session(session_id, resume_model, 'project_experience')
+        yield sse_event('done', {'status': 'success', 'response': format_projects(resume_model, date="Add Date")})
+    return event_stream(events())
+
+def sse_event(event: str, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def event_stream(events):
+    async def guarded():
+        # The response has already started, so a failure can only be reported as a last event
+        try:
+            async for event in events:
+                yield event
+        except utils.circuit_breaker.CircuitOpenError as e:
+            yield sse_event('error', {'status': 'unavailable', 'detail': str(e), 'retry_after': max(1, round(e.retry_after))})
+        except Exception as e:
+            logging.exception("Streaming enhancement failed")
+            yield sse_event('error', {'status': 'error', 'detail': str(e)})
+    # no-cache and X-Accel-Buffering stop proxies from holding the events back until the end
+    return StreamingResponse(guarded(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# OpenResume formatting of the enhanced sections, shared by the enhance endpoints and get_resume()
+def format_work_experiences(resume_model):
+    return [format_work_experience(exp) for exp in resume_model.model_dump()['work_experience']]
+
+def format_work_experience(exp: dict):
+    return {
+        'company': exp["company"],
+        'jobTitle': exp["job_title"],
+        'date': exp["duration"],
+        'descriptions': exp["job_summary"].split('\n'),
+    }
+
+def format_projects(resume_model, date=""):
+    # model_dump() also covers generated projects, which enhance_project() stores as plain dicts
+    return [format_project(proj, date) for proj in resume_model.model_dump(warnings=False)['project_experience']]
+
+def format_project(proj: dict, date=""):
+    return {
+        'project': proj["project_name"],
+        'date': date, # TODO: projects have no date in the localised model
+        'descriptions': proj["project_description"].split('\n'),
+    }
+
+def format_enhanced_skills(resume_model):
     # Try to clear the enhanced skills to remove repeated starting word ('enhanced'), and format, else return as is
     enhanced_skills = resume_model.model_dump()['skills']
     try:
-        if len({skill.split()[0] for skill in skills}) == 1:
+        if len(enhanced_skills) > 1 and len({skill.split()[0] for skill in enhanced_skills}) == 1:
             skills = [' '.join(skill.split()[1:]) for skill in enhanced_skills]
             skills = [skill + '.'  if not skill.endswith('.') else skill for skill in skills]
-            skills = [skill[0].upper() + skill[1:] for skill in skills]
-        return {'status': 'success',
-                'response': skills}
+            return [skill[0].upper() + skill[1:] for skill in skills]
     except Exception as e:
-        return {'status': 'success',
-                'response': resume_model.model_dump()['skills']}
+        pass
+    return enhanced_skills
     
+# The resume a request works on: the posted one (which becomes the session's latest version), else the session's stored one
+def request_resume(resume: Optional[Resume], session_id: Optional[str]):
+    if resume is not None:
+        resume_model = parse_resume(resume)
+        if session_id:
+            replace_session_resume(session_id, resume_model)
+        return resume_model
+    if not session_id:
+        raise HTTPException(status_code=400, detail=f"Post a resume or pass a session id in the {SESSION_HEADER} header")
+    return session_resume(session_id)
+
+def session_resume(session_id: Optional[str]):
+    resume_model = utils.session_store.sessions.get(session_id) if session_id else None
+    if resume_model is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired session")
+    return resume_model
+
+def replace_session_resume(session_id: str, resume_model):
+    if utils.session_store.sessions.replace(session_id, resume_model) is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired session")
+
+# Uploads check the session they were given before extracting, rather than failing once the LLM has answered
+def check_session(session_id: Optional[str]):
+    if session_id:
+        session_resume(session_id)
+
+# Within a session, items unchanged since they were last enhanced are answered from the session's memo instead of the LLM
+def session_memo(session_id: Optional[str]):
+    return utils.session_store.sessions.memo(session_id) if session_id else None
+
+# Write enhanced portions back onto the session's latest resume (re-applied if another request saved it meanwhile)
+async def save_to_session(session_id: Optional[str], resume_model, *fields: str):
+    if session_id:
+        values = {field: getattr(resume_model, field) for field in fields}
+
+        def apply(stored):
+            for field, value in values.items():
+                setattr(stored, field, value)
+        await run_in_threadpool(utils.session_store.sessions.update, session_id, apply)
+
 # Function to get localised resume model from OpenResume's resume model
 def parse_resume(resume: Resume):
     resume_dict = resume.model_dump()
@@ -153,226 +328,175 @@ def parse_resume(resume: Resume):
     return resume_model
 
 
-# Currently Defunct
+# Replace the session's resume with the front end's latest version
 @app.post('/update/')
-def _update_resume(resume: Resume):
-    try:
-        print(resume)
-        resume_dict = resume.model_dump()
-        resume_model.basic_info = BasicInfoModel(
-            first_name = resume_dict['profile']['name'].split()[0],
-            last_name = resume_dict['profile']['name'].split()[-1],
-            full_name = resume_dict['profile']['name'],
-            email = resume_dict['profile']['email'],
-            phone_number = resume_dict['profile']['phone'],
-            location = resume_dict['profile']['location'],
-            portfolio_website_url = resume_dict['profile']['url'],
-            linkedin_url = "",
-            github_main_page_url = ""
-        )
-        resume_model.objective = resume_dict['profile']['summary']
-        resume_model.work_experience = [WorkExperienceModel(
-                job_title = work_experience['jobTitle'],
-                company = work_experience['company'],
-                location = "",
-                duration = work_experience['date'],
-                job_summary = '. '.join(work_experience['descriptions']),
-            ) for work_experience in resume_dict['workExperiences']]
-        resume_model.education = [EducationModel(
-                university = education['school'],
-                education_level = education['degree'],
-                graduation_year = education['date'].split()[-1],
-                graduation_month = education['date'].split()[0],
-                majors = '. '.join(education['descriptions']),
-                GPA = education['gpa'],
-            ) for education in resume_dict['educations']]
-        resume_model.project_experience = [ProjectExperienceModel(
-                project_name = project['project'],
-                project_description = '. '.join(project['descriptions'])
-            ) for project in resume_dict['projects']],
-        resume_model.skills = resume_dict['skills']
-        print(resume_model)
-        return "Success(?!?)"
-    except Exception as e:
-        return {e}
-
-# OpenAI may not completely respond as desired, 
-# Solutions so far being:   casting as the correct types, 
-#                           or extracting the useful information 
-#                           or leaving blank
-def correct_response(res: dict):
-    if not isinstance(res['basic_info'], dict):
-        print("-- Issue: with how basic_info was formed by ai function")
-        print("Before:", res['basic_info'])
-        res['basic_info'] = {
-            'first_name': "",
-            'last_name': "",
-            'full_name': "",
-            'email': "",
-            'phone_number': "",
-            'location': "",
-            'portfolio_website_url': "",
-            'linkedin_url': "",
-            'github_main_page_url': "",
-        }
-        print("Now:", res['basic_info'])
-    if not isinstance(res['objective'], str):
-        print("-- Issue: with how objective was formed by ai function")
-        print("Before:", res['objective'])
-        if isinstance(res['objective'], dict) and res['objective'].keys():
-            res['objective'] = res['objective'][list(res['objective'].keys())[0]]
-        else:
-            res['objective'] = str(res['objective'])
-        print("Now:", res['objective'])
-    if not isinstance(res['work_experience'], list):
-        print("-- Issue: with how work_experience was formed by ai function")
-        print("Before:", res['work_experience'])
-        res['work_experience'] = [{
-            'job_title': "",
-            'company': "",
-            'location': "",
-            'duration': "",
-            'job_summary': "",
-        }]
-        print("Now:", res['work_experience'])
-    else:
-        for i, work in enumerate(res['work_experience']):
-            if not isinstance(work, dict):
-                print("--- Issue:", res['work_experience'][i])
-                res['work_experience'][i] = {
-                    'job_title': "",
-                    'company': "",
-                    'location': "",
-                    'duration': "",
-                    'job_summary': "",
-                }
-    if not isinstance(res['education'], list):
-        print("-- Issue: with how education was formed by ai function")
-        print("Before:", res['education'])
-        res['education'] = [{
-            'university': "",
-            'education_level': "",
-            'graduation_year': "",
-            'graduation_month': "",
-            'majors': "",
-            'GPA': "",
-        }]
-        print("Now:", res['education'])
-    else:
-        for i, edu in enumerate(res['education']):
-            if not isinstance(edu, dict):
-                print("--- Issue:", res['education'][i])
-                res['education'][i] = {
-                    'university': "",
-                    'education_level': "",
-                    'graduation_year': "",
-                    'graduation_month': "",
-                    'majors': "",
-                    'GPA': "",
-                }
-    if not isinstance(res['project_experience'], list):
-        print("-- Issue: with how project_experience was formed by ai function")
-        print("Before:", res['project_experience'])
-        res['project_experience'] = [{
-            'project_name': "",
-            'project_description': "",
-        }]
-        print("Now:", res['project_experience'])
-    else:
-        for i, project in enumerate(res['project_experience']):
-            if not isinstance(project, dict):
-                print("--- Issue:", res['project_experience'][i])
-                res['project_experience'][i] = {
-                    'project_name': "",
-                    'project_description': "",
-                }
-    if not isinstance(res['skills'], list):
-        print("-- Issue: with how skills was formed by ai function")
-        print("Before:", res['skills'])
-        if isinstance(res['skills'], dict):
-            skills = []
-            for key in res['skills']:
-                if isinstance(res['skills'][key], list):
-                    skills.extend(res['skills'][key])
-                else:
-                    skills.append(str(res['skills'][key]))
-            res['skills'] = skills
-        else:
-            res['skills'] = [""]
-        print("Now:", res['skills'])
-
+def _update_resume(resume: Resume, session_id: Optional[str] = Header(None, alias=SESSION_HEADER, pattern=SESSION_ID_PATTERN)):
+    if not session_id:
+        raise HTTPException(status_code=404, detail="Unknown or expired session")
+    replace_session_resume(session_id, parse_resume(resume))
+    return {'status': 'success'}
 
 # Takes raw text extracted from the docx/pdf in the front end, and parses with AI, then returns resume in OpenResume's format
 # Used for the initial parsing
+# The parsed resume is stored as a session (replacing the resume of the one in the X-Session-Id header, else in a new one),
+# whose id is sent back in the header
 @app.post("/upload-text/")
-def _upload_text_only(resume_text: ResumeText):
-    text = utils.utils_file.process_clean_text(resume_text.text)
-
-    # Use OpenAI to extract the data
-    response = utils.extract_resume.extract_data_new(text)
-    print(response)
-    correct_response(response)
-
-    # catching mistypes attributes and casting them to the correct type
-    # if not isinstance(ans['work_experience'], list):
-    #     print("-- Issue: with how work_experience was formed by ai function")
-    #     ans['work_experience'] = [ans['work_experience']]
-    # if not isinstance(ans['education'], list):
-    #     print("-- Issue: with how education was formed by ai function")
-    #     ans['education'] = [ans['education']]
-    # if not isinstance(ans['project_experience'], list):
-    #     print("-- Issue: with how project_experience was formed by ai function")
-    #     ans['project_experience'] = [ans['project_experience']]
-    # if not isinstance(ans['skills'], list):
-    #     print("-- Issue: with how skills was formed by ai function")
-    #     ans['skills'] = [ans['skills']]
-    #NOTE: Is this a #TODO? Lol,: If any field of ans is empty, replace it with "" according to the ResumeModel; may Allah laugh with me
-    # Turn it into a localized resume model
-    if not response:
+def _upload_text_only(resume_text: ResumeText, response: Response, session_id: Optional[str] = Header(None, alias=SESSION_HEADER, pattern=SESSION_ID_PATTERN)):
+    check_session(session_id)
+    resume_model = utils.extract_resume.extract_raw_text(resume_text.text)
+    if resume_model is None:
         print("Failed to get a valid response with 3 attempts")
         return None
-    resume_model = ResumeModel(**response)
     print(resume_model)
-    # Updating resume_model on disk (not necessary for basic front end functionlity, but maybe for testing inshaAllah
-    # for key in resume_model.model_dump().keys():
-    #     setattr(resume_model, key, getattr(new_resume_model, key))
+    store_upload(response, session_id, resume_model)
     # Revert it to OpenResume's resume model and return
     return get_resume(resume_model)
 
+def store_upload(response: Response, session_id: Optional[str], resume_model):
+    stored_id = store_resume(session_id, resume_model)
+    if stored_id is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired session")
+    response.headers[SESSION_HEADER] = stored_id
+
+# Saves the resume to the given session, or a new one, and returns the session id (None if the given session is unknown)
+def store_resume(session_id: Optional[str], resume_model):
+    if session_id:
+        return session_id if utils.session_store.sessions.replace(session_id, resume_model) is not None else None
+    return utils.session_store.sessions.create(resume_model)
+
+# ------ BACKGROUND EXTRACTION JOBS ------
+# The same as /upload-text/, but answered at once with a job id, for clients (and proxies) that can't hold a connection
+# open for the whole extraction. Jobs run on the JobWorkers threads of whichever process claims them (JOB_WORKERS=0 only
+# accepts jobs, leaving them to other processes). A full queue is answered with a 503 and a Retry-After header
+JOB_RETRY_AFTER = int(os.getenv("JOB_RETRY_AFTER", "10"))
+# How often /jobs/{job_id}/events checks the job
+JOB_EVENTS_INTERVAL = float(os.getenv("JOB_EVENTS_INTERVAL", "0.5"))
+
+def run_upload_text_job(payload: dict):
+    resume_model = utils.extract_resume.extract_raw_text(payload['text'])
+    if resume_model is None:
+        raise RuntimeError("Failed to get a valid response with 3 attempts")
+    session_id = store_resume(payload.get('session_id'), resume_model)
+    if session_id is None:
+        raise RuntimeError("The session expired while the resume was extracted")
+    return {'session_id': session_id, 'response': get_resume(resume_model)}
+
+# ------ BATCH INGESTION ------
+# Many resumes at once: PDFs, DOCX files or zips of them are saved under BATCH_DIR/<batch_id>/uploads and extracted by a
+# background job into BATCH_DIR/<batch_id>/results.jsonl, one line per document (see utils/batch_ingest.py, which
+# batch_ingest.py runs from the command line). A job claimed again after its worker died carries on from the lines already
+# written, and its result is the run's report (documents, failures, throughput and tokens)
+BATCH_DIR = os.getenv("BATCH_DIR", "batches")
+
+def run_batch_ingest_job(payload: dict):
+    batch_dir = os.path.join(BATCH_DIR, payload['batch_id'])
+    return utils.batch_ingest.ingest([os.path.join(batch_dir, 'uploads')], os.path.join(batch_dir, 'results.jsonl'),
+                                     progress_every=0)
+
+job_workers = utils.job_queue.JobWorkers(utils.job_queue.jobs, {'upload_text': run_upload_text_job,
+                                                                'batch_ingest': run_batch_ingest_job})
+
+@app.post("/batch/ingest/", status_code=202)
+def _submit_batch(files: List[UploadFile]):
+    accepted = utils.batch_ingest.DOCUMENT_EXTENSIONS + (".zip",)
+    if not any(file.filename.lower().endswith(accepted) for file in files):
+        raise HTTPException(status_code=400, detail="Upload pdf or docx files, or zips of them")
+    batch_id = uuid.uuid4().hex
+    uploads = os.path.join(BATCH_DIR, batch_id, 'uploads')
+    os.makedirs(uploads)
+    for i, file in enumerate(files):
+        if file.filename.lower().endswith(accepted):
+            # Numbered, so files uploaded under the same name don't overwrite each other
+            with open(os.path.join(uploads, f"{i:05d}_{os.path.basename(file.filename)}"), 'wb') as f:
+                shutil.copyfileobj(file.file, f)
+    try:
+        job_id = utils.job_queue.jobs.enqueue('batch_ingest', {'batch_id': batch_id})
+    except utils.job_queue.QueueFullError:
+        shutil.rmtree(os.path.join(BATCH_DIR, batch_id), ignore_errors=True)
+        raise HTTPException(status_code=503, detail="Too many jobs waiting, try again shortly",
+                            headers={'Retry-After': str(JOB_RETRY_AFTER)})
+    return {'batch_id': batch_id,
+            'job_id': job_id,
+            'status': utils.job_queue.QUEUED,
+            'status_url': f"/jobs/{job_id}",
+            'events_url': f"/jobs/{job_id}/events",
+            'results_url': f"/batch/{batch_id}/results"}
+
+# The results written so far as JSON lines (the batch may still be running)
+@app.get("/batch/{batch_id}/results")
+def _batch_results(batch_id: str):
+    path = os.path.join(BATCH_DIR, batch_id, 'results.jsonl')
+    if not re.fullmatch(r"[0-9a-f]{32}", batch_id) or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Unknown batch, or no results yet")
+    return FileResponse(path, media_type='application/x-ndjson')
+
+@app.post("/jobs/upload-text/", status_code=202)
+def _submit_upload_text(resume_text: ResumeText, session_id: Optional[str] = Header(None, alias=SESSION_HEADER, pattern=SESSION_ID_PATTERN)):
+    check_session(session_id)
+    try:
+        job_id = utils.job_queue.jobs.enqueue('upload_text', {'text': resume_text.text, 'session_id': session_id})
+    except utils.job_queue.QueueFullError:
+        raise HTTPException(status_code=503, detail="Too many resumes waiting to be extracted, try again shortly",
+                            headers={'Retry-After': str(JOB_RETRY_AFTER)})
+    return {'job_id': job_id,
+            'status': utils.job_queue.QUEUED,
+            'status_url': f"/jobs/{job_id}",
+            'events_url': f"/jobs/{job_id}/events"}
+
+# The job's status, queue position while queued, and its result ({session_id, response}) or error once finished
+@app.get("/jobs/{job_id}")
+def _job_status(job_id: str):
+    job = utils.job_queue.jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+    return job
+
+# The job's progress as Server-Sent Events: a "status" event whenever its status or queue position changes,
+# then a "done" event with the finished job
+@app.get("/jobs/{job_id}/events")
+async def _job_events(job_id: str):
+    job = await run_in_threadpool(_job_status, job_id)
+
+    async def events():
+        nonlocal job
+        last = None
+        while job['status'] not in (utils.job_queue.DONE, utils.job_queue.FAILED):
+            if (job['status'], job['position']) != last:
+                last = (job['status'], job['position'])
+                yield sse_event('status', {'job_id': job_id, 'status': job['status'], 'position': job['position']})
+            await asyncio.sleep(JOB_EVENTS_INTERVAL)
+            job = await run_in_threadpool(_job_status, job_id)
+        yield sse_event('done', job)
+    return event_stream(events())
+
 # Currently unused, thank God, transferring files between front and back end isn't the simplest imo..
+# The upload is parsed straight from the spooled upload buffer (in memory, rolled to a temp file when large),
+# and MaxBodySizeMiddleware rejects anything over UPLOAD_MAX_BYTES while it streams in
 @app.post("/upload-file/")
-def _upload_pdf_or_docx(file: UploadFile):
-    global resume_model
-    upload_dir = "uploaded_resumes"
-    if not os.path.exists(upload_dir):
-        os.makedirs(upload_dir)
-    # Combine the directory path and the file name to get the full path
-    file_path = os.path.join(upload_dir, file.filename)
-
-    # Open the file for writing in binary mode
-    with open(file_path, "wb") as f:
-        # Iterate through the file chunks and write them to the file
-        shutil.copyfileobj(file.file, f)
-    if file_path.endswith(".pdf"):
-        text = utils.utils_file.parse_pdf(file_path)
-    elif file_path.endswith(".docx"):
-        text = utils.utils_file.parse_docx(file_path)
+def _upload_pdf_or_docx(file: UploadFile, response: Response, session_id: Optional[str] = Header(None, alias=SESSION_HEADER, pattern=SESSION_ID_PATTERN)):
+    check_session(session_id)
+    if file.filename.endswith(".pdf"):
+        raw_text = utils.utils_file.parse_pdf(file.file, clean=False)
+    elif file.filename.endswith(".docx"):
+        raw_text = utils.utils_file.parse_docx(file.file, clean=False)
     else:
         return "File must be pdf or docx"
 
-    # the is the raw text after parsing 
-    text = utils.utils_file.process_clean_text(text)
+    # the is the raw text after parsing, pre-extract what regexes can find before cleaning it
+    known = utils.pre_extract.pre_extract(raw_text)
+    text = utils.utils_file.process_clean_text(raw_text)
 
     # USe openai to extract the data
-    ans = utils.extract_resume.extract_data_new(text)
+    resume_model = utils.extract_resume.extract_resume_model(text, known)
+    if resume_model is None:
+        print("Failed to get a valid response with 3 attempts")
+        return None
+    store_upload(response, session_id, resume_model)
+    return get_resume(resume_model)
 
-    # If any field of ans is empty, replace it with "" according to the ResumeModel
-    resume_model = ResumeModel(**ans)
-    
-    
 @app.get("/get-resume/")
-def pass_resume():
-    return get_resume(resume_model)
+def pass_resume(session_id: Optional[str] = Header(None, alias=SESSION_HEADER, pattern=SESSION_ID_PATTERN)):
+    return get_resume(session_resume(session_id))
 
 # Localalized resume model -> OpenResume resume model
 def get_resume(resume_model):
@@ -387,14 +511,7 @@ def get_resume(resume_model):
             "summary": resume_model.objective,
             "location": resume_model.basic_info.location
         },
-        "workExperiences": [
-            {
-            "company": work_experience.company,
-            "jobTitle": work_experience.job_title,
-            "date": work_experience.duration,
-            "descriptions": work_experience.job_summary.split('\n')
-            } for work_experience in resume_model.work_experience
-        ],
+        "workExperiences": format_work_experiences(resume_model),
         "educations": [
             {
             "school": education.university,
@@ -404,13 +521,7 @@ def get_resume(resume_model):
             "descriptions": education.majors.split('\n')
             } for education in resume_model.education
         ],
-        "projects": [
-            {
-            "project": project.project_name,
-            "date": "", # TODO: 
-            "descriptions": project.project_description.split('\n')
-            } for project in resume_model.project_experience
-        ],
+        "projects": format_projects(resume_model),
         "skills": {
             "featuredSkills": [
                 {
@@ -427,8 +538,20 @@ def get_resume(resume_model):
     return open_resume_model
 
 @app.get('/get-internal-resume/')
-def _get_resume():
-    return resume_model.model_dump()
+def _get_resume(session_id: Optional[str] = Header(None, alias=SESSION_HEADER, pattern=SESSION_ID_PATTERN)):
+    return session_resume(session_id).model_dump()
+
+# Counters for the caching layers in front of the LLM
+@app.get("/stats/")
+def _stats():
+    return {'llm_usage': utils.llm_client.usage_stats(),
+            'llm_cache': utils.llm_client.response_cache.stats(),
+            'extraction_cache': utils.extract_resume.extraction_cache.stats(),
+            'llm_singleflight': utils.llm_client.inflight.stats(),
+            'extraction_singleflight': utils.extract_resume.inflight.stats(),
+            'jobs': job_workers.stats(),
+            'llm_rate_limit': utils.rate_limit.limiter.stats(),
+            'llm_circuit_breaker': utils.circuit_breaker.breaker.stats()}
 
 @app.get("/")
 def _ping():
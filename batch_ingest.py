@@ -0,0 +1,7 @@
+# Batch resume extraction from the command line, e.g.
+#   python batch_ingest.py resumes/ more_resumes.zip -o results.jsonl
+# Running it again with the same output file carries on after the documents already done (see utils/batch_ingest.py)
+import utils.batch_ingest
+
+if __name__ == "__main__":
+    utils.batch_ingest.main()
@@ -0,0 +1,78 @@
+"""
+DOCX text extraction: the streaming utils.docx_text parser against python-docx's Document().paragraphs,
+on sample_resume/Administrator.docx and large synthetic documents. Reports time, peak Python memory,
+and how much text each path finds (python-docx skips tables and text boxes).
+
+Run from the repository root:
+
+    python -m benchmarks.bench_docx [--pages 10 100 500] [--repeat 5]
+"""
+import argparse
+import io
+import os
+import time
+import tracemalloc
+
+import docx
+
+import utils.docx_text
+from benchmarks.synthetic import synthetic_docx
+
+
+def python_docx_text(data):
+    # What parse_docx did before the streaming parser, kept here as the baseline
+    return "\n".join(para.text for para in docx.Document(io.BytesIO(data)).paragraphs)
+
+
+def streaming_text(data):
+    return utils.docx_text.extract_docx_text(data)
+
+
+def best_time(extract, data, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        extract(data)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def peak_memory(extract, data):
+    tracemalloc.start()
+    try:
+        extract(data)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def load_inputs(pages):
+    inputs = {}
+    for file_name in sorted(os.listdir("sample_resume")):
+        if file_name.endswith(".docx"):
+            with open(os.path.join("sample_resume", file_name), "rb") as f:
+                inputs[file_name] = f.read()
+    for count in pages:
+        inputs[f"synthetic_{count}_pages"] = synthetic_docx(count)
+    return inputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, nargs="*", default=[10, 100, 500])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'document':<28}{'size KB':>9}{'docx ms':>10}{'stream ms':>11}{'speedup':>9}"
+          f"{'docx MB':>9}{'stream MB':>11}{'docx chars':>12}{'stream chars':>14}")
+    for name, data in load_inputs(args.pages).items():
+        baseline = best_time(python_docx_text, data, args.repeat)
+        streaming = best_time(streaming_text, data, args.repeat)
+        print(f"{name:<28}{len(data) / 1e3:>9.1f}{baseline * 1e3:>10.1f}{streaming * 1e3:>11.1f}"
+              f"{baseline / streaming:>8.1f}x"
+              f"{peak_memory(python_docx_text, data) / 1e6:>9.1f}{peak_memory(streaming_text, data) / 1e6:>11.1f}"
+              f"{len(python_docx_text(data)):>12}{len(streaming_text(data)):>14}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Compares resume extraction paths: single-shot, single-shot after regex pre-extraction, and section-parallel.
+Reports latency and token cost per resume.
+
+Run from the repository root (needs OPENAI_API_KEY, makes real API calls):
+
+    python -m benchmarks.bench_extraction [--runs 3] [--synthetic-jobs 4 12 24]
+"""
+import os
+
+# Measure the LLM, not the response cache
+os.environ["LLM_CACHE_SIZE"] = "0"
+os.environ["LLM_CACHE_DB"] = ""
+
+import argparse
+import statistics
+import time
+
+import utils.extract_resume
+import utils.llm_client
+import utils.pre_extract
+import utils.utils_file
+from benchmarks.synthetic import synthetic_resume_text
+
+
+def load_documents(synthetic_jobs):
+    # Raw text per document; pre-extraction needs it before cleaning
+    documents = {}
+    for file_name in sorted(os.listdir("sample_resume")):
+        path = os.path.join("sample_resume", file_name)
+        if file_name.endswith(".pdf"):
+            documents[file_name] = utils.utils_file.parse_pdf(path, clean=False)
+        elif file_name.endswith(".docx"):
+            documents[file_name] = utils.utils_file.parse_docx(path, clean=False)
+    for jobs in synthetic_jobs:
+        documents[f"synthetic_{jobs}_jobs"] = synthetic_resume_text(
+            jobs=jobs, projects=max(2, jobs // 3), bullets=4, seed=jobs)
+    return documents
+
+
+def measure(extract, text, runs):
+    latencies = []
+    before = utils.llm_client.usage_stats()
+    for _ in range(runs):
+        start = time.perf_counter()
+        answer = extract(text)
+        latencies.append(time.perf_counter() - start)
+    after = utils.llm_client.usage_stats()
+    return {
+        "ok": answer is not None,
+        "latency_s": statistics.median(latencies),
+        "prompt_tokens": (after["prompt_tokens"] - before["prompt_tokens"]) / runs,
+        "completion_tokens": (after["completion_tokens"] - before["completion_tokens"]) / runs,
+        "calls": (after["calls"] - before["calls"]) / runs,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--synthetic-jobs", type=int, nargs="*", default=[4, 12, 24])
+    args = parser.parse_args()
+
+    modes = {
+        "single": lambda raw, text: utils.extract_resume.extract_single(text),
+        "regex": lambda raw, text: utils.extract_resume.extract_single(text, utils.pre_extract.pre_extract(raw)),
+        "sectioned": lambda raw, text: utils.extract_resume.extract_sectioned(text),
+    }
+    print(f"{'document':<34}{'mode':<11}{'tokens in':>10}{'latency s':>11}{'prompt tok':>12}{'compl tok':>11}{'calls':>7}")
+    for name, raw_text in load_documents(args.synthetic_jobs).items():
+        text = utils.utils_file.process_clean_text(raw_text)
+        input_tokens = utils.extract_resume.num_tokens_from_string(text, utils.extract_resume.encoding)
+        for mode, extract in modes.items():
+            result = measure(lambda text: extract(raw_text, text), text, args.runs)
+            if mode == "sectioned" and result["calls"] == 0:
+                print(f"{name:<34}{mode:<11}{input_tokens:>10}  (too few sections detected, would fall back to single)")
+                continue
+            print(f"{name:<34}{mode:<11}{input_tokens:>10}{result['latency_s']:>11.2f}"
+                  f"{result['prompt_tokens']:>12.0f}{result['completion_tokens']:>11.0f}{result['calls']:>7.1f}"
+                  f"{'' if result['ok'] else '  FAILED'}")
+
+
+if __name__ == "__main__":
+    main()
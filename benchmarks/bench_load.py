@@ -0,0 +1,307 @@
+"""
+End-to-end load test: boots api:app under uvicorn on the offline stub LLM backend (see utils/llm_backend.py)
+and runs concurrent virtual users through /upload-text/ and every /enhance-* endpoint, with resumes from
+sample_resume and the synthetic generator. Reports p50/p95/p99 latency and throughput per endpoint and the
+peak memory of each server process, appends the run to benchmarks/results/bench_load.jsonl under the current
+commit, and compares it with the last run of the same configuration.
+
+Run from the repository root (no API key needed, nothing leaves the machine):
+
+    python -m benchmarks.bench_load [--users 8] [--iterations 40] [--workers 1] [--stub-latency 0.2]
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import httpx
+
+import utils.utils_file
+from benchmarks.synthetic import synthetic_resume_text
+
+RESULTS_PATH = os.path.join("benchmarks", "results", "bench_load.jsonl")
+
+# One virtual user's iteration: upload a resume, then enhance it section by section and all at once.
+# The enhance calls post the uploaded resume without a session, so none of them is answered from another's memo.
+ENHANCE_ENDPOINTS = ["/enhance-objective/", "/enhance-experience/", "/enhance-projects/", "/enhance-skills",
+                     "/enhance-all/"]
+
+
+def load_texts(synthetic):
+    # Raw resume texts to upload: the sample resumes plus synthetic ones of growing length
+    texts = []
+    for file_name in sorted(os.listdir("sample_resume")):
+        path = os.path.join("sample_resume", file_name)
+        if file_name.endswith(".pdf"):
+            texts.append(utils.utils_file.parse_pdf(path, clean=False))
+        elif file_name.endswith(".docx"):
+            texts.append(utils.utils_file.parse_docx(path, clean=False))
+    for i in range(synthetic):
+        texts.append(synthetic_resume_text(jobs=2 + i * 2, projects=1 + i, bullets=3, seed=i))
+    return texts
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def server_env(args, state_dir):
+    env = dict(os.environ)
+    env.update({
+        "LLM_BACKEND": "stub",
+        "LLM_STUB_LATENCY": str(args.stub_latency),
+        "LLM_STUB_LATENCY_JITTER": str(args.stub_jitter),
+        "LLM_STUB_FAILURE_RATE": str(args.stub_failure_rate),
+        # Every upload is a new resume, and its LLM replies shouldn't come from the cache either
+        "LLM_CACHE_SIZE": "1024" if args.cache else "0",
+        "LLM_CACHE_DB": "",
+        # Measure our code rather than the account's rate limits
+        "LLM_RATE_LIMIT_RPM": "0" if not args.rate_limit else env.get("LLM_RATE_LIMIT_RPM", "3500"),
+        "LLM_RATE_LIMIT_TPM": "0" if not args.rate_limit else env.get("LLM_RATE_LIMIT_TPM", "160000"),
+        # Fresh state for every run, shared by the workers like in production
+        "SESSION_DB_URL": f"sqlite:///{os.path.join(state_dir, 'sessions.db')}",
+        "JOB_QUEUE_DB": os.path.join(state_dir, "jobs.db"),
+        "LLM_RATE_LIMIT_DB": os.path.join(state_dir, "rate_limit.db"),
+        "EXTRACTION_CACHE_DB": os.path.join(state_dir, "extraction_cache.db"),
+        "BATCH_DIR": os.path.join(state_dir, "batches"),
+    })
+    return env
+
+
+def start_server(args, state_dir, port):
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(args.workers), "--log-level", "warning"],
+        env=server_env(args, state_dir), cwd=os.getcwd(), stdout=subprocess.DEVNULL)
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"uvicorn exited with code {server.returncode}")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/", timeout=1).status_code == 200:
+                return server
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("uvicorn didn't start within 60s")
+
+
+def process_tree(pid):
+    """pid and all its descendants, from /proc (Linux)."""
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # The command name is in parentheses and may contain spaces, the parent pid is 2 fields after it
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    tree, pending = [], [pid]
+    while pending:
+        current = pending.pop()
+        tree.append(current)
+        pending.extend(children.get(current, []))
+    return tree
+
+
+def rss_mb(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+class MemorySampler:
+    """Samples the resident memory of the server's processes in the background, keeping each one's peak."""
+
+    def __init__(self, pid, interval=0.25):
+        self.pid = pid
+        self.interval = interval
+        self.peaks = {}
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            for pid in process_tree(self.pid):
+                rss = rss_mb(pid)
+                if rss is not None:
+                    self.peaks[pid] = max(self.peaks.get(pid, 0), rss)
+            self._stopping.wait(self.interval)
+
+    def __enter__(self):
+        if os.path.isdir("/proc"):
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stopping.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+
+async def run_load(base_url, texts, users, iterations):
+    """Runs iterations user iterations across users concurrent users; returns {endpoint: [(seconds, ok)]}."""
+    timings = {endpoint: [] for endpoint in ["/upload-text/"] + ENHANCE_ENDPOINTS}
+    counter = iter(range(iterations))
+
+    async def request(client, endpoint, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await client.post(endpoint, **kwargs)
+            ok = response.status_code == 200
+        except httpx.HTTPError:
+            response, ok = None, False
+        timings[endpoint].append((time.perf_counter() - started, ok))
+        return response if ok else None
+
+    async def user(client):
+        for n in counter:
+            # A line no other upload has, so neither the extraction cache nor in-flight coalescing kicks in
+            text = f"{texts[n % len(texts)]}\nReference number: {n}"
+            uploaded = await request(client, "/upload-text/", json={"text": text})
+            if uploaded is None:
+                continue
+            for endpoint in ENHANCE_ENDPOINTS:
+                await request(client, endpoint, json=uploaded.json())
+
+    limits = httpx.Limits(max_connections=users, max_keepalive_connections=users)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        await asyncio.gather(*[user(client) for _ in range(users)])
+    return timings
+
+
+def percentile(values, share):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(share * len(ordered)))]
+
+
+def summarise(timings, wall_s):
+    endpoints = {}
+    for endpoint, samples in timings.items():
+        latencies = [seconds for seconds, ok in samples if ok]
+        endpoints[endpoint] = {
+            "requests": len(samples),
+            "errors": sum(not ok for _, ok in samples),
+            "p50_ms": round(percentile(latencies, 0.50) * 1e3, 1) if latencies else None,
+            "p95_ms": round(percentile(latencies, 0.95) * 1e3, 1) if latencies else None,
+            "p99_ms": round(percentile(latencies, 0.99) * 1e3, 1) if latencies else None,
+            "mean_ms": round(statistics.mean(latencies) * 1e3, 1) if latencies else None,
+            "rps": round(len(samples) / wall_s, 2),
+        }
+    total = sum(len(samples) for samples in timings.values())
+    return endpoints, round(total / wall_s, 2)
+
+
+def git_revision():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True,
+                                    text=True, check=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def previous_run(config):
+    if not os.path.exists(RESULTS_PATH):
+        return None
+    previous = None
+    with open(RESULTS_PATH, encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            if record["config"] == config:
+                previous = record
+    return previous
+
+
+def print_report(record, previous, threshold):
+    print(f"\n{'endpoint':<22}{'requests':>9}{'errors':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'rps':>8}"
+          + (f"{'p95 vs last':>13}" if previous else ""))
+    regressions = []
+    for endpoint, stats in record["endpoints"].items():
+        line = (f"{endpoint:<22}{stats['requests']:>9}{stats['errors']:>8}{stats['p50_ms'] or '-':>9}"
+                f"{stats['p95_ms'] or '-':>9}{stats['p99_ms'] or '-':>9}{stats['rps']:>8}")
+        before = (previous or {}).get("endpoints", {}).get(endpoint, {}).get("p95_ms")
+        if before and stats["p95_ms"]:
+            change = (stats["p95_ms"] - before) / before
+            line += f"{change:>+12.0%}"
+            if change > threshold:
+                regressions.append(f"{endpoint} p95 {before} -> {stats['p95_ms']} ms")
+        print(line)
+    print(f"\n{record['throughput_rps']} requests/s over {record['wall_s']}s")
+    for pid, peak in record["peak_rss_mb"].items():
+        print(f"  process {pid}: peak RSS {peak} MB")
+    if previous:
+        print(f"\nCompared with {previous['commit']}{' (dirty)' if previous['dirty'] else ''} from {previous['date']}: "
+              f"throughput {previous['throughput_rps']} -> {record['throughput_rps']} requests/s")
+        for regression in regressions:
+            print(f"  REGRESSION: {regression}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=8, help="concurrent virtual users")
+    parser.add_argument("--iterations", type=int, default=40, help="upload + enhance rounds, spread over the users")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--synthetic", type=int, default=4, help="synthetic resumes added to the sample ones")
+    parser.add_argument("--stub-latency", type=float, default=0.2, help="seconds per stub LLM call")
+    parser.add_argument("--stub-jitter", type=float, default=0.05)
+    parser.add_argument("--stub-failure-rate", type=float, default=0.0)
+    parser.add_argument("--cache", action="store_true", help="keep the LLM response cache on")
+    parser.add_argument("--rate-limit", action="store_true", help="keep the outbound LLM rate limits on")
+    parser.add_argument("--threshold", type=float, default=0.10, help="p95 increase reported as a regression")
+    parser.add_argument("--no-save", action="store_true", help="don't append the run to " + RESULTS_PATH)
+    args = parser.parse_args()
+
+    texts = load_texts(args.synthetic)
+    state_dir = tempfile.mkdtemp(prefix="bench_load_")
+    port = free_port()
+    server = start_server(args, state_dir, port)
+    try:
+        with MemorySampler(server.pid) as memory:
+            started = time.perf_counter()
+            timings = asyncio.run(run_load(f"http://127.0.0.1:{port}", texts, args.users, args.iterations))
+            wall_s = time.perf_counter() - started
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+        shutil.rmtree(state_dir, ignore_errors=True)
+
+    endpoints, throughput = summarise(timings, wall_s)
+    commit, dirty = git_revision()
+    config = {"users": args.users, "iterations": args.iterations, "workers": args.workers,
+              "synthetic": args.synthetic, "stub_latency": args.stub_latency, "stub_jitter": args.stub_jitter,
+              "stub_failure_rate": args.stub_failure_rate, "cache": args.cache, "rate_limit": args.rate_limit}
+    record = {"commit": commit, "dirty": dirty, "date": time.strftime("%Y-%m-%dT%H:%M:%S"), "config": config,
+              "wall_s": round(wall_s, 2), "throughput_rps": throughput, "endpoints": endpoints,
+              "peak_rss_mb": {str(pid): round(peak, 1) for pid, peak in sorted(memory.peaks.items())}}
+    print_report(record, previous_run(config), args.threshold)
+    if not args.no_save:
+        os.makedirs(os.path.dirname(RESULTS_PATH), exist_ok=True)
+        with open(RESULTS_PATH, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+        print(f"\nSaved to {RESULTS_PATH}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Throughput of process_clean_text (MB/s) against the previous regex/split implementation,
+on the sample_resume documents and on large synthetic inputs, including a second (idempotent) pass.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_normalizer [--pages 100] [--repeat 5]
+"""
+import argparse
+import os
+import re
+import time
+
+import utils.utils_file
+from benchmarks.synthetic import synthetic_pages
+
+
+def legacy_process_clean_text(text):
+    # The implementation process_clean_text replaced, kept here as the baseline
+    clean_text = re.sub(r'[^a-zA-Z0-9\s]', ' ', text)
+    clean_text = clean_text.strip()
+    final_doc = []
+    for line in clean_text.split("\n"):
+        final_doc.append(" ".join([x.strip() for x in line.split(" ")]))
+    clean_text = "\n".join(final_doc)
+    clean_lines = []
+    for line in clean_text.split('\n'):
+        clean_line = re.sub(r'\s+', ' ', line.strip())
+        if clean_line:
+            clean_lines.append(clean_line)
+    return '\n'.join(clean_lines)
+
+
+def throughput(normalize, text, repeat):
+    # Best of repeat runs, in MB of input per second
+    best = min(_timed(normalize, text) for _ in range(repeat))
+    return len(text.encode("utf-8")) / 1e6 / best
+
+
+def _timed(normalize, text):
+    start = time.perf_counter()
+    normalize(text)
+    return time.perf_counter() - start
+
+
+def load_inputs(pages):
+    inputs = {}
+    for file_name in sorted(os.listdir("sample_resume")):
+        path = os.path.join("sample_resume", file_name)
+        if file_name.endswith(".pdf"):
+            inputs[file_name] = utils.utils_file.parse_pdf(path, clean=False)
+        elif file_name.endswith(".docx"):
+            inputs[file_name] = utils.utils_file.parse_docx(path, clean=False)
+    inputs[f"synthetic_{pages}_pages"] = synthetic_pages(pages)
+    inputs[f"synthetic_{pages}_pages_unicode"] = synthetic_pages(pages).replace("•", "▪ ü ").replace(" - ", " – ")
+    return inputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'input':<36}{'size KB':>9}{'legacy MB/s':>13}{'new MB/s':>10}{'2nd pass MB/s':>15}{'same':>6}")
+    for name, text in load_inputs(args.pages).items():
+        clean = utils.utils_file.process_clean_text(text)
+        same = clean == legacy_process_clean_text(text) and utils.utils_file.process_clean_text(clean) == clean
+        print(f"{name:<36}{len(text.encode('utf-8')) / 1e3:>9.1f}"
+              f"{throughput(legacy_process_clean_text, text, args.repeat):>13.1f}"
+              f"{throughput(utils.utils_file.process_clean_text, text, args.repeat):>10.1f}"
+              f"{throughput(utils.utils_file.process_clean_text, clean, args.repeat):>15.1f}"
+              f"{'yes' if same else 'NO':>6}")
+
+
+if __name__ == "__main__":
+    main()
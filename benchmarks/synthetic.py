@@ -0,0 +1,90 @@
+import random
+import io
+
+import docx
+
+########################################################################################
+#                           SYNTHETIC RESUMES FOR BENCHMARKS                           #
+########################################################################################
+
+TITLES = ["Software Engineer", "Data Analyst", "Project Manager", "Product Designer", "DevOps Engineer",
+          "Marketing Specialist", "Research Assistant", "Operations Lead", "QA Engineer", "Sales Associate"]
+COMPANIES = ["Acme Corp", "Globex", "Initech", "Umbrella Health", "Stark Industries", "Wayne Enterprises",
+             "Hooli", "Vandelay Imports", "Soylent Foods", "Tyrell Systems"]
+SKILLS = ["Python", "SQL", "Excel", "Project management", "Machine learning", "Docker", "Kubernetes",
+          "Communication", "Leadership", "JavaScript", "React", "Data visualisation", "Agile", "AWS"]
+WORDS = ("designed built led improved migrated automated analysed delivered reduced increased "
+         "platform pipeline reporting customers team revenue latency costs dashboards services "
+         "stakeholders processes quality releases infrastructure onboarding").split()
+
+
+def _sentence(rng, words=14):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def synthetic_resume_text(jobs=4, projects=2, bullets=3, seed=0):
+    """
+    Builds a plausible plain-text resume with contact details and the usual section headings.
+
+    Args:
+        jobs (int): Number of work experiences.
+        projects (int): Number of projects.
+        bullets (int): Bullet points per job and project.
+        seed (int): Seed for the random choices, so runs are reproducible.
+
+    Returns:
+        str: The resume text, with punctuation (emails, URLs) as a parsed document would have it.
+    """
+    rng = random.Random(seed)
+    lines = [
+        "Jane Q. Doe",
+        "jane.doe@example.com | +1 (555) 010-2030 | Springfield, USA",
+        "linkedin.com/in/janedoe | github.com/janedoe | https://janedoe.dev",
+        "",
+        "Summary",
+        _sentence(rng, 30),
+        "",
+        "Work Experience",
+    ]
+    for i in range(jobs):
+        lines.append(f"{rng.choice(TITLES)} - {rng.choice(COMPANIES)}")
+        lines.append(f"Jan {2023 - i} - Dec {2023 - i}")
+        lines.extend(f"• {_sentence(rng)}" for _ in range(bullets))
+        lines.append("")
+    lines.append("Education")
+    lines.append("State University - BS in Computer Science, 2015 - GPA: 3.7/4.0")
+    lines.append("")
+    lines.append("Projects")
+    for i in range(projects):
+        lines.append(f"Project {i + 1}: {rng.choice(WORDS).capitalize()} {rng.choice(WORDS)}")
+        lines.extend(f"• {_sentence(rng)}" for _ in range(bullets))
+        lines.append("")
+    lines.append("Skills")
+    lines.append(", ".join(rng.sample(SKILLS, 8)))
+    return "\n".join(lines)
+
+
+def synthetic_pages(pages=100, seed=0):
+    """Roughly pages pages of resume-like text (a long CV or a concatenated export), for throughput tests."""
+    return "\n\n".join(synthetic_resume_text(jobs=6, projects=3, bullets=4, seed=seed + page)
+                       for page in range(pages))
+
+
+def synthetic_docx(pages=100, seed=0):
+    """
+    A DOCX of pages synthetic resumes, each followed by a two-column skills table.
+
+    Returns:
+        bytes: The document.
+    """
+    document = docx.Document()
+    for page in range(pages):
+        for line in synthetic_resume_text(jobs=6, projects=3, bullets=4, seed=seed + page).split("\n"):
+            document.add_paragraph(line)
+        rng = random.Random(seed + page)
+        table = document.add_table(rows=4, cols=2)
+        for row in table.rows:
+            row.cells[0].text, row.cells[1].text = rng.sample(SKILLS, 2)
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
@@ -2,7 +2,10 @@
 
 import utils.utils_file
 import utils.extract_resume
-from utils.dataclass import ResumeText, ResumeModel, BasicInfoModel, WorkExperienceModel, EducationModel, ProjectExperienceModel
+import utils.json_repair
+from utils.cache import make_key
+from utils.circuit_breaker import CircuitOpenError
+from utils.dataclass import ResumeText, ResumeModel, BasicInfoModel, WorkExperienceModel, EducationModel, ProjectExperienceModel, BatchSummariesModel
 from utils.mirror_class import Resume
 from langchain.chat_models import ChatOpenAI
 import json
@@ -19,6 +22,9 @@ import logging
 import shutil
 
 import json
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import List
 
 from fastapi import FastAPI, Request, UploadFile
@@ -26,6 +32,213 @@ from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, ValidationError
 
 from aishop import *
+
+# Maximum number of per-item LLM calls a single request runs at once (work experiences, projects)
+ENHANCE_MAX_CONCURRENCY = int(os.getenv("ENHANCE_MAX_CONCURRENCY", "4"))
+# How work experiences and projects are enhanced by default: "per_item" (one call each) or "batch" (one call for all)
+ENHANCE_MODE = os.getenv("ENHANCE_MODE", "per_item")
+# Largest batched prompt (input plus expected output tokens) sent before falling back to per-item calls
+ENHANCE_BATCH_MAX_TOKENS = int(os.getenv("ENHANCE_BATCH_MAX_TOKENS", "3000"))
+# Rough completion size budgeted per item in a batched call
+ENHANCE_BATCH_TOKENS_PER_ITEM = 100
+
+
+# ---------------------------- FAN-OUT ------------------------------------------
+def _map_items(fn, items, fallback):
+    """
+    Calls fn on every item concurrently (at most ENHANCE_MAX_CONCURRENCY at a time) and returns
+    the results in input order. An item whose call raises gets fallback(item) instead,
+    so one failed LLM call doesn't lose the rest of the section; only an open circuit breaker
+    fails the whole section, as the backend is known to be down.
+    """
+    def _safe(item):
+        try:
+            return fn(item)
+        except CircuitOpenError:
+            raise
+        except Exception:
+            logging.exception("Enhancing %r failed, keeping the original", item)
+            return fallback(item)
+
+    if len(items) <= 1:
+        return [_safe(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(ENHANCE_MAX_CONCURRENCY, len(items))) as pool:
+        return list(pool.map(_safe, items))
+
+
+async def _astream_items(afn, items, fallback):
+    """
+    Async version of _map_items() that yields (index, result) pairs in the order the calls finish,
+    bounded by a per-call semaphore.
+    """
+    semaphore = asyncio.Semaphore(ENHANCE_MAX_CONCURRENCY)
+
+    async def _safe(index, item):
+        async with semaphore:
+            try:
+                return index, await afn(item)
+            except CircuitOpenError:
+                raise
+            except Exception:
+                logging.exception("Enhancing %r failed, keeping the original", item)
+                return index, fallback(item)
+
+    tasks = [asyncio.ensure_future(_safe(index, item)) for index, item in enumerate(items)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # The consumer stopped early (e.g. the client disconnected): don't leave calls running
+        for task in tasks:
+            task.cancel()
+
+
+async def _amap_items(afn, items, fallback):
+    """Async version of _map_items(), bounded by a per-call semaphore."""
+    results = [None] * len(items)
+    async for index, result in _astream_items(afn, items, fallback):
+        results[index] = result
+    return results
+
+# ---------------------------- BATCHING ------------------------------------------
+def _use_batch(mode, items, prompt, **variables):
+    """Returns True when the items should be enhanced with one batched call that fits ENHANCE_BATCH_MAX_TOKENS."""
+    if (mode or ENHANCE_MODE) != "batch" or len(items) < 2:
+        return False
+    prompt_text = "\n".join(message.content for message in prompt.format_prompt(**variables).to_messages())
+    num_tokens = utils.extract_resume.num_tokens_from_string(prompt_text, utils.extract_resume.encoding)
+    if num_tokens + ENHANCE_BATCH_TOKENS_PER_ITEM * len(items) > ENHANCE_BATCH_MAX_TOKENS:
+        print(f"- - - Batch of {len(items)} items needs ~{num_tokens} prompt tokens, using per-item calls")
+        return False
+    return True
+
+
+def _load_batch_summaries(response: str, count: int):
+    """
+    Validates a batched response against BatchSummariesModel and returns the summaries in input order,
+    or None if it is malformed or doesn't hold exactly one summary per index.
+    """
+    try:
+        batch = BatchSummariesModel(**utils.json_repair.loads(response))
+    except (ValueError, TypeError, ValidationError):
+        print("- - - Batched response wasn't in the expected format, falling back to per-item calls")
+        return None
+    summaries = {item.index: item.summary for item in batch.summaries}
+    if len(batch.summaries) != count or sorted(summaries) != list(range(count)):
+        print("- - - Batched response didn't cover every item, falling back to per-item calls")
+        return None
+    return [summaries[i] for i in range(count)]
+
+
+def _try_batch(call, count):
+    """
+    Makes a batched call and returns its summaries in input order, or None if the call failed or its response
+    didn't validate, so the caller falls back to per-item calls. An open circuit breaker is raised, not retried per item.
+    """
+    try:
+        return _load_batch_summaries(call(), count)
+    except CircuitOpenError:
+        raise
+    except Exception:
+        logging.exception("Batched call failed, falling back to per-item calls")
+        return None
+
+
+async def _atry_batch(acall, count):
+    """Async version of _try_batch(), acall returning the awaitable batched call."""
+    try:
+        return _load_batch_summaries(await acall(), count)
+    except CircuitOpenError:
+        raise
+    except Exception:
+        logging.exception("Batched call failed, falling back to per-item calls")
+        return None
+
+
+# ---------------------------- INCREMENTAL ------------------------------------------
+# An item's fingerprint covers everything its prompt is built from, so an item whose fingerprint a session's memo
+# (utils.session_store.SessionMemo) already holds is unchanged and its earlier result is reused instead of calling the LLM.
+# Each result is also recorded under the fingerprint of the item as it is once the result is applied (same skills), so
+# posting an enhanced resume back leaves the enhanced items as they are instead of enhancing them again, while changing
+# the skills gets them enhanced again like any other changed input.
+
+def _fingerprint(task, *inputs):
+    return make_key(task, *inputs)
+
+
+def _memo_lookup(memo, fingerprints):
+    """Returns the memo's result for each fingerprint, None where it has none (or there is no memo)."""
+    if memo is None:
+        return [None] * len(fingerprints)
+    found = memo.get_many(fingerprints)
+    return [found.get(fingerprint) for fingerprint in fingerprints]
+
+
+def _memo_record(memo, entries):
+    if memo is not None and entries:
+        memo.set_many(entries)
+
+
+class _ItemPlan:
+    """
+    The memo side of enhancing one text field of every item in a list (work experiences, projects), shared by the
+    sync, async and streaming enhancers: lookup() takes the texts the memo already has, leaving the other items
+    pending for the LLM, and apply() sets the new texts and returns the memo entries to record for them.
+    """
+
+    def __init__(self, task, items, name_field, text_field, skills):
+        self.task = task
+        self.items = items
+        self.name_field = name_field
+        self.text_field = text_field
+        self.skills = skills
+        self.fingerprints = [self._fingerprint(item, getattr(item, text_field)) for item in items]
+        # Each item's new text, None until the memo or the LLM provides one
+        self.texts = [None] * len(items)
+        self.pending = list(range(len(items)))
+
+    def _fingerprint(self, item, text):
+        return _fingerprint(self.task, getattr(item, self.name_field), text, self.skills)
+
+    def lookup(self, memo):
+        """Takes the memo's texts (reads the memo, so off the event loop in async code)."""
+        self.texts = _memo_lookup(memo, self.fingerprints)
+        self.pending = [i for i, text in enumerate(self.texts) if text is None]
+
+    @property
+    def pending_items(self):
+        return [self.items[i] for i in self.pending]
+
+    def as_dict(self, index, text=None):
+        """The item at index as a dict, with text as its new text (the current one when None)."""
+        item = self.items[index].model_dump()
+        return {**item, self.text_field: text or item[self.text_field]}
+
+    def memo_hits(self):
+        """(index, item dict) of the items the memo had a text for."""
+        return [(i, self.as_dict(i, text)) for i, text in enumerate(self.texts) if text is not None]
+
+    def apply(self, new_texts):
+        """
+        Sets every item's text: the memo's, or new_texts for the pending ones in order.
+
+        Returns:
+            dict: The memo entries to record for the new texts.
+        """
+        entries = {}
+        for i, text in zip(self.pending, new_texts):
+            # None means the call failed: keep the original, and leave it out of the memo so it's retried next time
+            if text is None:
+                continue
+            self.texts[i] = text
+            entries[self.fingerprints[i]] = text
+            entries[self._fingerprint(self.items[i], text)] = text
+        for item, text in zip(self.items, self.texts):
+            if text is not None:
+                setattr(item, self.text_field, text)
+        return entries
+
+
 # ---------------------------- BASIC INFO ------------------------------------------        
 def update_basic_info(resume_data: ResumeModel, updated_basic_info_dict: dict) -> ResumeModel:
     """
@@ -47,13 +260,8 @@ def update_basic_info(resume_data: ResumeModel, updated_basic_info_dict: dict) -
 
 # ---------------------------- OBJECTIVE ------------------------------------------
 
-def enhance_objective(resume_data: ResumeModel) -> ResumeModel:
-    """
-    This function takes a ResumeModel instance representing the existing resume data.
-    It enhances the objective statement using the experience and skills in the resume data
-    and returns the updated ResumeModel instance.
-    """
-    
+def _objective_inputs(resume_data: ResumeModel):
+    """Returns the (current objective, experience, skills) prompt inputs for the objective helpers."""
     # Extract the current objective, experience, and skills from the resume data
     current_objective = resume_data.objective
     experiences = resume_data.work_experience or []
@@ -68,49 +276,126 @@ def enhance_objective(resume_data: ResumeModel) -> ResumeModel:
     for skill in skills:
         key_skills.add(skill.lower())
     
-    experience = ".".join(key_roles)
-    skills = ".".join(key_skills)
+    experience = ".".join(sorted(key_roles))
+    skills = ".".join(sorted(key_skills))
+    return current_objective, experience, skills
+
 
+def enhance_objective(resume_data: ResumeModel) -> ResumeModel:
+    """
+    This function takes a ResumeModel instance representing the existing resume data.
+    It enhances the objective statement using the experience and skills in the resume data
+    and returns the updated ResumeModel instance.
+    """
     # Construct the enhanced objective statement
-    enhanced_objective = create_objective_openai(current_objective, experience, skills)
+    enhanced_objective = create_objective_openai(*_objective_inputs(resume_data))
 
     # Update the objective in the resume data with the enhanced objective
     resume_data.objective = enhanced_objective
     
     return resume_data
 
+
+async def aenhance_objective(resume_data: ResumeModel) -> ResumeModel:
+    """Async version of enhance_objective()."""
+    resume_data.objective = await acreate_objective_openai(*_objective_inputs(resume_data))
+    return resume_data
+
+async def astream_objective(resume_data: ResumeModel):
+    """Streaming version of aenhance_objective(): yields the objective's text as it's generated, then sets it."""
+    chunks = []
+    async for chunk in astream_objective_openai(*_objective_inputs(resume_data)):
+        chunks.append(chunk)
+        yield chunk
+    resume_data.objective = "".join(chunks)
+
 # ---------------------------- WORK EXPERIENCE ------------------------------------------
 
 
+def _skills_text(resume_data: ResumeModel) -> str:
+    return _join_skills(resume_data.skills or [])
+
+
+def _join_skills(skills) -> str:
+    # Identify key skills from the skills section
+    key_skills = set()
+    for skill in skills:
+        key_skills.add(skill.lower())
+    return ".".join(sorted(key_skills))
+
+
+def _job_plan(experiences, skills):
+    return _ItemPlan("job_summary", experiences, "job_title", "job_summary", skills)
+
 
-def enhance_experience(resume_data: ResumeModel) -> ResumeModel:
+def enhance_experience(resume_data: ResumeModel, mode: str = None, memo=None) -> ResumeModel:
     """
     This function takes a ResumeModel instance representing the existing resume data.
     It enhances the experience section using the objective and skills in the resume data
     and returns the updated ResumeModel instance.
+    mode ("per_item" or "batch") overrides ENHANCE_MODE for this call.
+    memo (a session's SessionMemo) supplies the results for experiences that haven't changed since they were enhanced.
     """
     
-    # Generate job_summary for each experience in work_experience, using current job_summary, job_title and skills. Use function create_job_summary_openai
-    enhanced_experience = []
-    for exp in resume_data.work_experience:
-        # Identify key skills from the skills section
-        key_skills = set()
-        for skill in resume_data.skills:
-            key_skills.add(skill.lower())
-        skills = ".".join(key_skills)
-        
-        # Construct the enhanced job summary
-        enhanced_job_summary = create_job_summary_openai(exp, skills)
-        
-        # Update the job summary in the experience with the enhanced job summary
-        exp.job_summary = enhanced_job_summary
+    skills = _skills_text(resume_data)
+    plan = _job_plan(resume_data.work_experience or [], skills)
+    plan.lookup(memo)
+    pending_experiences = plan.pending_items
+    enhanced_summaries = None
+
+    # Enhance every changed experience in one call when batching, if the prompt fits the budget and the response validates
+    experiences_text = format_job_batch(pending_experiences)
+    if _use_batch(mode, pending_experiences, job_summaries_batch_prompt, experiences=experiences_text, skills=skills):
+        enhanced_summaries = _try_batch(
+            lambda: create_job_summaries_batch_openai(experiences_text, skills), len(pending_experiences))
+
+    # Otherwise generate job_summary for each experience in work_experience, using current job_summary, job_title and skills. Use function create_job_summary_openai
+    if enhanced_summaries is None:
+        enhanced_summaries = _map_items(lambda exp: create_job_summary_openai(exp, skills),
+                                        pending_experiences, lambda exp: None)
+
+    # Update the job summary in each experience with the enhanced job summary
+    _memo_record(memo, plan.apply(enhanced_summaries))
+    return resume_data
 
-        # Update the experience in the resume data with the updated experience
-        enhanced_experience.append(exp)
 
-    resume_data.work_experience = enhanced_experience
+async def aenhance_experience(resume_data: ResumeModel, mode: str = None, memo=None) -> ResumeModel:
+    """Async version of enhance_experience()."""
+    skills = _skills_text(resume_data)
+    plan = _job_plan(resume_data.work_experience or [], skills)
+    await asyncio.to_thread(plan.lookup, memo)
+    pending_experiences = plan.pending_items
+    enhanced_summaries = None
 
+    experiences_text = format_job_batch(pending_experiences)
+    if _use_batch(mode, pending_experiences, job_summaries_batch_prompt, experiences=experiences_text, skills=skills):
+        enhanced_summaries = await _atry_batch(
+            lambda: acreate_job_summaries_batch_openai(experiences_text, skills), len(pending_experiences))
+
+    if enhanced_summaries is None:
+        enhanced_summaries = await _amap_items(lambda exp: acreate_job_summary_openai(exp, skills),
+                                               pending_experiences, lambda exp: None)
+    await asyncio.to_thread(_memo_record, memo, plan.apply(enhanced_summaries))
     return resume_data
+
+
+async def astream_experience(resume_data: ResumeModel, memo=None):
+    """
+    Streaming version of aenhance_experience(), always per item: yields (index, experience dict) for each
+    work experience as soon as it's enhanced (the memo's first), then applies them all once the last is done.
+    """
+    skills = _skills_text(resume_data)
+    plan = _job_plan(resume_data.work_experience or [], skills)
+    await asyncio.to_thread(plan.lookup, memo)
+    for hit in plan.memo_hits():
+        yield hit
+
+    enhanced_summaries = [None] * len(plan.pending)
+    async for j, enhanced_job_summary in _astream_items(lambda exp: acreate_job_summary_openai(exp, skills),
+                                                        plan.pending_items, lambda exp: None):
+        enhanced_summaries[j] = enhanced_job_summary
+        yield plan.pending[j], plan.as_dict(plan.pending[j], enhanced_job_summary)
+    await asyncio.to_thread(_memo_record, memo, plan.apply(enhanced_summaries))
     
 
 # ---------------------------- EDUCATION ------------------------------------------
@@ -139,108 +424,280 @@ def update_education(resume_data: ResumeModel, updated_education_list: List) ->
 # project_experience (including project_name, project_description),
 
 
+def _load_generated_projects(response: str):
+    generated_experience = utils.json_repair.loads(response)["project_experience"]
+    return generated_experience if not isinstance(generated_experience, tuple) else generated_experience[0]
+
+
+def _existing_projects(resume_data: ResumeModel):
+    if isinstance(resume_data.project_experience, tuple):
+        print("it was a tuple... somehow...\n\n\n")
+        resume_data.project_experience = resume_data.project_experience[0]
+    return resume_data.project_experience
+
+
+def _project_fingerprint(project_name, project_description, skills):
+    return _fingerprint("project_description", project_name, project_description, skills)
+
+
+def _generated_project_entries(generated_projects, skills):
+    """Memo entries marking freshly generated projects as already enhanced."""
+    entries = {}
+    for project in generated_projects:
+        if isinstance(project, dict) and isinstance(project.get("project_description"), str):
+            description = project["project_description"]
+            entries[_project_fingerprint(project.get("project_name"), description, skills)] = description
+    return entries
+
 
-def enhance_project(resume_data: ResumeModel) -> ResumeModel:
+def _project_plan(projects, skills):
+    return _ItemPlan("project_description", projects, "project_name", "project_description", skills)
+
+
+def enhance_project(resume_data: ResumeModel, mode: str = None, memo=None) -> ResumeModel:
     """
     This function takes a ResumeModel instance representing the existing resume data.
     It enhances the project_experience section using the project_name and project_description in the resume data
     and returns the updated ResumeModel instance.
+    mode ("per_item" or "batch") overrides ENHANCE_MODE for this call.
+    memo (a session's SessionMemo) supplies the results for projects that haven't changed since they were enhanced.
     """
 
-    key_skills = set()
-    for skill in resume_data.skills:
-        key_skills.add(skill.lower())
-    skills = ".".join(key_skills)
+    skills = _skills_text(resume_data)
 
     # if project_experience is empty, return the resume_data
     if not resume_data.project_experience or len(resume_data.project_experience) == 0:
         # Create new project_experience
-        generated_experience = json.loads(
-            create_full_project_experience_openai(skills))["project_experience"]
-        resume_data.project_experience = generated_experience if not isinstance(generated_experience, tuple) else generated_experience[0]
+        resume_data.project_experience = _load_generated_projects(
+            create_full_project_experience_openai(skills))
+        _memo_record(memo, _generated_project_entries(resume_data.project_experience, skills))
         return resume_data
 
     else:
-        # Generate project_description for each project in project_experience, using current project_name and project_description. Use function create_project_description_openai
-        enhanced_projects = []
-        # print("-------|", resume_data.project_experience)
-        if isinstance(resume_data.project_experience, tuple):
-            print("it was a tuple... somehow...\n\n\n")
-            resume_data.project_experience = resume_data.project_experience[0]
-        for project in resume_data.project_experience:
-            print("---||", project)
-            # Construct the enhanced project description
-            enhanced_project_description = create_project_description_openai(
-                project.project_name, project.project_description, skills)
-                # project["project_name"], project["project_description"], skills)    ## TODO: check if this works 
-
-            # Update the project description in the project with the enhanced project description
-            project.project_description = enhanced_project_description           ## TODO: check if this works
-
-            # Update the project in the resume data with the updated project
-            enhanced_projects.append(project)
-
-        resume_data.project_experience = enhanced_projects
+        plan = _project_plan(_existing_projects(resume_data), skills)
+        plan.lookup(memo)
+        pending_projects = plan.pending_items
+        enhanced_descriptions = None
+
+        # Enhance every changed project in one call when batching, if the prompt fits the budget and the response validates
+        projects_text = format_project_batch(pending_projects)
+        if _use_batch(mode, pending_projects, project_descriptions_batch_prompt, projects=projects_text, skills=skills):
+            enhanced_descriptions = _try_batch(
+                lambda: create_project_descriptions_batch_openai(projects_text, skills), len(pending_projects))
+
+        # Otherwise generate project_description for each project in project_experience, using current project_name and project_description. Use function create_project_description_openai
+        if enhanced_descriptions is None:
+            enhanced_descriptions = _map_items(
+                lambda project: create_project_description_openai(
+                    project.project_name, project.project_description, skills),
+                pending_projects, lambda project: None)
+
+        # Update the project description in each project with the enhanced project description
+        _memo_record(memo, plan.apply(enhanced_descriptions))
+        return resume_data
+
 
+async def aenhance_project(resume_data: ResumeModel, mode: str = None, memo=None) -> ResumeModel:
+    """Async version of enhance_project()."""
+    skills = _skills_text(resume_data)
+
+    if not resume_data.project_experience:
+        resume_data.project_experience = _load_generated_projects(
+            await acreate_full_project_experience_openai(skills))
+        await asyncio.to_thread(_memo_record, memo, _generated_project_entries(resume_data.project_experience, skills))
         return resume_data
 
+    plan = _project_plan(_existing_projects(resume_data), skills)
+    await asyncio.to_thread(plan.lookup, memo)
+    pending_projects = plan.pending_items
+    enhanced_descriptions = None
+
+    projects_text = format_project_batch(pending_projects)
+    if _use_batch(mode, pending_projects, project_descriptions_batch_prompt, projects=projects_text, skills=skills):
+        enhanced_descriptions = await _atry_batch(
+            lambda: acreate_project_descriptions_batch_openai(projects_text, skills), len(pending_projects))
+
+    if enhanced_descriptions is None:
+        enhanced_descriptions = await _amap_items(
+            lambda project: acreate_project_description_openai(
+                project.project_name, project.project_description, skills),
+            pending_projects, lambda project: None)
+    await asyncio.to_thread(_memo_record, memo, plan.apply(enhanced_descriptions))
+    return resume_data
+
+
+async def astream_project(resume_data: ResumeModel, memo=None):
+    """
+    Streaming version of aenhance_project(), always per item: yields (index, project dict) for each project
+    as soon as it's enhanced (the memo's first), then applies them all once the last is done.
+    Generated projects (when there are none) all arrive together.
+    """
+    skills = _skills_text(resume_data)
+
+    if not resume_data.project_experience:
+        await aenhance_project(resume_data, memo=memo)
+        for i, project in enumerate(resume_data.project_experience):
+            yield i, project if isinstance(project, dict) else project.model_dump()
+        return
+
+    plan = _project_plan(_existing_projects(resume_data), skills)
+    await asyncio.to_thread(plan.lookup, memo)
+    for hit in plan.memo_hits():
+        yield hit
+
+    enhanced_descriptions = [None] * len(plan.pending)
+    async for j, enhanced_project_description in _astream_items(
+            lambda project: acreate_project_description_openai(
+                project.project_name, project.project_description, skills),
+            plan.pending_items, lambda project: None):
+        enhanced_descriptions[j] = enhanced_project_description
+        yield plan.pending[j], plan.as_dict(plan.pending[j], enhanced_project_description)
+    await asyncio.to_thread(_memo_record, memo, plan.apply(enhanced_descriptions))
+
 # ---------------------------- SKILLS ------------------------------------------
 
-def enhance_skills(resume_data: ResumeModel) -> ResumeModel:
-    """Enhance or generate skills section of resume_data using skills in work_experience and project_experience"""
-    # Extract the skills from the skills section
+def _skills_generation_inputs(resume_data: ResumeModel):
+    """Returns the (experience, projects) prompt inputs used to generate skills from scratch."""
+    # Extract the job titles and job summaries from the work experience
+    key_roles = set()
+    for exp in resume_data.work_experience:
+        key_roles.add(exp.job_title.lower())
+        # Here you can also extract other important keywords from job_summary
+    experience = ". ".join(sorted(key_roles))
+
+    # Extract the project names and project descriptions from the project experience
+    key_projects = set()
+    for project in resume_data.project_experience:
+        key_projects.add(project.project_name.lower())
+        # Here you can also extract other important keywords from project_description
+    projects = ". ".join(sorted(key_projects))
+    return experience, projects
+
+
+def _load_skills(enhanced_skills: str):
+    try:
+        return utils.json_repair.loads(enhanced_skills)["skills"]
+    except:
+        enhanced_skills = enhanced_skills.replace('\n',',')
+        print('------nes:', enhanced_skills)
+        return json.loads(f"[{enhanced_skills}]")["skills"]
 
 
+def _skills_fingerprint(resume_data: ResumeModel):
+    # Skills are generated from the roles and projects when there are none, and enhanced from the skills otherwise
     if len(resume_data.skills) == 0:
-        # Generate skills using JOB_TITLE AND JOB_SUMMARY from work_experience and project_name and project_description from project_experience
+        return _fingerprint("full_skills", *_skills_generation_inputs(resume_data))
+    return _fingerprint("enhanced_skills", _skills_text(resume_data))
 
-        # Extract the job titles and job summaries from the work experience
-        key_roles = set()
-        for exp in resume_data.work_experience:
-            key_roles.add(exp.job_title.lower())
-            # Here you can also extract other important keywords from job_summary
-        experience = ". ".join(key_roles)
-
-        # Extract the project names and project descriptions from the project experience
-        key_projects = set()
-        for project in resume_data.project_experience:
-            key_projects.add(project.project_name.lower())
-            # Here you can also extract other important keywords from project_description
-        projects = ". ".join(key_projects)
-
-        # Construct the enhanced skills
-        enhanced_skills = create_full_skills_openai(
-            experience, projects)
-        print('----------- Enahnced skills:', enhanced_skills)
-        
-        try:
-            enhanced_skills = json.loads(enhanced_skills)["skills"]
-        except:
-            enhanced_skills = enhanced_skills.replace('\n',',')
-            print('------nes:', enhanced_skills)
-            enhanced_skills = json.loads(f"[{enhanced_skills}]")["skills"]
 
-        # Update the skills in the resume data with the enhanced skills
-        resume_data.skills = enhanced_skills
+def _skills_entries(fingerprint, enhanced_skills):
+    """Memo entries for a skills result: under its inputs, and as already enhanced under its own skills."""
+    if not isinstance(enhanced_skills, list) or not all(isinstance(skill, str) for skill in enhanced_skills):
+        return {}
+    return {fingerprint: enhanced_skills,
+            _fingerprint("enhanced_skills", _join_skills(enhanced_skills)): enhanced_skills}
 
+
+def enhance_skills(resume_data: ResumeModel, memo=None) -> ResumeModel:
+    """
+    Enhance or generate skills section of resume_data using skills in work_experience and project_experience.
+    memo (a session's SessionMemo) supplies the result when the inputs haven't changed since the skills were enhanced.
+    """
+    fingerprint = _skills_fingerprint(resume_data)
+    cached = _memo_lookup(memo, [fingerprint])[0]
+    if cached is not None:
+        resume_data.skills = cached
         return resume_data
+
+    if len(resume_data.skills) == 0:
+        # Generate skills using JOB_TITLE AND JOB_SUMMARY from work_experience and project_name and project_description from project_experience
+        enhanced_skills = create_full_skills_openai(*_skills_generation_inputs(resume_data))
+        print('----------- Enahnced skills:', enhanced_skills)
     else:
-        key_skills = set()
-        for skill in resume_data.skills:
-            key_skills.add(skill.lower())
-        skills = ".".join(key_skills)
         # enhance existing skills.
-        
-        enhanced_skills = generate_enhanced_skills_openai(skills)
+        enhanced_skills = generate_enhanced_skills_openai(_skills_text(resume_data))
 
-        try:
-            enhanced_skills = json.loads(enhanced_skills)["skills"]
-        except:
-            enhanced_skills = enhanced_skills.replace('\n',',')
-            print('------nes:', enhanced_skills)
-            enhanced_skills = json.loads(f"[{enhanced_skills}]")["skills"]
+    # Update the skills in the resume data with the enhanced skills
+    resume_data.skills = _load_skills(enhanced_skills)
+    _memo_record(memo, _skills_entries(fingerprint, resume_data.skills))
 
-        # Update the skills in the resume data with the enhanced skills
-        resume_data.skills = enhanced_skills
+    return resume_data
+
+
+async def aenhance_skills(resume_data: ResumeModel, memo=None) -> ResumeModel:
+    """Async version of enhance_skills()."""
+    fingerprint = _skills_fingerprint(resume_data)
+    cached = (await asyncio.to_thread(_memo_lookup, memo, [fingerprint]))[0]
+    if cached is not None:
+        resume_data.skills = cached
+        return resume_data
 
-        return resume_data
\ No newline at end of file
+    if len(resume_data.skills) == 0:
+        enhanced_skills = await acreate_full_skills_openai(*_skills_generation_inputs(resume_data))
+    else:
+        enhanced_skills = await agenerate_enhanced_skills_openai(_skills_text(resume_data))
+    resume_data.skills = _load_skills(enhanced_skills)
+    await asyncio.to_thread(_memo_record, memo, _skills_entries(fingerprint, resume_data.skills))
+    return resume_data
+
+# ---------------------------- ALL SECTIONS ------------------------------------------
+# Every section enhancer as a stage of one DAG: stage -> (field it writes, stages it must wait for).
+# Experience, projects and skills do read each other's fields (the summaries and descriptions are written for the
+# skills, and skills are generated from the roles and projects when there are none), but each stage runs on its own
+# deep copy of the resume, so all three read those fields as they were submitted and run concurrently. The objective
+# waits for skills, so it is written from the enhanced ones.
+ENHANCE_STAGES = {
+    "experience": ("work_experience", ()),
+    "projects": ("project_experience", ()),
+    "skills": ("skills", ()),
+    "objective": ("objective", ("skills",)),
+}
+
+
+def _astage_enhancers(mode, memo):
+    return {
+        "experience": lambda resume: aenhance_experience(resume, mode, memo),
+        "projects": lambda resume: aenhance_project(resume, mode, memo),
+        "skills": lambda resume: aenhance_skills(resume, memo),
+        "objective": aenhance_objective,
+    }
+
+
+async def aenhance_all(resume_data: ResumeModel, mode: str = None, memo=None):
+    """
+    Enhances every section of resume_data, running the stages of ENHANCE_STAGES concurrently where
+    they don't depend on each other. Each stage works on its own copy of the resume (with the fields of
+    the stages it waited for already enhanced) and only its own field is merged back, so a stage that
+    fails leaves its section as it was without stopping the others ("unavailable" while the LLM
+    circuit breaker is open).
+
+    Returns:
+        tuple: (resume_data, timings), timings holding each stage's start offset, duration and status.
+    """
+    enhancers = _astage_enhancers(mode, memo)
+    timings = {}
+    started = time.perf_counter()
+    done = {}
+
+    async def _run(stage):
+        field, dependencies = ENHANCE_STAGES[stage]
+        await asyncio.gather(*[done[dependency] for dependency in dependencies])
+        stage_start = time.perf_counter()
+        try:
+            enhanced = await enhancers[stage](resume_data.model_copy(deep=True))
+            setattr(resume_data, field, getattr(enhanced, field))
+            status = "success"
+        except CircuitOpenError:
+            status = "unavailable"
+        except Exception:
+            logging.exception("Enhancing %s failed, keeping the original", stage)
+            status = "failed"
+        timings[stage] = {"start_s": round(stage_start - started, 3),
+                          "duration_s": round(time.perf_counter() - stage_start, 3),
+                          "status": status}
+
+    for stage in ENHANCE_STAGES:
+        done[stage] = asyncio.ensure_future(_run(stage))
+    await asyncio.gather(*done.values())
+    timings["total_s"] = round(time.perf_counter() - started, 3)
+    return resume_data, timings
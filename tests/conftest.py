@@ -0,0 +1,6 @@
+import os
+
+# Offline, and sessions and rate limits in memory rather than in the working directory's SQLite files
+os.environ.setdefault("LLM_BACKEND", "stub")
+os.environ.setdefault("SESSION_DB_URL", "")
+os.environ.setdefault("LLM_RATE_LIMIT_DB", "")
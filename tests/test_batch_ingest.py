@@ -0,0 +1,19 @@
+import json
+import zipfile
+
+from utils.batch_ingest import ingest
+
+
+def test_bad_zip_is_a_failed_document(tmp_path):
+    (tmp_path / "broken.zip").write_bytes(b"not a zip")
+    with zipfile.ZipFile(tmp_path / "good.zip", "w") as archive:
+        archive.writestr("notes.txt", "not a document")
+    output = tmp_path / "results.jsonl"
+
+    report = ingest([str(tmp_path / "broken.zip"), str(tmp_path / "good.zip")], str(output),
+                    extract=lambda raw_text: {}, progress_every=0)
+
+    assert (report["documents"], report["failed"]) == (1, 1)
+    record = json.loads(output.read_text())
+    assert record["file"] == str(tmp_path / "broken.zip")
+    assert record["status"] == "failed" and record["error"].startswith("BadZipFile")
@@ -0,0 +1,55 @@
+import asyncio
+import threading
+
+from utils.cache import LRUCache, SQLiteCache, TieredCache, make_key
+
+
+class RecordingSQLiteCache(SQLiteCache):
+    """SQLiteCache noting the thread each read and write comes from."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.threads = []
+
+    def get(self, key, allow_expired=False):
+        self.threads.append(threading.get_ident())
+        return super().get(key, allow_expired)
+
+    def set(self, key, value):
+        self.threads.append(threading.get_ident())
+        super().set(key, value)
+
+
+def test_disk_hits_are_copied_into_memory(tmp_path):
+    disk = SQLiteCache(str(tmp_path / "cache.db"))
+    disk.set(make_key("prompt"), "reply")
+    cache = TieredCache(LRUCache(8), disk)
+
+    assert cache.get(make_key("prompt")) == "reply"
+    assert cache.get(make_key("prompt")) == "reply"
+    assert cache.get(make_key("other")) is None
+    stats = cache.stats()
+    assert (stats["disk_hits"], stats["memory_hits"], stats["misses"]) == (1, 1, 1)
+
+
+def test_expired_entries_are_only_served_stale(tmp_path):
+    cache = TieredCache(LRUCache(8, ttl=-1, stale_ttl=60), SQLiteCache(str(tmp_path / "cache.db"), ttl=-1, stale_ttl=60))
+    cache.set("key", "reply")
+    assert cache.get("key") is None
+    assert cache.get_stale("key") == "reply"
+
+
+def test_async_accessors_keep_sqlite_off_the_event_loop(tmp_path):
+    disk = RecordingSQLiteCache(str(tmp_path / "cache.db"))
+    cache = TieredCache(LRUCache(8), disk)
+
+    async def use():
+        await cache.aset("key", "reply")
+        cache.memory.delete("key")
+        assert await cache.aget("key") == "reply"
+        assert await cache.aget("missing") is None
+        assert await cache.aget_stale("key") == "reply"
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(use())
+    assert len(disk.threads) == 3 and loop_thread not in disk.threads
@@ -0,0 +1,54 @@
+import time
+
+import httpx
+import openai
+import pytest
+
+from utils.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+
+def _call(breaker, error=None):
+    with breaker.guard():
+        if error is not None:
+            raise error
+
+
+def _connection_error():
+    return openai.APIConnectionError(request=httpx.Request("POST", "https://api.test"))
+
+
+def test_opens_on_failures_and_closes_after_a_good_probe():
+    breaker = CircuitBreaker(window=60, min_calls=4, error_rate=0.5, latency_p95=0, open_seconds=0.05)
+    _call(breaker)
+    _call(breaker)
+    for _ in range(2):
+        with pytest.raises(openai.APIConnectionError):
+            _call(breaker, _connection_error())
+    assert breaker.state == OPEN
+
+    # Refused at once while open
+    with pytest.raises(CircuitOpenError):
+        _call(breaker)
+    time.sleep(0.06)
+    breaker.check()
+    assert breaker.state == HALF_OPEN
+    _call(breaker)
+    assert breaker.state == CLOSED
+    assert breaker.stats()["opened"] == 1
+
+
+def test_failed_probe_reopens():
+    breaker = CircuitBreaker(min_calls=1, error_rate=0.5, latency_p95=0, open_seconds=0.05)
+    with pytest.raises(openai.APIConnectionError):
+        _call(breaker, _connection_error())
+    time.sleep(0.06)
+    with pytest.raises(openai.APIConnectionError):
+        _call(breaker, _connection_error())
+    assert breaker.state == OPEN
+
+
+def test_errors_that_arent_the_backends_fault_dont_count():
+    breaker = CircuitBreaker(min_calls=1, error_rate=0.5, latency_p95=0)
+    with pytest.raises(ValueError):
+        _call(breaker, ValueError("bad prompt"))
+    assert breaker.state == CLOSED and breaker.stats()["window_calls"] == 0
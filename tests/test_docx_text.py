@@ -0,0 +1,48 @@
+import io
+import zipfile
+
+import pytest
+
+from utils.docx_text import DocxTextError, extract_docx_text
+
+W = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+MC = "http://schemas.openxmlformats.org/markup-compatibility/2006"
+
+
+def make_docx(body):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        archive.writestr("word/document.xml", f'<w:document xmlns:w="{W}" xmlns:mc="{MC}"><w:body>{body}</w:body></w:document>')
+    return buffer.getvalue()
+
+
+def paragraph(*runs):
+    return "<w:p>" + "".join(f"<w:r>{run}</w:r>" for run in runs) + "</w:p>"
+
+
+def test_paragraphs_tables_and_characters():
+    docx = make_docx(
+        paragraph("<w:t>Jane</w:t>", "<w:t xml:space='preserve'> Doe</w:t>")
+        + '<w:p><w:pPr><w:tabs><w:tab w:val="left" w:pos="720"/></w:tabs></w:pPr><w:r><w:t>a</w:t><w:tab/><w:t>b</w:t></w:r></w:p>'
+        + "<w:tbl><w:tr><w:tc>" + paragraph("<w:t>In a cell</w:t>") + "</w:tc></w:tr></w:tbl>"
+    )
+    assert extract_docx_text(docx) == "Jane Doe\na\tb\nIn a cell"
+
+
+def test_text_boxes_are_read_once():
+    text_box = paragraph("<w:t>Boxed</w:t>")
+    docx = make_docx(
+        "<w:p><w:r><mc:AlternateContent><mc:Choice>" + text_box + "</mc:Choice>"
+        "<mc:Fallback>" + text_box + "</mc:Fallback></mc:AlternateContent></w:r><w:r><w:t>Anchor</w:t></w:r></w:p>"
+    )
+    assert extract_docx_text(docx) == "Boxed\nAnchor"
+
+
+def test_files_that_arent_docx():
+    with pytest.raises(DocxTextError):
+        extract_docx_text(b"not a zip")
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        archive.writestr("word/document.xml", "<w:document")
+    with pytest.raises(DocxTextError):
+        extract_docx_text(buffer.getvalue())
@@ -0,0 +1,87 @@
+import asyncio
+
+import functions
+from utils.dataclass import BasicInfoModel, ProjectExperienceModel, ResumeModel, WorkExperienceModel
+from utils.session_store import MemorySessionBackend, SessionStore
+
+
+def make_resume(skills):
+    return ResumeModel(
+        basic_info=BasicInfoModel(**{field: None for field in BasicInfoModel.model_fields}),
+        objective=None,
+        work_experience=[WorkExperienceModel(job_title="Engineer", company="Acme", location=None, duration=None,
+                                             job_summary="Wrote code.")],
+        education=[],
+        project_experience=[ProjectExperienceModel(project_name="Parser", project_description="Parsed things.")],
+        skills=skills,
+    )
+
+
+def new_memo():
+    return SessionStore(MemorySessionBackend()).memo("0" * 32)
+
+
+def test_experience_is_re_enhanced_when_skills_change(monkeypatch):
+    calls = []
+
+    def create_job_summary(exp, skills):
+        calls.append(skills)
+        return f"Enhanced with {skills}."
+
+    monkeypatch.setattr(functions, "create_job_summary_openai", create_job_summary)
+    memo = new_memo()
+    resume = functions.enhance_experience(make_resume(["Python"]), "per_item", memo)
+    assert calls == ["python"]
+
+    # Unchanged, and the enhanced resume posted back: both answered from the memo
+    functions.enhance_experience(make_resume(["Python"]), "per_item", memo)
+    functions.enhance_experience(resume, "per_item", memo)
+    assert calls == ["python"]
+
+    # New skills are a new input, for the enhanced experience as much as for the original
+    resume.skills = ["Python", "SQL"]
+    functions.enhance_experience(resume, "per_item", memo)
+    assert calls == ["python", "python.sql"]
+    assert resume.work_experience[0].job_summary == "Enhanced with python.sql."
+
+
+def test_project_is_re_enhanced_when_skills_change(monkeypatch):
+    calls = []
+
+    async def acreate_project_description(name, description, skills):
+        calls.append(skills)
+        return f"Enhanced with {skills}."
+
+    monkeypatch.setattr(functions, "acreate_project_description_openai", acreate_project_description)
+    memo = new_memo()
+    resume = asyncio.run(functions.aenhance_project(make_resume(["Python"]), "per_item", memo))
+    asyncio.run(functions.aenhance_project(resume, "per_item", memo))
+    assert calls == ["python"]
+
+    resume.skills = ["Go"]
+    asyncio.run(functions.aenhance_project(resume, "per_item", memo))
+    assert calls == ["python", "go"]
+
+
+def test_failed_batch_call_falls_back_to_per_item_calls(monkeypatch):
+    def create_job_summaries_batch(experiences, skills):
+        raise TimeoutError("batch call timed out")
+
+    async def acreate_project_descriptions_batch(projects, skills):
+        raise TimeoutError("batch call timed out")
+
+    async def acreate_project_description(name, description, skills):
+        return f"{name} enhanced."
+
+    monkeypatch.setattr(functions, "create_job_summaries_batch_openai", create_job_summaries_batch)
+    monkeypatch.setattr(functions, "create_job_summary_openai", lambda exp, skills: f"{exp.job_title} enhanced.")
+    monkeypatch.setattr(functions, "acreate_project_descriptions_batch_openai", acreate_project_descriptions_batch)
+    monkeypatch.setattr(functions, "acreate_project_description_openai", acreate_project_description)
+    resume = make_resume(["Python"])
+    resume.work_experience.append(resume.work_experience[0].model_copy(update={"job_title": "Lead"}))
+    resume.project_experience.append(resume.project_experience[0].model_copy(update={"project_name": "Linter"}))
+
+    functions.enhance_experience(resume, "batch")
+    asyncio.run(functions.aenhance_project(resume, "batch"))
+    assert [exp.job_summary for exp in resume.work_experience] == ["Engineer enhanced.", "Lead enhanced."]
+    assert [project.project_description for project in resume.project_experience] == ["Parser enhanced.", "Linter enhanced."]
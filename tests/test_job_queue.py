@@ -0,0 +1,52 @@
+import time
+
+import pytest
+
+from utils.job_queue import DONE, FAILED, QUEUED, RUNNING, JobWorkers, MemoryJobQueue, QueueFullError, SQLiteJobQueue
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def queue(request, tmp_path):
+    if request.param == "memory":
+        return MemoryJobQueue(max_depth=2, lease=60)
+    return SQLiteJobQueue(str(tmp_path / "jobs.db"), max_depth=2, lease=60)
+
+
+def test_jobs_are_claimed_once_in_order(queue):
+    first = queue.enqueue("echo", {"n": 1})
+    second = queue.enqueue("echo", {"n": 2})
+    with pytest.raises(QueueFullError):
+        queue.enqueue("echo", {"n": 3})
+    assert queue.get(second)["position"] == 1
+
+    assert queue.claim() == (first, "echo", {"n": 1}, 1)
+    assert queue.claim() == (second, "echo", {"n": 2}, 1)
+    assert queue.claim() is None
+    queue.finish(first, result={"ok": True})
+    queue.finish(second, error="ValueError: bad")
+    assert (queue.get(first)["status"], queue.get(first)["result"]) == (DONE, {"ok": True})
+    assert (queue.get(second)["status"], queue.get(second)["error"]) == (FAILED, "ValueError: bad")
+
+
+def test_expired_lease_is_claimed_again(queue):
+    queue.lease = -1
+    job_id = queue.enqueue("echo", {})
+    queue.claim()
+    assert queue.claim() == (job_id, "echo", {}, 2)
+
+
+def test_workers_run_jobs_and_record_failures(queue):
+    def fail(payload):
+        raise ValueError("bad payload")
+
+    workers = JobWorkers(queue, {"echo": lambda payload: payload, "fail": fail}, workers=1, poll_interval=0.01)
+    ok, failed = queue.enqueue("echo", {"n": 1}), queue.enqueue("fail", {})
+    workers.start()
+    try:
+        deadline = time.time() + 5
+        while queue.get(failed)["status"] in (QUEUED, RUNNING) and time.time() < deadline:
+            time.sleep(0.01)
+    finally:
+        workers.stop()
+    assert queue.get(ok)["result"] == {"n": 1}
+    assert queue.get(failed)["error"] == "ValueError: bad payload"
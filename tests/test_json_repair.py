@@ -0,0 +1,30 @@
+import json
+
+import pytest
+
+from utils.json_repair import loads, repair_json
+
+
+def test_commas_and_brackets_inside_strings_are_kept():
+    assert loads('{"a": "x, ]", "b": ["y, }",],}') == {"a": "x, ]", "b": ["y, }"]}
+
+
+def test_truncated_after_key_drops_the_key():
+    assert loads('{"a":') == {}
+    assert loads('{"a": 1, "b": ') == {"a": 1}
+
+
+def test_truncated_string_element_is_closed():
+    assert loads('["x", "y') == ["x", "y"]
+    assert loads('{"skills": ["Python", "SQ') == {"skills": ["Python", "SQ"]}
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('```json\n{"a": [1, 2,],}\n```', {"a": [1, 2]}),
+    ('Here you go: {"a": "b"} Hope this helps!', {"a": "b"}),
+    ('{"a": {"b": "c", "d', {"a": {"b": "c"}}),
+    ('{"a": 1, "b": 2', {"a": 1, "b": 2}),
+    ('{"a": 1, "b": tr', {"a": 1}),
+])
+def test_repair(text, expected):
+    assert json.loads(repair_json(text)) == expected
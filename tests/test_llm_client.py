@@ -0,0 +1,31 @@
+import threading
+from types import SimpleNamespace
+
+import utils.llm_client
+from utils.llm_client import counting_usage
+
+
+def _record(prompt_tokens, completion_tokens):
+    message = SimpleNamespace(response_metadata={"token_usage": {"prompt_tokens": prompt_tokens,
+                                                                 "completion_tokens": completion_tokens}})
+    utils.llm_client._record_usage("test-model", [], None, message, "")
+
+
+def test_counting_usage_only_sees_its_own_calls():
+    with counting_usage() as counts:
+        _record(10, 5)
+        # Another thread's call, e.g. an API request served at the same time
+        other = threading.Thread(target=_record, args=(100, 50))
+        other.start()
+        other.join()
+
+        def in_a_worker():
+            with counting_usage(counts):
+                _record(1, 2)
+        worker = threading.Thread(target=in_a_worker)
+        worker.start()
+        worker.join()
+    _record(1000, 500)
+
+    assert counts == {"calls": 2, "prompt_tokens": 11, "completion_tokens": 7}
+    assert utils.llm_client.usage_stats()["by_model"]["test-model"]["calls"] >= 4
@@ -0,0 +1,59 @@
+from utils.pre_extract import apply_known, pre_extract
+
+HEADER = "Jane Doe\njane@example.com | +1 (555) 123-4567\nwww.janedoe.dev | linkedin.com/in/janedoe\n"
+
+
+def test_contact_details():
+    assert pre_extract(HEADER)["basic_info"] == {
+        "email": "jane@example.com",
+        "phone_number": "+1 (555) 123-4567",
+        "portfolio_website_url": "www.janedoe.dev",
+        "linkedin_url": "linkedin.com/in/janedoe",
+    }
+
+
+def test_skill_names_are_not_portfolio_urls():
+    basic_info = pre_extract("Jane Doe\nSkills: C#, ASP.NET, Socket.io, Node.js")["basic_info"]
+    assert "portfolio_website_url" not in basic_info
+
+
+def test_years_and_reference_numbers_are_not_phone_numbers():
+    assert "phone_number" not in pre_extract("Jane Doe\nID 2019 2020 2021")["basic_info"]
+    assert "phone_number" not in pre_extract("Jane Doe\nReference number: 12345678")["basic_info"]
+    assert pre_extract("Jane Doe\nMobile: 0412345678")["basic_info"]["phone_number"] == "0412345678"
+
+
+def test_phone_and_portfolio_only_come_from_contact_lines():
+    body = "\n".join(f"Bullet point {i}" for i in range(20))
+    text = f"Jane Doe\n{body}\nManaged account 0412 345 678 at https://client.example.com\n"
+    basic_info = pre_extract(text)["basic_info"]
+    assert "phone_number" not in basic_info
+    assert "portfolio_website_url" not in basic_info
+    # A labelled line further down is still contact details
+    assert pre_extract(f"Jane Doe\n{body}\nPhone: 0412 345 678\n")["basic_info"]["phone_number"] == "0412 345 678"
+
+
+def _answer(*universities):
+    return {"basic_info": {}, "education": [{"university": name, "GPA": "from the LLM"} for name in universities]}
+
+
+def test_gpa_of_the_only_entry():
+    known = pre_extract(HEADER + "Education\nState University, BSc 2015, GPA: 3.7/4.0\n")
+    assert apply_known(_answer("State University"), known)["education"][0]["GPA"] == "3.7/4.0"
+
+
+def test_gpa_goes_to_the_entry_it_follows():
+    known = pre_extract(HEADER + "Education\nTech Institute, MSc 2018, GPA 3.9\nState University, BSc 2015\n")
+    answer = apply_known(_answer("Tech Institute", "State University"), known)
+    assert [education["GPA"] for education in answer["education"]] == ["3.9", "from the LLM"]
+
+    # Only the second degree lists one: the first keeps the LLM's answer
+    known = pre_extract(HEADER + "Education\nTech Institute, MSc 2018\nState University, BSc 2015, GPA 3.5/4\n")
+    answer = apply_known(_answer("Tech Institute", "State University"), known)
+    assert [education["GPA"] for education in answer["education"]] == ["from the LLM", "3.5/4"]
+
+
+def test_gpa_that_cant_be_tied_is_left_to_the_llm():
+    known = pre_extract(HEADER + "GPA: 3.2\nEducation\nTech Institute, MSc\nState University, BSc\n")
+    answer = apply_known(_answer("Tech Institute", "State University"), known)
+    assert [education["GPA"] for education in answer["education"]] == ["from the LLM", "from the LLM"]
@@ -0,0 +1,54 @@
+import asyncio
+import threading
+
+import httpx
+import openai
+import pytest
+
+from utils.rate_limit import BATCH, INTERACTIVE, MemoryBuckets, RateLimiter
+
+
+class RecordingBuckets(MemoryBuckets):
+    """MemoryBuckets noting the thread each call to the shared state comes from."""
+
+    def __init__(self, limits):
+        super().__init__(limits)
+        self.threads = []
+
+    def adjust(self, costs):
+        self.threads.append(threading.get_ident())
+        super().adjust(costs)
+
+    def pause(self, seconds):
+        self.threads.append(threading.get_ident())
+        super().pause(seconds)
+
+
+def _rate_limit_error():
+    response = httpx.Response(429, headers={"retry-after": "0"}, request=httpx.Request("POST", "https://api.test"))
+    return openai.RateLimitError("Too many requests", response=response, body=None)
+
+
+def test_batch_calls_leave_the_reserve_alone():
+    limiter = RateLimiter(MemoryBuckets({"requests": 10, "tokens": 1000}), batch_reserve=0.5)
+    assert not limiter._try(400, BATCH)
+    limiter.release()
+    assert limiter._try(200, BATCH)
+    # Interactive calls may use the reserve
+    assert not limiter._try(500, INTERACTIVE)
+
+
+def test_async_settle_and_throttle_stay_off_the_event_loop():
+    buckets = RecordingBuckets({"requests": 10, "tokens": 1000})
+    limiter = RateLimiter(buckets)
+
+    async def call():
+        await limiter.asettle(100, 150)
+        with pytest.raises(openai.RateLimitError):
+            async with limiter.aslot(100):
+                raise _rate_limit_error()
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(call())
+    assert len(buckets.threads) == 2 and loop_thread not in buckets.threads
+    assert limiter.stats()["throttled"] == 1
@@ -0,0 +1,55 @@
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+import api
+from utils.dataclass import BasicInfoModel, ResumeModel
+from utils.session_store import MemorySessionBackend, SessionStore
+
+
+def make_resume(objective):
+    return ResumeModel(basic_info=BasicInfoModel(**{field: None for field in BasicInfoModel.model_fields}),
+                       objective=objective, work_experience=[], education=[], project_experience=[], skills=[])
+
+
+@pytest.fixture
+def store(monkeypatch):
+    store = SessionStore(MemorySessionBackend())
+    monkeypatch.setattr(api.utils.session_store, "sessions", store)
+    return store
+
+
+def test_replace_never_creates_a_session(store):
+    unknown = uuid.uuid4().hex
+    assert store.replace(unknown, make_resume("New")) is None
+    assert store.get(unknown) is None
+
+    session_id = store.create(make_resume("First"))
+    assert store.replace(session_id, make_resume("Second")) is not None
+    assert store.get(session_id).objective == "Second"
+
+
+def test_copies_dont_touch_the_stored_resume(store):
+    session_id = store.create(make_resume("First"))
+    store.get(session_id).objective = "Changed"
+    assert store.get(session_id).objective == "First"
+
+
+def test_unknown_session_ids_are_not_found(store):
+    client = TestClient(api.app)
+    headers = {api.SESSION_HEADER: uuid.uuid4().hex}
+    assert client.get("/get-resume/", headers=headers).status_code == 404
+    assert client.post("/upload-text/", json={"text": "Jane Doe"}, headers=headers).status_code == 404
+    assert client.post("/jobs/upload-text/", json={"text": "Jane Doe"}, headers=headers).status_code == 404
+    assert not store.backend.state(headers[api.SESSION_HEADER])
+
+
+def test_uploads_create_sessions_and_replace_their_resume(store):
+    client = TestClient(api.app)
+    response = client.post("/upload-text/", json={"text": "Jane Doe\njane@example.com"})
+    session_id = response.headers[api.SESSION_HEADER]
+    assert store.get(session_id) is not None
+
+    again = client.post("/upload-text/", json={"text": "Jane Doe\njane@example.com"}, headers={api.SESSION_HEADER: session_id})
+    assert again.status_code == 200 and again.headers[api.SESSION_HEADER] == session_id
@@ -0,0 +1,275 @@
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+import utils.extract_resume
+import utils.llm_client
+import utils.pdf_pool
+import utils.rate_limit
+import utils.circuit_breaker
+import utils.utils_file
+import threading
+import argparse
+import hashlib
+import zipfile
+import json
+import time
+import io
+import os
+
+load_dotenv()
+
+########################################################################################
+#                           BATCH RESUME INGESTION                                     #
+########################################################################################
+
+# Documents parsed at once and resumes extracted at once, both in threads. PDF pages are laid out in utils.pdf_pool's
+# process pool (PDF_WORKERS processes), the same one the upload endpoints use, so batches add no processes of their own
+BATCH_PARSE_WORKERS = int(os.getenv("BATCH_PARSE_WORKERS", "4"))
+BATCH_EXTRACT_CONCURRENCY = int(os.getenv("BATCH_EXTRACT_CONCURRENCY", "8"))
+# Larger documents (or zip members claiming to be) are recorded as failed rather than read into memory
+BATCH_MAX_FILE_BYTES = int(os.getenv("BATCH_MAX_FILE_BYTES", str(20 * 1024 * 1024)))
+# How long a document waits for the LLM backend while the circuit breaker is open. Once one gives up, the rest of the
+# run's documents fail at once instead of each waiting in turn, and are retried when the run is resumed
+BATCH_BACKEND_WAIT = float(os.getenv("BATCH_BACKEND_WAIT", "600"))
+
+DOCUMENT_EXTENSIONS = (".pdf", ".docx")
+
+
+class ExtractionFailed(Exception):
+    """The document had no text, or the LLM never gave a valid answer."""
+
+
+def iter_documents(inputs):
+    """
+    Yields (name, read) for every PDF and DOCX among the inputs, read() returning the document's bytes. A zip file that
+    can't be opened is yielded as itself, with a read() that raises why.
+
+    Args:
+        inputs (list): Paths of documents, directories (searched recursively) and zip files (their documents).
+    """
+    for path in inputs:
+        if os.path.isdir(path):
+            for directory, _, file_names in sorted(os.walk(path)):
+                yield from iter_documents([os.path.join(directory, file_name) for file_name in sorted(file_names)])
+        elif path.lower().endswith(".zip"):
+            try:
+                with zipfile.ZipFile(path) as archive:
+                    members = archive.infolist()
+            except (zipfile.BadZipFile, OSError) as e:
+                # Recorded as the one failed document rather than ending the run
+                yield path, _failed_reader(e)
+                continue
+            for member in members:
+                if member.is_dir() or member.filename.startswith("__MACOSX/") \
+                        or not member.filename.lower().endswith(DOCUMENT_EXTENSIONS):
+                    continue
+                yield f"{path}/{member.filename}", _zip_reader(path, member)
+        elif path.lower().endswith(DOCUMENT_EXTENSIONS):
+            yield path, _file_reader(path)
+
+
+def _zip_reader(path, member):
+    def read():
+        if member.file_size > BATCH_MAX_FILE_BYTES:
+            raise ValueError(f"{member.file_size} bytes uncompressed, over BATCH_MAX_FILE_BYTES")
+        with zipfile.ZipFile(path) as archive:
+            return archive.read(member)
+    return read
+
+
+def _failed_reader(error):
+    def read():
+        raise error
+    return read
+
+
+def _file_reader(path):
+    def read():
+        if os.path.getsize(path) > BATCH_MAX_FILE_BYTES:
+            raise ValueError(f"{os.path.getsize(path)} bytes, over BATCH_MAX_FILE_BYTES")
+        with open(path, "rb") as f:
+            return f.read()
+    return read
+
+
+def parse_document(name, data):
+    """Raw text of a PDF or DOCX given its bytes (runs in the parse threads)."""
+    if name.lower().endswith(".pdf"):
+        return utils.utils_file.parse_pdf(io.BytesIO(data), clean=False)
+    return utils.utils_file.parse_docx(io.BytesIO(data), clean=False)
+
+
+def extract_document(raw_text):
+    """
+    Extracts a resume from a document's raw text the way /upload-text/ does (see
+    utils.extract_resume.extract_raw_text()), sharing its extraction cache and corrections.
+
+    Returns:
+        dict: The resume in ResumeModel's shape.
+
+    Raises:
+        ExtractionFailed: If the LLM never gave a valid answer.
+    """
+    resume_model = utils.extract_resume.extract_raw_text(raw_text)
+    if resume_model is None:
+        raise ExtractionFailed("No valid response from the LLM")
+    return resume_model.model_dump()
+
+
+def _extract_when_available(extract, raw_text, gave_up):
+    # Interactive requests to the API go first when the LLM budget runs short, and while the LLM backend is down
+    # the batch waits for it (up to BATCH_BACKEND_WAIT) rather than failing every remaining document at once.
+    # gave_up is the run's threading.Event, set once a document has waited in vain
+    with utils.rate_limit.priority(utils.rate_limit.BATCH):
+        waited = 0.0
+        while True:
+            try:
+                return extract(raw_text)
+            except utils.circuit_breaker.CircuitOpenError as e:
+                if gave_up.is_set() or waited >= BATCH_BACKEND_WAIT:
+                    gave_up.set()
+                    raise
+                delay = min(max(1.0, e.retry_after), BATCH_BACKEND_WAIT - waited)
+                time.sleep(delay)
+                waited += delay
+
+
+def completed_digests(output_path):
+    """The sha256 digests of the documents output_path already holds a successful result for."""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A line cut short by a crash; that document is simply done again
+                continue
+            if record.get("status") == "ok":
+                done.add(record["sha256"])
+    return done
+
+
+def ingest(inputs, output_path, parse_workers=None, concurrency=None, extract=extract_document, progress_every=50):
+    """
+    Parses and extracts every document among the inputs, appending one JSON line per document to
+    output_path: {"file", "sha256", "status": "ok" | "failed", "resume" or "error", "seconds"}.
+    Documents output_path already has a successful line for (by content) are skipped, so a run
+    that crashed or was stopped picks up where it left off when started again.
+
+    Args:
+        inputs (list): Paths of documents, directories and zip files, see iter_documents().
+        output_path (str): The JSONL file to append to.
+        parse_workers (int): Documents parsed at once, defaults to BATCH_PARSE_WORKERS.
+        concurrency (int): Extractions at once, defaults to BATCH_EXTRACT_CONCURRENCY.
+        extract (callable): Raw text -> resume dict, raising on failure; defaults to extract_document().
+        progress_every (int): Print progress after every this many documents (0 for never).
+
+    Returns:
+        dict: The run's report: documents seen, skipped, succeeded and failed, wall time, documents
+              per minute, LLM calls and tokens, and the failures as (file, error) pairs.
+    """
+    parse_workers = parse_workers or BATCH_PARSE_WORKERS
+    concurrency = concurrency or BATCH_EXTRACT_CONCURRENCY
+    done = completed_digests(output_path)
+    started = time.perf_counter()
+    report = {"documents": 0, "skipped": 0, "succeeded": 0, "failed": 0, "failures": []}
+    lock = threading.Lock()
+    backend_gave_up = threading.Event()
+    # Documents between being read and their line being written; bounds the bytes and texts held in memory
+    window = threading.BoundedSemaphore(parse_workers * 2 + concurrency)
+
+    directory = os.path.dirname(output_path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+
+    # The run's own LLM usage; the API or another run in this process may be spending tokens at the same time
+    with utils.llm_client.counting_usage() as run_usage, \
+            open(output_path, "a", encoding="utf-8") as output, \
+            ThreadPoolExecutor(max_workers=parse_workers) as parse_pool, \
+            ThreadPoolExecutor(max_workers=concurrency) as extract_pool:
+
+        def write(name, digest, document_started, resume=None, error=None):
+            record = {"file": name, "sha256": digest, "status": "failed" if error else "ok",
+                      "seconds": round(time.perf_counter() - document_started, 3)}
+            record.update({"error": error} if error else {"resume": resume})
+            with lock:
+                output.write(json.dumps(record, ensure_ascii=False) + "\n")
+                output.flush()
+                report["failed" if error else "succeeded"] += 1
+                if error:
+                    report["failures"].append((name, error))
+                finished = report["succeeded"] + report["failed"]
+                if progress_every and finished % progress_every == 0:
+                    elapsed = time.perf_counter() - started
+                    print(f"- - - {finished} documents done ({report['failed']} failed), {finished / elapsed * 60:.1f}/min")
+            window.release()
+
+        def extract_parsed(name, digest, document_started, parsed):
+            try:
+                raw_text = parsed.result()
+                if not raw_text.strip():
+                    raise ExtractionFailed("No text in the document (scanned?)")
+                with utils.llm_client.counting_usage(run_usage):
+                    resume = _extract_when_available(extract, raw_text, backend_gave_up)
+                write(name, digest, document_started, resume=resume)
+            except Exception as e:
+                write(name, digest, document_started, error=f"{type(e).__name__}: {e}")
+
+        for name, read in iter_documents(inputs):
+            report["documents"] += 1
+            window.acquire()
+            document_started = time.perf_counter()
+            try:
+                data = read()
+            except Exception as e:
+                write(name, None, document_started, error=f"{type(e).__name__}: {e}")
+                continue
+            digest = hashlib.sha256(data).hexdigest()
+            if digest in done:
+                report["skipped"] += 1
+                window.release()
+                continue
+            # Identical files in the same run are only extracted once
+            done.add(digest)
+            parsed = parse_pool.submit(parse_document, name, data)
+            parsed.add_done_callback(
+                lambda parsed, name=name, digest=digest, document_started=document_started:
+                    extract_pool.submit(extract_parsed, name, digest, document_started, parsed))
+
+        # Every document releases the window once its line is written; wait until all have
+        for _ in range(parse_workers * 2 + concurrency):
+            window.acquire()
+
+    elapsed = time.perf_counter() - started
+    processed = report["succeeded"] + report["failed"]
+    report.update({
+        "seconds": round(elapsed, 2),
+        "documents_per_minute": round(processed / elapsed * 60, 2) if elapsed else 0.0,
+        "llm_calls": run_usage["calls"],
+        "prompt_tokens": run_usage["prompt_tokens"],
+        "completion_tokens": run_usage["completion_tokens"],
+    })
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Extract resumes from PDFs and DOCX files (or zips of them) into a JSONL file. "
+                                                 "Run it again with the same output to resume an interrupted run.")
+    parser.add_argument("inputs", nargs="+", help="documents, directories or zip files")
+    parser.add_argument("-o", "--output", default="results.jsonl", help="JSONL file to append results to")
+    parser.add_argument("--parse-workers", type=int, default=None, help=f"documents parsed at once (default {BATCH_PARSE_WORKERS})")
+    parser.add_argument("--concurrency", type=int, default=None, help=f"extractions at once (default {BATCH_EXTRACT_CONCURRENCY})")
+    args = parser.parse_args(argv)
+
+    try:
+        report = ingest(args.inputs, args.output, args.parse_workers, args.concurrency)
+    finally:
+        utils.pdf_pool.shutdown()
+    print(f"{report['documents']} documents: {report['succeeded']} extracted, {report['failed']} failed, "
+          f"{report['skipped']} already done")
+    print(f"{report['seconds']}s, {report['documents_per_minute']} documents/min, {report['llm_calls']} LLM calls, "
+          f"{report['prompt_tokens']} prompt + {report['completion_tokens']} completion tokens")
+    for name, error in report["failures"]:
+        print(f"  failed: {name}: {error}")
+    return report
@@ -0,0 +1,231 @@
+from collections import OrderedDict
+import hashlib
+import asyncio
+import sqlite3
+import threading
+import json
+import time
+import os
+
+########################################################################################
+#                           CACHES - MEMORY LRU & SQLITE                               #
+########################################################################################
+
+def make_key(*parts):
+    """
+    Hashes any JSON-serialisable parts into a stable cache key.
+
+    Returns:
+        str: The hex sha256 digest of the parts.
+    """
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _expired(stored_at, ttl, stale_ttl, allow_expired):
+    # (miss, drop): whether a read misses the entry, and whether the entry is past keeping at all
+    if ttl is None:
+        return False, False
+    age = time.time() - stored_at
+    if age <= ttl:
+        return False, False
+    drop = age > ttl + stale_ttl
+    return drop or not allow_expired, drop
+
+
+class LRUCache:
+    """
+    Thread-safe in-process cache holding at most max_entries values, least recently used evicted first.
+    Entries older than ttl seconds are misses, but are kept stale_ttl seconds longer for get(allow_expired=True).
+    """
+
+    def __init__(self, max_entries=1024, ttl=None, stale_ttl=0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key, allow_expired=False):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, stored_at = entry
+            miss, drop = _expired(stored_at, self.ttl, self.stale_ttl, allow_expired)
+            if drop:
+                del self._entries[key]
+            if miss:
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteCache:
+    """
+    On-disk string cache in a SQLite file, safe to share between threads and worker processes.
+    Entries older than ttl seconds are treated as missing (kept stale_ttl seconds longer for
+    get(allow_expired=True)), and once the table grows past max_entries the least recently
+    read entries are evicted.
+    """
+
+    # Eviction needs a COUNT(*), so it's only checked every few writes
+    EVICT_EVERY = 64
+
+    def __init__(self, path, max_entries=100000, ttl=None, table="cache", stale_ttl=0):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.table = table
+        self._lock = threading.Lock()
+        self._writes = 0
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL, accessed_at REAL NOT NULL)")
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_accessed_at ON {table} (accessed_at)")
+        self._evict()
+
+    def get(self, key, allow_expired=False):
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value, stored_at FROM {self.table} WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, stored_at = row
+            miss, drop = _expired(stored_at, self.ttl, self.stale_ttl, allow_expired)
+            if drop:
+                self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+            if miss:
+                return None
+            self._conn.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            return value
+
+    def set(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, stored_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now, now))
+            self._writes += 1
+            if self._writes % self.EVICT_EVERY == 0:
+                self._evict()
+
+    def delete(self, key):
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def _evict(self):
+        if self.ttl is not None:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE stored_at < ?",
+                               (time.time() - self.ttl - self.stale_ttl,))
+        count = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+        if count > self.max_entries:
+            self._conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN "
+                f"(SELECT key FROM {self.table} ORDER BY accessed_at LIMIT ?)",
+                (count - self.max_entries,))
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+
+class TieredCache:
+    """An LRUCache in front of an optional SQLiteCache, counting hits and misses per tier."""
+
+    def __init__(self, memory, disk=None):
+        self.memory = memory
+        self.disk = disk
+        self._lock = threading.Lock()
+        self._counts = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        self._stale_hits = 0
+
+    def _count(self, name):
+        with self._lock:
+            self._counts[name] += 1
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is not None:
+            self._count("memory_hits")
+            return value
+        return self._get_disk(key)
+
+    def _get_disk(self, key):
+        if self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                self._count("disk_hits")
+                self.memory.set(key, value)
+                return value
+        self._count("misses")
+        return None
+
+    async def aget(self, key):
+        """get() for coroutines: the memory tier is read on the event loop, the SQLite tier in a thread."""
+        value = self.memory.get(key)
+        if value is not None:
+            self._count("memory_hits")
+            return value
+        if self.disk is None:
+            self._count("misses")
+            return None
+        return await asyncio.to_thread(self._get_disk, key)
+
+    def get_stale(self, key):
+        """Returns the value even if it expired (within the tiers' stale_ttl), or None. Meant for when the source is down."""
+        value = self.memory.get(key, allow_expired=True)
+        if value is None and self.disk is not None:
+            # Not copied into memory, where it would count as fresh again
+            value = self.disk.get(key, allow_expired=True)
+        if value is not None:
+            with self._lock:
+                self._stale_hits += 1
+        return value
+
+    async def aget_stale(self, key):
+        return await asyncio.to_thread(self.get_stale, key)
+
+    def set(self, key, value):
+        self.memory.set(key, value)
+        if self.disk is not None:
+            self.disk.set(key, value)
+
+    async def aset(self, key, value):
+        self.memory.set(key, value)
+        if self.disk is not None:
+            await asyncio.to_thread(self.disk.set, key, value)
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._counts)
+            stale_hits = self._stale_hits
+        lookups = sum(counts.values())
+        counts["hit_rate"] = round((counts["memory_hits"] + counts["disk_hits"]) / lookups, 4) if lookups else 0.0
+        counts["stale_hits"] = stale_hits
+        counts["memory_entries"] = len(self.memory)
+        if self.disk is not None:
+            counts["disk_entries"] = len(self.disk)
+        return counts
@@ -0,0 +1,153 @@
+from collections import deque
+from contextlib import contextmanager
+from dotenv import load_dotenv
+import utils.retry
+import threading
+import time
+import os
+
+load_dotenv()
+
+########################################################################################
+#                           CIRCUIT BREAKER - LLM BACKEND                              #
+########################################################################################
+
+# Calls of the last LLM_BREAKER_WINDOW seconds are judged once there are at least LLM_BREAKER_MIN_CALLS of them
+LLM_BREAKER_WINDOW = float(os.getenv("LLM_BREAKER_WINDOW", "60"))
+LLM_BREAKER_MIN_CALLS = int(os.getenv("LLM_BREAKER_MIN_CALLS", "10"))
+# Share of failed calls, and 95th percentile call duration in seconds (0 disables it), that trip the breaker
+LLM_BREAKER_ERROR_RATE = float(os.getenv("LLM_BREAKER_ERROR_RATE", "0.5"))
+LLM_BREAKER_LATENCY_P95 = float(os.getenv("LLM_BREAKER_LATENCY_P95", "45"))
+# How long calls fail fast once tripped, before probe calls are let through to test the backend
+LLM_BREAKER_OPEN_SECONDS = float(os.getenv("LLM_BREAKER_OPEN_SECONDS", "30"))
+LLM_BREAKER_PROBES = int(os.getenv("LLM_BREAKER_PROBES", "1"))
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+# What counts against the backend: the errors worth retrying (throttling, connection errors, timeouts, 5xx)
+FAILURES = utils.retry.RETRYABLE_ERRORS
+
+
+class CircuitOpenError(Exception):
+    """The LLM backend is considered down; retry_after is roughly when it will be tried again."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"The LLM backend is unavailable, try again in {max(1, round(retry_after))}s")
+        self.retry_after = retry_after
+
+
+def _percentile(values, share):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(share * len(ordered)))]
+
+
+class CircuitBreaker:
+    """
+    Stops calling a degraded backend. While closed, every call's outcome and duration is recorded; when
+    failures or the 95th percentile duration over the window pass their thresholds, the breaker opens and
+    calls raise CircuitOpenError at once for open_seconds. Then it goes half-open: up to probes calls go
+    through, and the first one's outcome either closes the breaker again or reopens it.
+    The breaker is per process, each worker judging the backend by its own calls.
+    """
+
+    def __init__(self, window=LLM_BREAKER_WINDOW, min_calls=LLM_BREAKER_MIN_CALLS, error_rate=LLM_BREAKER_ERROR_RATE,
+                 latency_p95=LLM_BREAKER_LATENCY_P95, open_seconds=LLM_BREAKER_OPEN_SECONDS, probes=LLM_BREAKER_PROBES):
+        self.window = window
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.latency_p95 = latency_p95
+        self.open_seconds = open_seconds
+        self.probes = probes
+        self.state = CLOSED
+        self._lock = threading.Lock()
+        # (finished_at, duration, ok) of the calls in the window
+        self._calls = deque()
+        self._opened_at = None
+        self._probing = 0
+        self._stats = {"opened": 0, "rejected": 0}
+
+    def _check(self, now):
+        # Caller holds the lock
+        if self.state == OPEN and now - self._opened_at >= self.open_seconds:
+            self.state = HALF_OPEN
+        if self.state == OPEN:
+            self._stats["rejected"] += 1
+            raise CircuitOpenError(self.open_seconds - (now - self._opened_at))
+        if self.state == HALF_OPEN and self._probing >= self.probes:
+            self._stats["rejected"] += 1
+            raise CircuitOpenError(min(1.0, self.open_seconds))
+
+    def check(self):
+        """Raises CircuitOpenError if a call would be refused right now, without taking a probe."""
+        with self._lock:
+            self._check(time.time())
+
+    def _open(self, now):
+        self.state = OPEN
+        self._opened_at = now
+        self._calls.clear()
+        self._stats["opened"] += 1
+        print(f"- - - LLM circuit breaker opened, failing fast for {self.open_seconds:.0f}s")
+
+    def _before(self):
+        with self._lock:
+            self._check(time.time())
+            if self.state == HALF_OPEN:
+                self._probing += 1
+                return True
+            return False
+
+    def _after(self, probe, duration, ok):
+        # ok is None for an error that says nothing about the backend's health (e.g. a bad request)
+        now = time.time()
+        with self._lock:
+            if probe:
+                self._probing -= 1
+                if ok is None or self.state != HALF_OPEN:
+                    return
+                if ok and not (self.latency_p95 and duration >= self.latency_p95):
+                    self.state = CLOSED
+                    print("- - - LLM circuit breaker closed")
+                else:
+                    self._open(now)
+                return
+            if ok is None or self.state != CLOSED:
+                return
+            self._calls.append((now, duration, ok))
+            while self._calls and self._calls[0][0] < now - self.window:
+                self._calls.popleft()
+            if len(self._calls) < self.min_calls:
+                return
+            failures = sum(not call_ok for _, _, call_ok in self._calls)
+            slow = self.latency_p95 and _percentile([call[1] for call in self._calls], 0.95) >= self.latency_p95
+            if failures / len(self._calls) >= self.error_rate or slow:
+                self._open(now)
+
+    @contextmanager
+    def guard(self):
+        """
+        Wraps one call to the backend, recording its outcome.
+
+        Raises:
+            CircuitOpenError: Instead of running the block, while the breaker is open.
+        """
+        probe = self._before()
+        started = time.perf_counter()
+        try:
+            yield
+        except FAILURES:
+            self._after(probe, time.perf_counter() - started, False)
+            raise
+        except BaseException:
+            self._after(probe, time.perf_counter() - started, None)
+            raise
+        self._after(probe, time.perf_counter() - started, True)
+
+    def stats(self):
+        with self._lock:
+            calls = list(self._calls)
+            return {**self._stats, "state": self.state, "window_calls": len(calls),
+                    "window_failures": sum(not ok for _, _, ok in calls)}
+
+
+breaker = CircuitBreaker()
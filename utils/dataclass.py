@@ -47,3 +47,28 @@ class ResumeModel(BaseModel):
 # Simple model contining text attribute for getting text to api
 class ResumeText(BaseModel):
     text: str
+
+# Models for validating batched enhancement responses (one summary per input item, keyed by index)
+class IndexedSummaryModel(BaseModel):
+    index: int
+    summary: str
+
+class BatchSummariesModel(BaseModel):
+    summaries: List[IndexedSummaryModel]
+
+# Partial models for extracting a resume one section at a time
+class HeaderSectionModel(BaseModel):
+    basic_info: BasicInfoModel
+    objective: Optional[str]
+
+class ExperienceSectionModel(BaseModel):
+    work_experience: List[WorkExperienceModel]
+
+class EducationSectionModel(BaseModel):
+    education: List[EducationModel]
+
+class ProjectsSectionModel(BaseModel):
+    project_experience: List[ProjectExperienceModel]
+
+class SkillsSectionModel(BaseModel):
+    skills: List[str]
@@ -0,0 +1,116 @@
+from xml.etree.ElementTree import iterparse, ParseError
+import zipfile
+import io
+
+########################################################################################
+#                           STREAMING DOCX TEXT EXTRACTION                             #
+########################################################################################
+
+# Reads word/document.xml straight out of the zip instead of building python-docx's object model.
+# Unlike Document.paragraphs it also yields the paragraphs inside tables and text boxes.
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_MC = "{http://schemas.openxmlformats.org/markup-compatibility/2006}"
+
+_PARAGRAPH = _W + "p"
+_TEXT = _W + "t"
+_BODY = _W + "body"
+# Run content that stands for a character rather than holding text
+_CHARACTERS = {_W + "tab": "\t", _W + "br": "\n", _W + "cr": "\n", _W + "noBreakHyphen": "-"}
+# Nothing inside these is document text: text boxes are written twice, as a drawing (mc:Choice) and as a
+# VML copy (mc:Fallback), of which only the first is read, and property elements hold tab stops (w:tab) and the like
+_SKIPPED = {_MC + "Fallback", _W + "pPr", _W + "rPr"}
+
+DOCUMENT_PART = "word/document.xml"
+
+
+class DocxTextError(ValueError):
+    """The file isn't a WordprocessingML document this parser can read."""
+
+
+def _open(source):
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    return zipfile.ZipFile(source)
+
+
+def iter_paragraphs(source):
+    """
+    Yields the text of every paragraph in the document body in reading order, including
+    paragraphs in table cells and text boxes. A paragraph inside another one (a text box
+    anchored in it) is yielded before the paragraph that contains it.
+
+    Args:
+        source: A file path, the DOCX's bytes, or a seekable binary file object.
+
+    Raises:
+        DocxTextError: If the file isn't a zip holding a well-formed WordprocessingML document part.
+    """
+    try:
+        archive = _open(source)
+        document = archive.open(DOCUMENT_PART)
+    except (zipfile.BadZipFile, KeyError) as e:
+        raise DocxTextError(str(e)) from e
+
+    with archive, document:
+        try:
+            yield from _paragraphs(document)
+        except ParseError as e:
+            raise DocxTextError(f"{DOCUMENT_PART} isn't well-formed XML: {e}") from e
+
+
+def _paragraphs(document):
+    # Text of the paragraphs currently open, innermost last
+    stack = []
+    skip_depth = 0
+    depth = 0
+    body = None
+    for event, element in iterparse(document, events=("start", "end")):
+        tag = element.tag
+        if event == "start":
+            depth += 1
+            if tag in _SKIPPED:
+                skip_depth += 1
+            elif skip_depth:
+                continue
+            elif tag == _PARAGRAPH:
+                stack.append([])
+            elif tag == _BODY:
+                body = element
+            continue
+
+        depth -= 1
+        if tag in _SKIPPED:
+            skip_depth -= 1
+        elif skip_depth:
+            continue
+        elif tag == _TEXT:
+            if stack and element.text:
+                stack[-1].append(element.text)
+        elif tag in _CHARACTERS:
+            if stack:
+                stack[-1].append(_CHARACTERS[tag])
+        elif tag == _PARAGRAPH:
+            yield "".join(stack.pop())
+
+        # Drop each finished top-level block so memory stays flat on long documents
+        if depth == 2 and body is not None:
+            body.remove(element)
+
+    if body is None:
+        raise DocxTextError(f"{DOCUMENT_PART} has no WordprocessingML body")
+
+
+def extract_docx_text(source):
+    """
+    Extracts the text of a DOCX document, one paragraph per line.
+
+    Args:
+        source: A file path, the DOCX's bytes, or a seekable binary file object.
+
+    Returns:
+        str: The paragraphs (body, tables and text boxes) joined with newlines.
+
+    Raises:
+        DocxTextError: If the file isn't a zip holding a WordprocessingML document part.
+    """
+    return "\n".join(iter_paragraphs(source))
@@ -1,4 +1,25 @@
-from langchain.chat_models import ChatOpenAI
+import utils.llm_client
+from utils.dataclass import (
+    ResumeModel,
+    BasicInfoModel,
+    HeaderSectionModel,
+    ExperienceSectionModel,
+    EducationSectionModel,
+    ProjectsSectionModel,
+    SkillsSectionModel,
+)
+import utils.sections
+import utils.pre_extract
+import utils.utils_file
+from concurrent.futures import ThreadPoolExecutor
+from pydantic import ValidationError
+import utils.cache
+import utils.singleflight
+import utils.json_repair
+import utils.retry
+import contextvars
+import copy
+import time
 import json
 from langchain.prompts.chat import (
     ChatPromptTemplate,
@@ -16,6 +37,32 @@ load_dotenv()
 openai.api_key = os.getenv("OPENAI_API_KEY")
 encoding = tiktoken.get_encoding("cl100k_base")
 
+# Validated ResumeModel JSON per cleaned resume text, kept on disk so repeat uploads skip the LLM across restarts
+EXTRACTION_CACHE_DB = os.getenv("EXTRACTION_CACHE_DB", "extraction_cache.db")
+EXTRACTION_CACHE_MAX_ENTRIES = int(os.getenv("EXTRACTION_CACHE_MAX_ENTRIES", "10000"))
+# Bump when the extraction prompt changes, so older results are no longer served
+EXTRACTION_CACHE_VERSION = "4"
+
+extraction_cache = utils.cache.TieredCache(
+    utils.cache.LRUCache(256),
+    utils.cache.SQLiteCache(EXTRACTION_CACHE_DB, EXTRACTION_CACHE_MAX_ENTRIES, table="extractions"),
+)
+
+
+# "single" sends the whole resume in one prompt, "sectioned" extracts each detected section in parallel,
+# "auto" uses sectioned extraction only for resumes that would otherwise need the 16k context model
+EXTRACTION_MODE = os.getenv("EXTRACTION_MODE", "single")
+SECTION_MODEL_NAME = os.getenv("SECTION_MODEL_NAME", "gpt-3.5-turbo-0613")
+# Number of the experience/education/projects/skills headings that must be found to extract by section
+EXTRACTION_MIN_SECTIONS = 2
+
+# Concurrent extractions of the same text (double submits, several tabs) share one LLM call
+inflight = utils.singleflight.SingleFlight()
+
+
+def extraction_cache_key(parsed_text, known=None):
+    return utils.cache.make_key(EXTRACTION_CACHE_VERSION, EXTRACTION_MODE, parsed_text, known)
+
 ########################################################################################
 #                           EXTRACT DETAILS FROM RESUME - OPENAI                       #
 ########################################################################################
@@ -34,60 +81,345 @@ def num_tokens_from_string(_string, encoding):
     num_tokens = len(encoding.encode(_string))
     return num_tokens
 
-def try_loading(parsed_text, chat, chat_prompt, attempts=3):
-    if attempts == 0: return None
-    response = chat(
-        chat_prompt.format_prompt(
+def try_loading(parsed_text, chat_prompt, model_name, attempts=3, function=None, **variables):
+    """
+    Asks the model to extract the resume (as arguments of function, save_resume by default) and parses its answer as JSON.
+    Malformed answers are first repaired locally (code fences, trailing commas, truncation);
+    only if that fails is the model asked again, after an exponential backoff.
+
+    Returns:
+        dict: The parsed answer, or None if no attempt produced valid JSON.
+    """
+    for attempt in range(attempts):
+        # A retry must not be answered by the cached (malformed) reply
+        content = utils.llm_client.complete(
+            "extraction", chat_prompt, model_name, temperature=0,
+            bypass_cache=attempt > 0,
+            functions=[function or resume_function],
             resume=parsed_text,
-        ).to_messages()
-    )
-    try:
-        answer = json.loads(response.content)
-        return answer
-    except Exception as e:
+            **variables
+        )
+        try:
+            answer = utils.json_repair.loads(content)
+            if isinstance(answer, dict):
+                return answer
+        except ValueError:
+            pass
         print("- - - Response from OpenAI wasn't in the expected format, retrying...")
-        print(response.content)
-        try_loading(parsed_text, chat, chat_prompt, attempts-1)
+        print(content)
+        if attempt < attempts - 1:
+            time.sleep(utils.retry.backoff_delay(attempt))
+    return None
         
 
-def extract_data_new(parsed_text):
+def extract_data_new(parsed_text, known=None):
+    """
+    Extracts the structured resume fields from cleaned resume text with the LLM.
+    known is the output of utils.pre_extract.pre_extract() on the raw text: those fields are left out
+    of the schema sent to the model and filled in locally.
+    Concurrent calls for the same text are coalesced, each caller getting its own copy of the answer.
+    """
+    answer = inflight.do(extraction_cache_key(parsed_text, known), lambda: _extract_data_new(parsed_text, known))
+    return copy.deepcopy(answer)
+
+
+def _inline_schema(schema, defs=None):
+    """Resolves $refs, collapses Optional (anyOf with null) to the plain type and drops titles, to keep the schema small."""
+    defs = schema.get("$defs", {}) if defs is None else defs
+    if isinstance(schema, list):
+        return [_inline_schema(item, defs) for item in schema]
+    if not isinstance(schema, dict):
+        return schema
+    if "$ref" in schema:
+        return _inline_schema(defs[schema["$ref"].split("/")[-1]], defs)
+    if "anyOf" in schema:
+        variants = [variant for variant in schema["anyOf"] if variant.get("type") != "null"]
+        if len(variants) == 1:
+            return _inline_schema(variants[0], defs)
+    return {key: _inline_schema(value, defs) for key, value in schema.items()
+            if key not in ("$defs", "title", "default")}
+
+
+def function_for_model(model, name, description):
+    """
+    Builds an OpenAI function definition whose parameters are the JSON schema of a pydantic model,
+    so the model's arguments can be validated straight back into it.
+    """
+    return {
+        "name": name,
+        "description": description,
+        "parameters": _inline_schema(model.model_json_schema()),
+    }
+
+
+# Extraction is done through function calling against the schema of ResumeModel
+resume_function = function_for_model(
+    ResumeModel, "save_resume",
+    "Saves the candidate details extracted from a resume. Use \"\" for any value not found in the resume.")
+
+extraction_prompt = ChatPromptTemplate.from_messages(
+        [SystemMessagePromptTemplate.from_template(
+            """Your role is to extract crucial information from a range of Resume documents. These are candidate details from resume so make your best judgement to extract relevant information.
+        Call save_resume with every field filled in. education_level is BS, MS, or PhD.
+        If a value for a field is not found in the document, the value for that field must be "".
+        """),
+         HumanMessagePromptTemplate.from_template("Resume : {resume}")]
+    )
+
+
+# Section-by-section extraction: each detected section goes to a smaller model with only its own schema
+section_functions = {
+    "header": function_for_model(
+        HeaderSectionModel, "save_header",
+        "Saves the candidate's basic info and objective. Use \"\" for any value not found."),
+    "experience": function_for_model(
+        ExperienceSectionModel, "save_work_experience",
+        "Saves every job in the work experience section. Use \"\" for any value not found."),
+    "education": function_for_model(
+        EducationSectionModel, "save_education",
+        "Saves every entry of the education section. education_level is BS, MS, or PhD. Use \"\" for any value not found."),
+    "projects": function_for_model(
+        ProjectsSectionModel, "save_projects",
+        "Saves every project in the projects section. Use \"\" for any value not found."),
+    "skills": function_for_model(
+        SkillsSectionModel, "save_skills",
+        "Saves every skill listed in the skills section."),
+}
+
+section_prompt = ChatPromptTemplate.from_messages(
+        [SystemMessagePromptTemplate.from_template(
+            """Your role is to extract crucial information from one section of a Resume document. These are candidate details from resume so make your best judgement to extract relevant information.
+        Call the provided function with every field filled in.
+        If a value for a field is not found in the text, the value for that field must be "".
+        """),
+         HumanMessagePromptTemplate.from_template("Resume section ({section}) : {resume}")]
+    )
+
+# Default values for the fields of sections that weren't found (or failed to extract)
+EMPTY_RESUME = {
+    "basic_info": {field: "" for field in BasicInfoModel.model_fields},
+    "objective": "",
+    "work_experience": [],
+    "education": [],
+    "project_experience": [],
+    "skills": [],
+}
+
+
+def _reduce_function(function, known):
+    """
+    Returns a copy of function without the basic_info fields that were already pre-extracted. GPAs stay in
+    the schema, as which entry a GPA belongs to is only known from the answer (see pre_extract.apply_known()).
+    """
+    if not known:
+        return function
+    function = copy.deepcopy(function)
+    schema = function["parameters"]["properties"].get("basic_info")
+    if schema is not None:
+        for field in known["basic_info"]:
+            schema["properties"].pop(field, None)
+        schema["required"] = [field for field in schema.get("required", []) if field not in known["basic_info"]]
+    return function
+
+
+def extract_single(parsed_text, known=None):
+    """Extracts the whole resume in one call, on the 16k context model for long resumes."""
     num_input_tokens = num_tokens_from_string(parsed_text, encoding)
 
     if num_input_tokens < 2800:
         model_name = "gpt-3.5-turbo-0613"
     else:
         model_name = "gpt-3.5-turbo-16k"
-    chat = ChatOpenAI(model_name=model_name,
-                              temperature=0)  # type: ignore
-
-    system_template = ("""Your role is to construct a structured JSON output by extracting crucial information from a range of Resume documents in PDF format. These are candidate details from resume so make your best judgement to extract relevant information.
-        The following fields must be extracted from the documents:
-        basic_info (including first_name, last_name, full_name, email, phone_number, location, portfolio_website_url, linkedin_url, github_main_page_url),
-        objective (including objective),
-        work_experience (including job_title, company, location, duration, job_summary),
-        education (including university, education_level (BS, MS, or PhD), graduation_year, graduation_month, majors, GPA),
-        project_experience (including project_name, project_description),
-        skills (including skills),
-
-        OUTPUT_FORMAT:
-        The output nested JSON must be a single JSON object with nested properties, one for each of the fields listed above. The output must be human-readable and easy to understand.
-        Make sure to follow the exact sequence of fields in the output JSON.
-        If a value for a field is not found in the document, the value for that field in the output JSON must be "". 
-        """)
-
-    system_message_prompt = SystemMessagePromptTemplate.from_template(
-            system_template)
-
-    human_template = "Resume : {resume}"
-
-    human_message_prompt = HumanMessagePromptTemplate.from_template(
-            human_template)
-
-    chat_prompt = ChatPromptTemplate.from_messages(
-            [system_message_prompt, human_message_prompt]
-        )
 
     # get a chat completion from the formatted messages
-    answer = try_loading(parsed_text, chat, chat_prompt, 3)
+    return try_loading(parsed_text, extraction_prompt, model_name, 3,
+                       function=_reduce_function(resume_function, known))
+
+
+def extract_sectioned(parsed_text, known=None):
+    """
+    Splits the resume into its sections and extracts them in parallel with SECTION_MODEL_NAME,
+    each with a prompt holding only that section and its part of the schema, then merges the answers.
 
+    Returns:
+        dict: The merged answer in ResumeModel's shape, or None if too few sections were detected
+              to extract this way (the caller should use extract_single()).
+    """
+    sections = utils.sections.split_sections(parsed_text)
+    if len(sections.keys() & {"experience", "education", "projects", "skills"}) < EXTRACTION_MIN_SECTIONS:
+        return None
+
+    # The pool's threads don't inherit the caller's context, so run each section in a copy of it: that carries
+    # the rate limiting priority and the utils.llm_client.counting_usage() block over
+    context = contextvars.copy_context()
+
+    def _extract(name):
+        return context.copy().run(try_loading, sections[name], section_prompt, SECTION_MODEL_NAME, 3,
+                                  function=_reduce_function(section_functions[name], known), section=name)
+
+    answer = copy.deepcopy(EMPTY_RESUME)
+    with ThreadPoolExecutor(max_workers=len(sections)) as pool:
+        for name, section_answer in zip(sections, pool.map(_extract, sections)):
+            # A section that couldn't be extracted keeps its empty defaults
+            if section_answer is None:
+                print(f"- - - Couldn't extract the {name} section, leaving it empty")
+                continue
+            answer.update({key: value for key, value in section_answer.items() if key in answer})
     return answer
+
+
+def _extract_data_new(parsed_text, known=None):
+    mode = EXTRACTION_MODE
+    answer = None
+    if mode == "sectioned" or (mode == "auto" and num_tokens_from_string(parsed_text, encoding) >= 2800):
+        answer = extract_sectioned(parsed_text, known)
+    if answer is None:
+        answer = extract_single(parsed_text, known)
+    return utils.pre_extract.apply_known(answer, known) if answer is not None else None
+
+
+########################################################################################
+#                           RAW TEXT -> RESUME MODEL                                   #
+########################################################################################
+# Shared by /upload-text/, /upload-file/, the extraction jobs and batch ingestion, so they all accept the same answers
+
+# OpenAI may not completely respond as desired, 
+# Solutions so far being:   casting as the correct types, 
+#                           or extracting the useful information 
+#                           or leaving blank
+def correct_response(res: dict):
+    if not isinstance(res['basic_info'], dict):
+        print("-- Issue: with how basic_info was formed by ai function")
+        print("Before:", res['basic_info'])
+        res['basic_info'] = {
+            'first_name': "",
+            'last_name': "",
+            'full_name': "",
+            'email': "",
+            'phone_number': "",
+            'location': "",
+            'portfolio_website_url': "",
+            'linkedin_url': "",
+            'github_main_page_url': "",
+        }
+        print("Now:", res['basic_info'])
+    if not isinstance(res['objective'], str):
+        print("-- Issue: with how objective was formed by ai function")
+        print("Before:", res['objective'])
+        if isinstance(res['objective'], dict) and res['objective'].keys():
+            res['objective'] = res['objective'][list(res['objective'].keys())[0]]
+        else:
+            res['objective'] = str(res['objective'])
+        print("Now:", res['objective'])
+    if not isinstance(res['work_experience'], list):
+        print("-- Issue: with how work_experience was formed by ai function")
+        print("Before:", res['work_experience'])
+        res['work_experience'] = [{
+            'job_title': "",
+            'company': "",
+            'location': "",
+            'duration': "",
+            'job_summary': "",
+        }]
+        print("Now:", res['work_experience'])
+    else:
+        for i, work in enumerate(res['work_experience']):
+            if not isinstance(work, dict):
+                print("--- Issue:", res['work_experience'][i])
+                res['work_experience'][i] = {
+                    'job_title': "",
+                    'company': "",
+                    'location': "",
+                    'duration': "",
+                    'job_summary': "",
+                }
+    if not isinstance(res['education'], list):
+        print("-- Issue: with how education was formed by ai function")
+        print("Before:", res['education'])
+        res['education'] = [{
+            'university': "",
+            'education_level': "",
+            'graduation_year': "",
+            'graduation_month': "",
+            'majors': "",
+            'GPA': "",
+        }]
+        print("Now:", res['education'])
+    else:
+        for i, edu in enumerate(res['education']):
+            if not isinstance(edu, dict):
+                print("--- Issue:", res['education'][i])
+                res['education'][i] = {
+                    'university': "",
+                    'education_level': "",
+                    'graduation_year': "",
+                    'graduation_month': "",
+                    'majors': "",
+                    'GPA': "",
+                }
+    if not isinstance(res['project_experience'], list):
+        print("-- Issue: with how project_experience was formed by ai function")
+        print("Before:", res['project_experience'])
+        res['project_experience'] = [{
+            'project_name': "",
+            'project_description': "",
+        }]
+        print("Now:", res['project_experience'])
+    else:
+        for i, project in enumerate(res['project_experience']):
+            if not isinstance(project, dict):
+                print("--- Issue:", res['project_experience'][i])
+                res['project_experience'][i] = {
+                    'project_name': "",
+                    'project_description': "",
+                }
+    if not isinstance(res['skills'], list):
+        print("-- Issue: with how skills was formed by ai function")
+        print("Before:", res['skills'])
+        if isinstance(res['skills'], dict):
+            skills = []
+            for key in res['skills']:
+                if isinstance(res['skills'][key], list):
+                    skills.extend(res['skills'][key])
+                else:
+                    skills.append(str(res['skills'][key]))
+            res['skills'] = skills
+        else:
+            res['skills'] = [""]
+        print("Now:", res['skills'])
+
+
+def extract_resume_model(text, known=None):
+    """
+    Cleaned resume text -> ResumeModel, served from the extraction cache when the same text was seen before.
+
+    Returns:
+        ResumeModel: The resume, or None if the LLM never gave a valid answer.
+    """
+    key = extraction_cache_key(text, known)
+    cached = extraction_cache.get(key)
+    if cached is not None:
+        return ResumeModel.model_validate_json(cached)
+
+    response = extract_data_new(text, known)
+    print(response)
+    if not response:
+        return None
+    # The response follows ResumeModel's schema, so it normally validates as is;
+    # otherwise patch up mistyped attributes and cast them to the correct type
+    try:
+        resume_model = ResumeModel.model_validate(response)
+    except ValidationError as e:
+        print("-- Issue: response didn't match the schema, correcting it:", e)
+        correct_response(response)
+        resume_model = ResumeModel(**response)
+    extraction_cache.set(key, resume_model.model_dump_json())
+    return resume_model
+
+
+def extract_raw_text(raw_text):
+    """Raw resume text -> ResumeModel (None if the LLM never gave a valid answer), see extract_resume_model()."""
+    # Pick out contact details and GPAs with regexes first, cleaning strips the characters they need
+    known = utils.pre_extract.pre_extract(raw_text)
+    text = utils.utils_file.process_clean_text(raw_text)
+    return extract_resume_model(text, known)
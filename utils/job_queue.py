@@ -0,0 +1,319 @@
+from collections import OrderedDict
+from dotenv import load_dotenv
+import threading
+import logging
+import sqlite3
+import json
+import time
+import uuid
+import os
+
+load_dotenv()
+
+########################################################################################
+#                           BACKGROUND JOB QUEUE                                       #
+########################################################################################
+
+# SQLite file shared by every worker process on the machine; an empty JOB_QUEUE_DB keeps jobs in this process only
+JOB_QUEUE_DB = os.getenv("JOB_QUEUE_DB", "jobs.db")
+# Queued jobs accepted before submissions are turned away
+JOB_QUEUE_MAX_DEPTH = int(os.getenv("JOB_QUEUE_MAX_DEPTH", "100"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# A claimed job whose worker hasn't finished it within the lease (e.g. the process died) is handed out again
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "300"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# Finished jobs (and their results) are kept this long for polling
+JOB_RESULT_TTL = float(os.getenv("JOB_RESULT_TTL", str(24 * 3600)))
+# How often idle workers look for jobs submitted by other processes
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "0.5"))
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+class QueueFullError(Exception):
+    """The queue already holds max_depth queued jobs."""
+
+
+class _Wakeup:
+    # Wakes idle workers of this process as soon as a job is submitted, instead of at their next poll
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._pending = 0
+
+    def notify(self):
+        with self._condition:
+            self._pending += 1
+            self._condition.notify()
+
+    def wait(self, timeout):
+        with self._condition:
+            if not self._pending:
+                self._condition.wait(timeout)
+            self._pending = max(0, self._pending - 1)
+
+
+class MemoryJobQueue:
+    """Jobs held in this process only; polling has to reach the process the job was submitted to."""
+
+    def __init__(self, max_depth=JOB_QUEUE_MAX_DEPTH, lease=JOB_LEASE_SECONDS, result_ttl=JOB_RESULT_TTL):
+        self.max_depth = max_depth
+        self.lease = lease
+        self.result_ttl = result_ttl
+        self.wakeup = _Wakeup()
+        self._lock = threading.Lock()
+        # job_id -> job dict, in submission order
+        self._jobs = OrderedDict()
+
+    def enqueue(self, kind, payload):
+        with self._lock:
+            self._purge()
+            if sum(job["status"] == QUEUED for job in self._jobs.values()) >= self.max_depth:
+                raise QueueFullError(f"{self.max_depth} jobs already queued")
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = {"id": job_id, "kind": kind, "payload": json.dumps(payload), "status": QUEUED,
+                                  "result": None, "error": None, "attempts": 0, "created_at": time.time(),
+                                  "started_at": None, "finished_at": None, "lease_until": None}
+        self.wakeup.notify()
+        return job_id
+
+    def claim(self):
+        now = time.time()
+        with self._lock:
+            for job in self._jobs.values():
+                if job["status"] == QUEUED or (job["status"] == RUNNING and job["lease_until"] < now):
+                    job.update(status=RUNNING, started_at=now, lease_until=now + self.lease,
+                               attempts=job["attempts"] + 1)
+                    return job["id"], job["kind"], json.loads(job["payload"]), job["attempts"]
+        return None
+
+    def renew(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and job["status"] == RUNNING:
+                job["lease_until"] = time.time() + self.lease
+
+    def finish(self, job_id, result=None, error=None):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(status=FAILED if error else DONE, finished_at=time.time(), lease_until=None,
+                           result=json.dumps(result) if error is None else None, error=error)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            position = None
+            if job["status"] == QUEUED:
+                position = sum(other["status"] == QUEUED and other["created_at"] < job["created_at"]
+                               for other in self._jobs.values())
+            return _public(job, position)
+
+    def counts(self):
+        with self._lock:
+            counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+            for job in self._jobs.values():
+                counts[job["status"]] += 1
+            return counts
+
+    def _purge(self):
+        older_than = time.time() - self.result_ttl
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job["finished_at"] is not None and job["finished_at"] < older_than]:
+            del self._jobs[job_id]
+
+
+class SQLiteJobQueue:
+    """
+    Jobs in a SQLite table, so every worker process pointed at the same file shares one queue: a job
+    submitted to one process can be run by another and polled through any. Claiming is a single
+    write transaction, so each job goes to exactly one worker at a time.
+    """
+
+    # Finished jobs past JOB_RESULT_TTL are cleared out every few submissions
+    PURGE_EVERY = 64
+
+    def __init__(self, path, max_depth=JOB_QUEUE_MAX_DEPTH, lease=JOB_LEASE_SECONDS, result_ttl=JOB_RESULT_TTL):
+        self.path = path
+        self.max_depth = max_depth
+        self.lease = lease
+        self.result_ttl = result_ttl
+        self.wakeup = _Wakeup()
+        self._lock = threading.Lock()
+        self._submissions = 0
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, kind TEXT NOT NULL, payload TEXT NOT NULL, status TEXT NOT NULL, "
+            "result TEXT, error TEXT, attempts INTEGER NOT NULL DEFAULT 0, created_at REAL NOT NULL, "
+            "started_at REAL, finished_at REAL, lease_until REAL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status_created_at ON jobs (status, created_at)")
+
+    def enqueue(self, kind, payload):
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                depth = self._conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (QUEUED,)).fetchone()[0]
+                if depth >= self.max_depth:
+                    raise QueueFullError(f"{self.max_depth} jobs already queued")
+                self._conn.execute(
+                    "INSERT INTO jobs (id, kind, payload, status, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (job_id, kind, json.dumps(payload), QUEUED, time.time()))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._submissions += 1
+            if self._submissions % self.PURGE_EVERY == 0:
+                self._conn.execute("DELETE FROM jobs WHERE finished_at < ?", (time.time() - self.result_ttl,))
+        self.wakeup.notify()
+        return job_id
+
+    def claim(self):
+        now = time.time()
+        with self._lock:
+            # BEGIN IMMEDIATE takes the write lock up front, so two processes can't claim the same row
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT id, kind, payload, attempts FROM jobs "
+                    "WHERE status = ? OR (status = ? AND lease_until < ?) ORDER BY created_at LIMIT 1",
+                    (QUEUED, RUNNING, now)).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = ?, started_at = ?, lease_until = ?, attempts = attempts + 1 "
+                        "WHERE id = ?", (RUNNING, now, now + self.lease, row[0]))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        job_id, kind, payload, attempts = row
+        return job_id, kind, json.loads(payload), attempts + 1
+
+    def renew(self, job_id):
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET lease_until = ? WHERE id = ? AND status = ?",
+                               (time.time() + self.lease, job_id, RUNNING))
+
+    def finish(self, job_id, result=None, error=None):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, lease_until = NULL WHERE id = ?",
+                (FAILED if error else DONE, json.dumps(result) if error is None else None, error, time.time(), job_id))
+
+    def get(self, job_id):
+        with self._lock:
+            cursor = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            job = dict(zip([column[0] for column in cursor.description], row))
+            position = None
+            if job["status"] == QUEUED:
+                position = self._conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ? AND created_at < ?",
+                                              (QUEUED, job["created_at"])).fetchone()[0]
+            return _public(job, position)
+
+    def counts(self):
+        with self._lock:
+            counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+            for status, count in self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status"):
+                counts[status] = count
+            return counts
+
+
+def _public(job, position):
+    # What polling clients see of a job
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "position": position,
+        "attempts": job["attempts"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+        "result": json.loads(job["result"]) if job["result"] is not None else None,
+        "error": job["error"],
+    }
+
+
+class JobWorkers:
+    """
+    A pool of worker threads running queued jobs with handlers[kind](payload), whose return value
+    (JSON-serialisable) becomes the job's result. A handler that raises fails its job. The lease of
+    a running job is renewed while its handler runs, so only a job whose worker died mid-run is
+    claimed again once its lease runs out, up to JOB_MAX_ATTEMPTS times.
+    """
+
+    def __init__(self, queue, handlers, workers=JOB_WORKERS, poll_interval=JOB_POLL_INTERVAL):
+        self.queue = queue
+        self.handlers = handlers
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._stopping = threading.Event()
+        self._threads = []
+
+    def start(self):
+        self._stopping.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=5):
+        self._stopping.set()
+        for _ in self._threads:
+            self.queue.wakeup.notify()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                job = self.queue.claim()
+            except sqlite3.Error:
+                logging.exception("Claiming a job failed")
+                job = None
+            if job is None:
+                self.queue.wakeup.wait(self.poll_interval)
+                continue
+            job_id, kind, payload, attempts = job
+            if attempts > JOB_MAX_ATTEMPTS:
+                self.queue.finish(job_id, error=f"Abandoned after {attempts - 1} attempts")
+                continue
+            finished = threading.Event()
+            threading.Thread(target=self._renew, args=(job_id, finished), daemon=True).start()
+            try:
+                self.queue.finish(job_id, result=self.handlers[kind](payload))
+            except Exception as e:
+                logging.exception("Job %s (%s) failed", job_id, kind)
+                self.queue.finish(job_id, error=f"{type(e).__name__}: {e}")
+            finally:
+                finished.set()
+
+    def _renew(self, job_id, finished):
+        # Long jobs (e.g. batch ingestion) outlive a single lease
+        while not finished.wait(self.queue.lease / 3):
+            try:
+                self.queue.renew(job_id)
+            except sqlite3.Error:
+                logging.exception("Renewing the lease of job %s failed", job_id)
+
+    def stats(self):
+        return {**self.queue.counts(), "workers": sum(thread.is_alive() for thread in self._threads)}
+
+
+def _queue():
+    return SQLiteJobQueue(JOB_QUEUE_DB) if JOB_QUEUE_DB else MemoryJobQueue()
+
+
+jobs = _queue()
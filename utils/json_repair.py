@@ -0,0 +1,120 @@
+import json
+import re
+
+########################################################################################
+#                           JSON REPAIR FOR LLM RESPONSES                              #
+########################################################################################
+
+_CODE_FENCE = re.compile(r"^\s*```[a-zA-Z]*\s*\n?|\n?\s*```\s*$")
+_SCALAR = re.compile(r"-?\d+(\.\d+)?([eE][+-]?\d+)?|true|false|null")
+_OPENERS = {"{": "}", "[": "]"}
+
+
+def repair_json(text):
+    """
+    Fixes the usual ways a model mangles JSON: code fences around it, chatter before or after it,
+    trailing commas, and output cut off before the closing quotes/brackets.
+
+    Args:
+        text (str): The raw model response.
+
+    Returns:
+        str: The repaired JSON text (not guaranteed to parse).
+    """
+    text = _CODE_FENCE.sub("", text.strip())
+
+    # Drop anything before the first bracket
+    starts = [i for i in (text.find("{"), text.find("[")) if i != -1]
+    if not starts:
+        return text
+    text = text[min(starts):]
+
+    # Walk the text once, copying it to out while tracking strings and open brackets, so commas and
+    # brackets inside string values are left alone. Each open bracket is [closer, what comes next]:
+    # "key", "colon" or "value", or "comma" once its current value has started.
+    out = []
+    stack = []
+    in_string = escaped = is_key = False
+    # Where out could be cut and closed at any moment, a trailing comma waiting to see what follows it,
+    # and where the current number/literal value started
+    safe = 0
+    comma_at = scalar_at = None
+    for char in text:
+        if in_string:
+            out.append(char)
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+                if is_key:
+                    stack[-1][1] = "colon"
+                else:
+                    safe = len(out)
+            continue
+        if char.isspace():
+            out.append(char)
+            continue
+        if char in "}]":
+            if not stack or stack[-1][0] != char:
+                continue
+            if comma_at is not None:
+                del out[comma_at]
+            stack.pop()
+            out.append(char)
+            safe, comma_at, scalar_at = len(out), None, None
+            if not stack:
+                break
+            continue
+        comma_at = None
+        if char == ",":
+            # The value before the comma is complete
+            safe, scalar_at = len(out), None
+            comma_at = len(out)
+            if stack:
+                stack[-1][1] = "key" if stack[-1][0] == "}" else "value"
+        elif char == ":":
+            if stack and stack[-1][1] == "colon":
+                stack[-1][1] = "value"
+        else:
+            is_key = bool(stack) and stack[-1][1] == "key"
+            if stack and not is_key:
+                stack[-1][1] = "comma"
+            if char in _OPENERS:
+                stack.append([_OPENERS[char], "key" if char == "{" else "value"])
+                out.append(char)
+                safe = len(out)
+                continue
+            if char == '"':
+                in_string = True
+            elif scalar_at is None:
+                scalar_at = len(out)
+        out.append(char)
+
+    # Close a truncated response: a string value is closed where it stopped, a number/literal kept if
+    # it is whole, and a dangling key, colon or comma dropped back to the last complete value
+    if stack:
+        whole_scalar = not in_string and comma_at is None and scalar_at is not None \
+            and _SCALAR.fullmatch("".join(out[scalar_at:]).strip())
+        if in_string and not is_key:
+            if escaped:
+                out.pop()
+            out.append('"')
+        elif not whole_scalar:
+            del out[safe:]
+        return "".join(out).rstrip() + "".join(closer for closer, _ in reversed(stack))
+    return "".join(out)
+
+
+def loads(text):
+    """
+    json.loads() that falls back to repair_json() before giving up.
+
+    Raises:
+        ValueError: If the text can't be parsed even after repair.
+    """
+    try:
+        return json.loads(text)
+    except ValueError:
+        return json.loads(repair_json(text))
@@ -0,0 +1,246 @@
+from langchain.chat_models import ChatOpenAI
+from langchain_core.messages import AIMessage, AIMessageChunk
+from dotenv import load_dotenv
+import threading
+import hashlib
+import asyncio
+import random
+import httpx
+import json
+import openai
+import time
+import re
+import os
+
+load_dotenv()
+
+########################################################################################
+#                           LLM BACKENDS - OPENAI & OFFLINE STUB                       #
+########################################################################################
+
+# "openai" calls the API; "stub" answers locally with schema-valid replies, for load tests and benchmarks
+LLM_BACKEND = os.getenv("LLM_BACKEND", "openai")
+
+# Connection pool settings, shared by every model/temperature pair in the process
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "30"))
+LLM_REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", "60"))
+
+# Stub replies take LLM_STUB_LATENCY seconds, plus up to LLM_STUB_LATENCY_JITTER more, plus LLM_STUB_SECONDS_PER_TOKEN
+# per (estimated) completion token, and fail with a transient API error at LLM_STUB_FAILURE_RATE
+LLM_STUB_LATENCY = float(os.getenv("LLM_STUB_LATENCY", "0.5"))
+LLM_STUB_LATENCY_JITTER = float(os.getenv("LLM_STUB_LATENCY_JITTER", "0.25"))
+LLM_STUB_SECONDS_PER_TOKEN = float(os.getenv("LLM_STUB_SECONDS_PER_TOKEN", "0"))
+LLM_STUB_FAILURE_RATE = float(os.getenv("LLM_STUB_FAILURE_RATE", "0"))
+# Seed of the latency and failure draws; replies themselves only depend on the prompt
+LLM_STUB_SEED = os.getenv("LLM_STUB_SEED", "")
+# Optional JSON file of {task: reply} overriding the templated replies of plain-text tasks
+LLM_STUB_RESPONSES = os.getenv("LLM_STUB_RESPONSES", "")
+
+
+class OpenAIBackend:
+    """Chat models on the OpenAI API, sharing one pair of keep-alive connection pools per process."""
+
+    name = "openai"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._chats = {}
+        self._clients = None
+
+    def _pool_limits(self):
+        return httpx.Limits(
+            max_connections=LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+        )
+
+    def _get_clients(self):
+        # Caller holds the lock; both clients sit on keep-alive pools, so TLS sessions are reused between requests
+        if self._clients is None:
+            timeout = httpx.Timeout(LLM_REQUEST_TIMEOUT)
+            self._clients = (
+                # Retries are left to utils.retry, so they are counted, jittered and logged in one place
+                openai.OpenAI(
+                    api_key=os.getenv("OPENAI_API_KEY"),
+                    max_retries=0,
+                    http_client=httpx.Client(limits=self._pool_limits(), timeout=timeout),
+                ),
+                openai.AsyncOpenAI(
+                    api_key=os.getenv("OPENAI_API_KEY"),
+                    max_retries=0,
+                    http_client=httpx.AsyncClient(limits=self._pool_limits(), timeout=timeout),
+                ),
+            )
+        return self._clients
+
+    def chat(self, model_name, temperature=0, task=None):
+        """Returns the shared ChatOpenAI for a model name and temperature (task doesn't matter to the API)."""
+        key = (model_name, float(temperature))
+        chat = self._chats.get(key)
+        if chat is not None:
+            return chat
+        with self._lock:
+            chat = self._chats.get(key)
+            if chat is None:
+                sync_client, async_client = self._get_clients()
+                chat = ChatOpenAI(model_name=model_name,
+                                  temperature=temperature,
+                                  client=sync_client.chat.completions,
+                                  async_client=async_client.chat.completions)  # type: ignore
+                self._chats[key] = chat
+        return chat
+
+
+def _sample(schema, name, index=0):
+    # A value valid against a (function parameters) JSON schema, named after its field
+    if "enum" in schema:
+        return schema["enum"][0]
+    if "anyOf" in schema:
+        options = [option for option in schema["anyOf"] if option.get("type") != "null"] or schema["anyOf"]
+        return _sample(options[0], name, index)
+    kind = schema.get("type", "string")
+    if kind == "object":
+        return {key: _sample(value, key, index) for key, value in schema.get("properties", {}).items()}
+    if kind == "array":
+        return [_sample(schema.get("items", {}), name, i) for i in range(2)]
+    if kind == "integer":
+        return index + 1
+    if kind == "number":
+        return float(index + 1)
+    if kind == "boolean":
+        return True
+    if kind == "null":
+        return None
+    return f"{name.replace('_', ' ').capitalize()} {index + 1}"
+
+
+def _numbered_items(text):
+    # The [0], [1], ... items of a batched enhancement prompt (see aishop.format_job_batch)
+    return len(re.findall(r"^\[\d+\]", text, flags=re.MULTILINE))
+
+
+def _summaries(text, digest):
+    return json.dumps({"summaries": [{"index": i, "summary": f"Delivered measurable results in role {i + 1} ({digest})."}
+                                     for i in range(_numbered_items(text))]})
+
+
+# Plain-text tasks of aishop.py: prompt text and a short digest of it -> reply
+_TEMPLATES = {
+    "objective": lambda text, digest: ("Motivated professional with a track record of delivering results across teams. "
+                                       "Brings strong technical and communication skills to every project. "
+                                       f"Looking to grow into a role with broader impact ({digest})."),
+    "job_summary": lambda text, digest: f"Led key initiatives and improved team delivery by 20% ({digest}).",
+    "project_description": lambda text, digest: f"Built and shipped a tool used daily by the team ({digest}).",
+    "job_summaries_batch": _summaries,
+    "project_descriptions_batch": _summaries,
+    "full_project_experience": lambda text, digest: json.dumps({"project_experience": [
+        {"project_name": f"Project {i + 1} ({digest})", "project_description": "Designed and delivered an internal tool."}
+        for i in range(2)]}),
+    "full_skills": lambda text, digest: json.dumps({"skills": ["Python", "Data analysis", "Stakeholder communication",
+                                                               f"Project delivery ({digest})"]}),
+    "enhanced_skills": lambda text, digest: json.dumps({"skills": ["Python", "SQL", "Cloud infrastructure",
+                                                                   f"Team leadership ({digest})"]}),
+}
+
+
+class StubChat:
+    """
+    Stands in for ChatOpenAI without the network: invoke/ainvoke/astream answer after an injected delay with
+    a reply that only depends on the prompt. A forced function call gets arguments generated from the
+    function's JSON schema (so extraction validates); plain-text tasks get their template or canned reply.
+    """
+
+    def __init__(self, backend, model_name, task):
+        self.backend = backend
+        self.model_name = model_name
+        self.task = task
+
+    def _reply(self, messages, functions=None):
+        text = "\n".join(message.content for message in messages)
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()[:8]
+        if functions:
+            arguments = _sample(functions[0].get("parameters", {}), functions[0]["name"])
+            return AIMessage(content="", additional_kwargs={"function_call": {
+                "name": functions[0]["name"], "arguments": json.dumps(arguments)}})
+        if self.task in self.backend.canned:
+            return AIMessage(content=self.backend.canned[self.task])
+        template = _TEMPLATES.get(self.task, lambda text, digest: f"Stub reply ({digest}).")
+        return AIMessage(content=template(messages[-1].content, digest))
+
+    def invoke(self, messages, functions=None, function_call=None):
+        message = self._reply(messages, functions)
+        time.sleep(self.backend.delay(message))
+        self.backend.maybe_fail()
+        return message
+
+    async def ainvoke(self, messages, functions=None, function_call=None):
+        message = self._reply(messages, functions)
+        await asyncio.sleep(self.backend.delay(message))
+        self.backend.maybe_fail()
+        return message
+
+    async def astream(self, messages):
+        message = self._reply(messages)
+        words = re.findall(r"\S+\s*", message.content) or [message.content]
+        total = self.backend.delay(message)
+        per_token = LLM_STUB_SECONDS_PER_TOKEN
+        # The fixed latency goes before the first chunk, the per-token part is spread over the chunks
+        await asyncio.sleep(max(0.0, total - per_token * len(words)))
+        self.backend.maybe_fail()
+        for word in words:
+            await asyncio.sleep(per_token)
+            yield AIMessageChunk(content=word)
+
+
+class StubBackend:
+    """Offline backend answering every chat model with a StubChat, for measuring our own code in isolation."""
+
+    name = "stub"
+
+    def __init__(self, latency=LLM_STUB_LATENCY, jitter=LLM_STUB_LATENCY_JITTER, failure_rate=LLM_STUB_FAILURE_RATE,
+                 seed=LLM_STUB_SEED, canned_path=LLM_STUB_RESPONSES):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed or None)
+        self._lock = threading.Lock()
+        self.canned = {}
+        if canned_path:
+            with open(canned_path, encoding="utf-8") as f:
+                self.canned = json.load(f)
+
+    def chat(self, model_name, temperature=0, task=None):
+        return StubChat(self, model_name, task)
+
+    def delay(self, message):
+        content = message.content or message.additional_kwargs.get("function_call", {}).get("arguments", "")
+        with self._lock:
+            jitter = self._random.uniform(0, self.jitter)
+        # Roughly 4 characters per token
+        return self.latency + jitter + LLM_STUB_SECONDS_PER_TOKEN * len(content) / 4
+
+    def maybe_fail(self):
+        with self._lock:
+            draw = self._random.random()
+            kind = self._random.randrange(3)
+        if draw >= self.failure_rate:
+            return
+        request = httpx.Request("POST", "https://stub.invalid/v1/chat/completions")
+        if kind == 0:
+            raise openai.APITimeoutError(request=request)
+        status, error = (429, openai.RateLimitError) if kind == 1 else (500, openai.InternalServerError)
+        raise error("Injected stub failure", response=httpx.Response(status, request=request), body=None)
+
+
+def _backend():
+    if LLM_BACKEND == "stub":
+        print("- - - Using the offline stub LLM backend")
+        return StubBackend()
+    if LLM_BACKEND != "openai":
+        raise ValueError(f"Unknown LLM_BACKEND {LLM_BACKEND!r}, expected 'openai' or 'stub'")
+    return OpenAIBackend()
+
+
+backend = _backend()
@@ -0,0 +1,325 @@
+from dotenv import load_dotenv
+import utils.cache
+import utils.singleflight
+import utils.retry
+import utils.rate_limit
+import utils.circuit_breaker
+import utils.llm_backend
+from contextlib import contextmanager
+import contextvars
+import threading
+import tiktoken
+import json
+import os
+
+load_dotenv()
+
+########################################################################################
+#                           RESPONSE CACHE & CHAT MODELS                               #
+########################################################################################
+
+# Response cache for temperature-0 calls: an in-process LRU, plus a SQLite file when LLM_CACHE_DB is set
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "1024"))
+LLM_CACHE_DB = os.getenv("LLM_CACHE_DB", "")
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+LLM_CACHE_DB_MAX_ENTRIES = int(os.getenv("LLM_CACHE_DB_MAX_ENTRIES", "100000"))
+# While the circuit breaker is open, replies expired less than LLM_CACHE_STALE_TTL ago are served rather than failing
+LLM_SERVE_STALE = os.getenv("LLM_SERVE_STALE", "1") == "1"
+LLM_CACHE_STALE_TTL = float(os.getenv("LLM_CACHE_STALE_TTL", str(30 * 24 * 3600))) if LLM_SERVE_STALE else 0
+
+response_cache = utils.cache.TieredCache(
+    utils.cache.LRUCache(LLM_CACHE_SIZE, ttl=LLM_CACHE_TTL, stale_ttl=LLM_CACHE_STALE_TTL),
+    utils.cache.SQLiteCache(LLM_CACHE_DB, LLM_CACHE_DB_MAX_ENTRIES, ttl=LLM_CACHE_TTL, table="llm_responses",
+                            stale_ttl=LLM_CACHE_STALE_TTL) if LLM_CACHE_DB else None,
+)
+
+# Identical temperature-0 calls in flight at the same time share one request
+inflight = utils.singleflight.SingleFlight()
+
+_encoding = tiktoken.get_encoding("cl100k_base")
+_usage_lock = threading.Lock()
+_usage = {}
+# The counters of the innermost counting_usage() block, if any
+_block_usage = contextvars.ContextVar("llm_block_usage", default=None)
+
+
+def get_chat(model_name, temperature=0, task=None):
+    """
+    Returns the chat model of the configured backend (see utils.llm_backend) for a model name and temperature.
+
+    Args:
+        model_name (str): The OpenAI chat model to use.
+        temperature (float): The sampling temperature.
+        task (str): Short name of the calling helper; the stub backend answers by it.
+
+    Returns:
+        A chat model with invoke/ainvoke/astream, e.g. a ChatOpenAI backed by the process-wide connection pool.
+    """
+    return utils.llm_backend.backend.chat(model_name, temperature, task)
+
+
+########################################################################################
+#                           CHAT COMPLETIONS                                           #
+########################################################################################
+
+def _reply_content(message, functions):
+    # With function calling the answer is the JSON arguments of the forced call
+    if functions:
+        function_call = message.additional_kwargs.get("function_call")
+        if function_call:
+            return function_call.get("arguments", "")
+    return message.content
+
+
+def _function_kwargs(functions):
+    if not functions:
+        return {}
+    return {"functions": functions, "function_call": {"name": functions[0]["name"]}}
+
+
+def count_prompt_tokens(messages, functions=None):
+    """Estimates the prompt tokens of a list of messages (plus function definitions) with cl100k_base."""
+    text = "\n".join(message.content for message in messages)
+    if functions:
+        text += json.dumps(functions)
+    return len(_encoding.encode(text))
+
+
+def _record_usage(model_name, messages, functions, message, content):
+    # Prefer the API's own token counts, fall back to a local estimate; returns the call's total tokens
+    token_usage = (getattr(message, "response_metadata", None) or {}).get("token_usage") or {}
+    prompt_tokens = token_usage.get("prompt_tokens") or count_prompt_tokens(messages, functions)
+    completion_tokens = token_usage.get("completion_tokens") or len(_encoding.encode(content or ""))
+    block_counts = _block_usage.get()
+    with _usage_lock:
+        for counts in (_usage.setdefault(model_name, _empty_usage()), block_counts):
+            if counts is not None:
+                counts["calls"] += 1
+                counts["prompt_tokens"] += prompt_tokens
+                counts["completion_tokens"] += completion_tokens
+    return prompt_tokens + completion_tokens
+
+
+def _empty_usage():
+    return {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0}
+
+
+@contextmanager
+def counting_usage(counts=None):
+    """
+    Counts the LLM calls and tokens made in the block, and only those, unlike usage_stats() which
+    also sees every other request the process is serving at the time.
+
+    Threads don't inherit the block; to count their calls into the same totals, enter
+    counting_usage() in them with the counts yielded here.
+
+    Args:
+        counts (dict): Counters to add to, a fresh set if None.
+
+    Yields:
+        dict: The block's "calls", "prompt_tokens" and "completion_tokens", updated as calls finish.
+    """
+    counts = _empty_usage() if counts is None else counts
+    token = _block_usage.set(counts)
+    try:
+        yield counts
+    finally:
+        _block_usage.reset(token)
+
+
+def usage_stats():
+    """
+    Returns the LLM calls and tokens spent by this process.
+
+    Returns:
+        dict: Totals ("calls", "prompt_tokens", "completion_tokens") plus the same counters per model under "by_model".
+    """
+    with _usage_lock:
+        by_model = {model_name: dict(counts) for model_name, counts in _usage.items()}
+    totals = {name: sum(counts[name] for counts in by_model.values())
+              for name in ("calls", "prompt_tokens", "completion_tokens")}
+    return {**totals, "by_model": by_model}
+
+
+def _estimate_tokens(messages, functions=None):
+    # What utils.rate_limit charges a call before it is made
+    return count_prompt_tokens(messages, functions) + utils.rate_limit.LLM_COMPLETION_TOKENS_ESTIMATE
+
+
+def _invoke(task, model_name, temperature, messages, functions=None):
+    # Transient API errors (429s, timeouts, 5xx) are retried with backoff, honouring retry-after;
+    # every attempt waits its turn with the shared rate limiter, and fails fast while the circuit breaker is open
+    chat = get_chat(model_name, temperature, task)
+    estimate = _estimate_tokens(messages, functions)
+    breaker = utils.circuit_breaker.breaker
+
+    def _call():
+        breaker.check()
+        with utils.rate_limit.limiter.slot(estimate), breaker.guard():
+            return chat.invoke(messages, **_function_kwargs(functions))
+    message = utils.retry.retry_call(_call)
+    content = _reply_content(message, functions)
+    utils.rate_limit.limiter.settle(estimate, _record_usage(model_name, messages, functions, message, content))
+    return content
+
+
+async def _ainvoke(task, model_name, temperature, messages, functions=None):
+    chat = get_chat(model_name, temperature, task)
+    estimate = _estimate_tokens(messages, functions)
+    breaker = utils.circuit_breaker.breaker
+
+    async def _call():
+        breaker.check()
+        async with utils.rate_limit.limiter.aslot(estimate):
+            with breaker.guard():
+                return await chat.ainvoke(messages, **_function_kwargs(functions))
+    message = await utils.retry.aretry_call(_call)
+    content = _reply_content(message, functions)
+    await utils.rate_limit.limiter.asettle(estimate, _record_usage(model_name, messages, functions, message, content))
+    return content
+
+
+def _stale_reply(key, error):
+    # What a call refused by the open circuit breaker answers: the expired cached reply if there is one
+    stale = response_cache.get_stale(key) if LLM_SERVE_STALE and key is not None else None
+    return _serve_stale(stale, error)
+
+
+async def _astale_reply(key, error):
+    stale = await response_cache.aget_stale(key) if LLM_SERVE_STALE and key is not None else None
+    return _serve_stale(stale, error)
+
+
+def _serve_stale(stale, error):
+    if stale is None:
+        raise error
+    print("- - - LLM backend unavailable, serving an expired cached reply")
+    return stale
+
+
+def _cache_key(model_name, temperature, messages, functions=None):
+    # Only deterministic calls are cached; the rendered messages cover both the template and its variables
+    if temperature != 0:
+        return None
+    return utils.cache.make_key(model_name, [(message.type, message.content) for message in messages], functions)
+
+
+def complete(task, chat_prompt, model_name, temperature=0, bypass_cache=False, functions=None, **variables):
+    """
+    Formats a chat prompt with the given variables and returns the model's reply.
+    Temperature-0 replies are served from response_cache when the same prompt was answered before,
+    and concurrent identical calls are coalesced into one request. While the circuit breaker is
+    open, an expired cached reply is served if there is one.
+
+    Args:
+        task (str): Short name of the calling helper (e.g. "objective").
+        chat_prompt (ChatPromptTemplate): The prompt to format.
+        model_name (str): The OpenAI chat model to use.
+        temperature (float): The sampling temperature.
+        bypass_cache (bool): Ask the model again even if a cached reply exists (the new reply replaces it).
+        functions (list): OpenAI function definitions; the first one is forced and its arguments are returned.
+        **variables: Values for the prompt's template variables.
+
+    Returns:
+        str: The content of the model's reply (or the function call arguments).
+
+    Raises:
+        utils.circuit_breaker.CircuitOpenError: If the circuit breaker is open and there is no cached reply.
+    """
+    messages = chat_prompt.format_prompt(**variables).to_messages()
+    key = _cache_key(model_name, temperature, messages, functions)
+    if key is not None and not bypass_cache:
+        cached = response_cache.get(key)
+        if cached is not None:
+            return cached
+    if key is None:
+        return _invoke(task, model_name, temperature, messages, functions)
+
+    def _call():
+        content = _invoke(task, model_name, temperature, messages, functions)
+        response_cache.set(key, content)
+        return content
+    try:
+        return inflight.do(key, _call)
+    except utils.circuit_breaker.CircuitOpenError as e:
+        return _stale_reply(key, e)
+
+
+async def acomplete(task, chat_prompt, model_name, temperature=0, bypass_cache=False, functions=None, **variables):
+    """Async version of complete(), awaiting the reply on the shared async connection pool."""
+    messages = chat_prompt.format_prompt(**variables).to_messages()
+    key = _cache_key(model_name, temperature, messages, functions)
+    if key is not None and not bypass_cache:
+        cached = await response_cache.aget(key)
+        if cached is not None:
+            return cached
+    if key is None:
+        return await _ainvoke(task, model_name, temperature, messages, functions)
+
+    async def _call():
+        content = await _ainvoke(task, model_name, temperature, messages, functions)
+        await response_cache.aset(key, content)
+        return content
+    try:
+        return await inflight.ado(key, _call)
+    except utils.circuit_breaker.CircuitOpenError as e:
+        return await _astale_reply(key, e)
+
+
+async def astream(task, chat_prompt, model_name, temperature=0, bypass_cache=False, **variables):
+    """
+    Streaming version of acomplete(): yields the reply's text in chunks as the model generates it.
+    A cached reply is yielded whole, and a complete temperature-0 reply is cached like acomplete()'s.
+    Streams aren't coalesced, and a transient error is only retried before the first chunk. The circuit
+    breaker judges a stream by its first chunk, and while it is open an expired cached reply is yielded whole.
+
+    Args:
+        task (str): Short name of the calling helper (e.g. "objective").
+        chat_prompt (ChatPromptTemplate): The prompt to format.
+        model_name (str): The OpenAI chat model to use.
+        temperature (float): The sampling temperature.
+        bypass_cache (bool): Ask the model again even if a cached reply exists (the new reply replaces it).
+        **variables: Values for the prompt's template variables.
+
+    Yields:
+        str: Consecutive pieces of the reply's content.
+    """
+    messages = chat_prompt.format_prompt(**variables).to_messages()
+    key = _cache_key(model_name, temperature, messages)
+    if key is not None and not bypass_cache:
+        cached = await response_cache.aget(key)
+        if cached is not None:
+            yield cached
+            return
+
+    chat = get_chat(model_name, temperature, task)
+    estimate = _estimate_tokens(messages)
+    breaker = utils.circuit_breaker.breaker
+
+    async def _stream():
+        # The rate limiter's slot is held for the whole stream, the breaker only times the wait for the first chunk
+        breaker.check()
+        async with utils.rate_limit.limiter.aslot(estimate):
+            stream = chat.astream(messages).__aiter__()
+            try:
+                with breaker.guard():
+                    first = await stream.__anext__()
+            except StopAsyncIteration:
+                return
+            yield first
+            async for chunk in stream:
+                yield chunk
+    chunks = []
+    try:
+        async for chunk in utils.retry.aretry_stream(_stream):
+            if chunk.content:
+                chunks.append(chunk.content)
+                yield chunk.content
+    except utils.circuit_breaker.CircuitOpenError as e:
+        yield await _astale_reply(key, e)
+        return
+    content = "".join(chunks)
+    # Streamed replies carry no token counts, so usage is estimated locally
+    await utils.rate_limit.limiter.asettle(estimate, _record_usage(model_name, messages, None, None, content))
+    if key is not None:
+        await response_cache.aset(key, content)
@@ -0,0 +1,116 @@
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from pdfminer.high_level import extract_text
+from pdfminer.pdfpage import PDFPage
+from dotenv import load_dotenv
+import multiprocessing
+import threading
+import time
+import io
+import os
+
+load_dotenv()
+
+########################################################################################
+#                           PAGE-PARALLEL PDF TEXT EXTRACTION                          #
+########################################################################################
+
+# pdfminer is pure Python and holds the GIL, so pages are laid out in worker processes instead of the request thread.
+# PDF_WORKERS=0 extracts in the calling thread.
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(min(4, os.cpu_count() or 1))))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "2"))
+PDF_TIMEOUT = float(os.getenv("PDF_TIMEOUT", "60"))
+
+_lock = threading.Lock()
+_pool = None
+
+
+def _get_pool():
+    global _pool
+    with _lock:
+        if _pool is None:
+            # spawn rather than fork: forking a threaded server process can deadlock the child
+            _pool = ProcessPoolExecutor(max_workers=PDF_WORKERS,
+                                        mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def _reset_pool(pool, terminate=False):
+    # The next document gets a fresh pool; terminate also kills workers still busy on this one's tasks
+    global _pool
+    with _lock:
+        if _pool is pool:
+            _pool = None
+    # shutdown() forgets the processes, so take them first (the executor has no public way to kill them)
+    processes = list((getattr(pool, "_processes", None) or {}).values())
+    pool.shutdown(wait=False, cancel_futures=True)
+    if terminate:
+        for process in processes:
+            process.terminate()
+
+
+def _page_count(data):
+    return sum(1 for _ in PDFPage.get_pages(io.BytesIO(data)))
+
+
+def _extract_pages(data, page_numbers):
+    # Each page's text ends with a form feed, so chunks concatenate to the whole document's text
+    return extract_text(io.BytesIO(data), page_numbers=page_numbers)
+
+
+def _read(source):
+    if isinstance(source, (bytes, bytearray)):
+        return bytes(source)
+    if hasattr(source, "read"):
+        return source.read()
+    with open(source, "rb") as f:
+        return f.read()
+
+
+def extract_pdf_text(source, timeout=None):
+    """
+    Extracts the text of a PDF, laying out chunks of PDF_PAGES_PER_TASK pages in parallel
+    in the shared process pool and joining them back in page order.
+
+    Args:
+        source: A file path, the PDF's bytes, or a binary file object.
+        timeout (float): Seconds allowed for the whole document, defaults to PDF_TIMEOUT.
+
+    Returns:
+        str: The raw text of the document, as pdfminer's extract_text() would return it.
+
+    Raises:
+        TimeoutError: If the document isn't extracted within the timeout.
+    """
+    data = _read(source)
+    if PDF_WORKERS <= 0:
+        return extract_text(io.BytesIO(data))
+
+    timeout = PDF_TIMEOUT if timeout is None else timeout
+    deadline = time.monotonic() + timeout
+    pool = _get_pool()
+    futures = []
+    try:
+        num_pages = pool.submit(_page_count, data).result(timeout=timeout)
+        for first in range(0, num_pages, PDF_PAGES_PER_TASK):
+            page_numbers = list(range(first, min(first + PDF_PAGES_PER_TASK, num_pages)))
+            futures.append(pool.submit(_extract_pages, data, page_numbers))
+        return "".join(future.result(timeout=max(0, deadline - time.monotonic())) for future in futures)
+    except FutureTimeoutError:
+        # A worker stuck on a pathological page would otherwise stay busy (and keep the pool short a
+        # worker) until pdfminer gives up; documents sharing the pool fail with BrokenProcessPool
+        _reset_pool(pool, terminate=True)
+        raise TimeoutError(f"PDF text extraction took longer than {timeout:.0f}s")
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for memory); start a fresh pool for the next document
+        _reset_pool(pool)
+        raise
+
+
+def shutdown():
+    """Stops the worker processes (called when the app shuts down)."""
+    global _pool
+    with _lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,144 @@
+import re
+
+########################################################################################
+#                           RULE-BASED PRE-EXTRACTION                                  #
+########################################################################################
+
+# These run on the raw text: process_clean_text strips the "@", "." and "/" they depend on
+EMAIL = re.compile(r"[A-Za-z0-9._%+-]+@[A-Za-z0-9-]+(?:\.[A-Za-z0-9-]+)*\.[A-Za-z]{2,}")
+PHONE = re.compile(r"(?<![\w/])(?:\+\d{1,3}[\s.-]?)?(?:\(\d{1,4}\)[\s.-]?)?\d{2,4}(?:[\s.-]?\d{2,4}){1,4}(?![\w/])")
+LINKEDIN = re.compile(r"(?:https?://)?(?:[a-z]{2,3}\.)?linkedin\.com/(?:in|pub)/[\w%-]+/?", re.IGNORECASE)
+GITHUB = re.compile(r"(?:https?://)?(?:www\.)?github\.com/[\w-]+", re.IGNORECASE)
+# Only addresses written with a scheme or "www.", bare names like "ASP.NET" or "Socket.io" are skills
+URL = re.compile(r"(?<![@\w.])(?:https?://(?:www\.)?|www\.)[a-z0-9-]+(?:\.[a-z0-9-]+)*\.[a-z]{2,}(?:/[\w./%#?=&-]*)?(?![\w@])",
+                 re.IGNORECASE)
+GPA = re.compile(
+    r"\bGPA\b\s*(?:of|:|-)?\s*(\d\.\d{1,2})(?:\s*(?:/|out of)\s*(\d{1,2}(?:\.\d{1,2})?))?"
+    r"|(\d\.\d{1,2})\s*(?:/|out of)\s*(\d{1,2}(?:\.\d{1,2})?)\s*(?:cumulative\s+)?GPA\b",
+    re.IGNORECASE)
+# How far back before a GPA its education entry is looked for
+GPA_CONTEXT_CHARS = 600
+
+# A phone number has between 7 and 15 digits (E.164)
+PHONE_MIN_DIGITS = 7
+PHONE_MAX_DIGITS = 15
+_YEAR = re.compile(r"(?:19|20)\d{2}")
+_PHONE_LABEL = re.compile(r"\b(?:phone|tel|mobile|cell|ph)\b", re.IGNORECASE)
+
+# Phone numbers and portfolio URLs are only looked for in the contact details: the first HEADER_LINES non-blank
+# lines and any line with a contact cue, as ids, reference numbers and framework names elsewhere look just like them
+HEADER_LINES = 8
+_CONTACT_CUE = re.compile(r"@|\b(?:phone|tel|mobile|cell|contact|website|portfolio|linkedin|github)\b", re.IGNORECASE)
+
+
+def _contact_text(text):
+    lines = [line for line in text.splitlines() if line.strip()]
+    return "\n".join(lines[:HEADER_LINES] + [line for line in lines[HEADER_LINES:] if _CONTACT_CUE.search(line)])
+
+
+def _find_phone(text):
+    for line in text.splitlines():
+        for match in PHONE.finditer(line):
+            candidate = match.group(0).strip()
+            digits = sum(char.isdigit() for char in candidate)
+            groups = re.findall(r"\d+", candidate)
+            if not PHONE_MIN_DIGITS <= digits <= PHONE_MAX_DIGITS:
+                continue
+            # Runs of years ("2015 - 2019", "2019 2020 2021") aren't phone numbers, and an unformatted run of
+            # digits ("12345678") is as likely an id or reference number unless the line says it's a phone
+            if all(_YEAR.fullmatch(group) for group in groups):
+                continue
+            if len(groups) == 1 and not candidate.startswith("+") and not _PHONE_LABEL.search(line):
+                continue
+            return candidate
+    return None
+
+
+def _find_portfolio(text):
+    for match in URL.finditer(text):
+        url = match.group(0)
+        if "linkedin.com" in url.lower() or "github.com" in url.lower():
+            continue
+        return url
+    return None
+
+
+def pre_extract(raw_text):
+    """
+    Finds the resume fields that regular expressions get right, so the LLM doesn't have to.
+
+    Args:
+        raw_text (str): The resume text before process_clean_text.
+
+    Returns:
+        dict: {"basic_info": {field: value}, "gpas": [{"gpa", "context"}, ...]} holding only the basic_info
+              fields that were found (email, phone_number, linkedin_url, github_main_page_url,
+              portfolio_website_url), and the GPAs in the order they appear, each with the (normalised) text
+              since the previous one, which apply_known() ties it to its education entry by.
+    """
+    basic_info = {}
+    email = EMAIL.search(raw_text)
+    if email:
+        basic_info["email"] = email.group(0)
+    # Emails would otherwise be read as portfolio URLs
+    without_emails = EMAIL.sub(" ", raw_text)
+    contact = EMAIL.sub(" ", _contact_text(raw_text))
+    phone = _find_phone(contact)
+    if phone:
+        basic_info["phone_number"] = phone
+    linkedin = LINKEDIN.search(without_emails)
+    if linkedin:
+        basic_info["linkedin_url"] = linkedin.group(0)
+    github = GITHUB.search(without_emails)
+    if github:
+        basic_info["github_main_page_url"] = github.group(0)
+    portfolio = _find_portfolio(contact)
+    if portfolio:
+        basic_info["portfolio_website_url"] = portfolio
+
+    gpas = []
+    previous_end = 0
+    for match in GPA.finditer(raw_text):
+        value, scale = (match.group(1), match.group(2)) if match.group(1) else (match.group(3), match.group(4))
+        context = _normalise(raw_text[max(previous_end, match.start() - GPA_CONTEXT_CHARS):match.start()])
+        gpas.append({"gpa": f"{value}/{scale}" if scale else value, "context": context})
+        previous_end = match.end()
+
+    return {"basic_info": basic_info, "gpas": gpas}
+
+
+def _normalise(text):
+    # University names in the answer come from the cleaned text, so only letters and digits are compared
+    return " ".join(re.findall(r"[a-z0-9]+", text.lower()))
+
+
+def _entry_for_gpa(educations, gpa):
+    # The education entry named last before the GPA (and after the previous one), if any
+    best, best_at = None, -1
+    for education in educations:
+        name = _normalise(education.get("university") or "")
+        at = gpa["context"].rfind(name) if name else -1
+        if at > best_at:
+            best, best_at = education, at
+    return best
+
+
+def apply_known(answer, known):
+    """
+    Fills the pre-extracted fields into an extraction answer (in ResumeModel's shape), in place.
+    A GPA only replaces the LLM's when it can be tied to its entry: the only GPA of the only entry,
+    or found after the entry's university and before any other GPA.
+    """
+    if not known:
+        return answer
+    if isinstance(answer.get("basic_info"), dict):
+        answer["basic_info"].update(known["basic_info"])
+    educations = [education for education in answer.get("education") or [] if isinstance(education, dict)]
+    if len(educations) == 1 and len(known["gpas"]) == 1:
+        educations[0]["GPA"] = known["gpas"][0]["gpa"]
+    elif educations:
+        for gpa in known["gpas"]:
+            education = _entry_for_gpa(educations, gpa)
+            if education is not None:
+                education["GPA"] = gpa["gpa"]
+    return answer
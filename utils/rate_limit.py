@@ -0,0 +1,283 @@
+from contextlib import asynccontextmanager, contextmanager
+from dotenv import load_dotenv
+import utils.retry
+import contextvars
+import threading
+import asyncio
+import sqlite3
+import openai
+import time
+import os
+
+load_dotenv()
+
+########################################################################################
+#                           OUTBOUND LLM RATE LIMITING                                 #
+########################################################################################
+
+# The account's limits; every worker process pointed at the same LLM_RATE_LIMIT_DB shares them (0 disables a limit)
+LLM_RATE_LIMIT_RPM = int(os.getenv("LLM_RATE_LIMIT_RPM", "3500"))
+LLM_RATE_LIMIT_TPM = int(os.getenv("LLM_RATE_LIMIT_TPM", "160000"))
+# SQLite file holding the shared buckets; an empty LLM_RATE_LIMIT_DB limits this process only
+LLM_RATE_LIMIT_DB = os.getenv("LLM_RATE_LIMIT_DB", "rate_limit.db")
+# Calls in flight at once in this process
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+# Share of each bucket batch calls leave untouched, so interactive calls still get through during a batch
+LLM_BATCH_RESERVE = float(os.getenv("LLM_BATCH_RESERVE", "0.2"))
+# Completion tokens charged up front per call; the difference to the real count is settled afterwards
+LLM_COMPLETION_TOKENS_ESTIMATE = int(os.getenv("LLM_COMPLETION_TOKENS_ESTIMATE", "500"))
+# How long every worker holds off after a 429 that didn't say how long to wait
+LLM_RATE_LIMIT_PAUSE = float(os.getenv("LLM_RATE_LIMIT_PAUSE", "1"))
+
+INTERACTIVE, BATCH = "interactive", "batch"
+
+_priority = contextvars.ContextVar("llm_priority", default=INTERACTIVE)
+
+# Longest single sleep while waiting, so a waiter notices freed slots and pauses ending early
+_MAX_SLEEP = 0.5
+# How often a caller waiting for a concurrency slot (rather than for budget) checks again
+_SLOT_POLL_INTERVAL = 0.02
+
+
+@contextmanager
+def priority(level):
+    """Runs the block's LLM calls at the given priority (INTERACTIVE or BATCH)."""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority():
+    return _priority.get()
+
+
+def _refill(level, updated_at, limit, now):
+    # Buckets hold at most a minute's worth and refill continuously
+    return min(limit, level + (now - updated_at) * limit / 60)
+
+
+class _Buckets:
+    """
+    A requests and a tokens bucket. Subclasses provide _transaction(fn), running fn(levels, now) on the
+    buckets' current levels {name: (level, updated_at)} atomically and storing the levels it returns.
+    """
+
+    def __init__(self, limits):
+        self.limits = {name: limit for name, limit in limits.items() if limit > 0}
+
+    def take(self, costs, reserve=0.0):
+        """
+        Takes costs ({bucket: amount}) out of the buckets if all of them can afford it while keeping
+        reserve (a share of each limit) untouched.
+
+        Returns:
+            float: 0 if taken, otherwise the seconds until it could be.
+        """
+        def fn(levels, now):
+            paused_until = levels.get("paused_until", (0, 0))[0]
+            if paused_until > now:
+                return levels, paused_until - now
+            current = {name: _refill(*levels.get(name, (limit, now)), limit, now) for name, limit in self.limits.items()}
+            wait = 0.0
+            for name, limit in self.limits.items():
+                # A call costing more than the bucket holds is let through once it is full
+                need = min(costs.get(name, 0), limit * (1 - reserve)) + limit * reserve
+                if current[name] < need:
+                    wait = max(wait, (need - current[name]) * 60 / limit)
+            if not wait:
+                current = {name: level - costs.get(name, 0) for name, level in current.items()}
+            return {**levels, **{name: (level, now) for name, level in current.items()}}, wait
+        return self._transaction(fn)
+
+    def adjust(self, costs):
+        """Charges costs (negative amounts refund) without waiting; levels may go below zero."""
+        def fn(levels, now):
+            for name, limit in self.limits.items():
+                if costs.get(name):
+                    level = _refill(*levels.get(name, (limit, now)), limit, now)
+                    levels[name] = (level - costs[name], now)
+            return levels, None
+        self._transaction(fn)
+
+    def pause(self, seconds):
+        """Holds off every caller for the given seconds."""
+        def fn(levels, now):
+            levels["paused_until"] = (max(levels.get("paused_until", (0, 0))[0], now + seconds), now)
+            return levels, None
+        self._transaction(fn)
+
+
+class MemoryBuckets(_Buckets):
+    """Buckets of this process only."""
+
+    def __init__(self, limits):
+        super().__init__(limits)
+        self._lock = threading.Lock()
+        self._levels = {}
+
+    def _transaction(self, fn):
+        with self._lock:
+            self._levels, result = fn(dict(self._levels), time.time())
+            return result
+
+
+class SQLiteBuckets(_Buckets):
+    """Buckets in a SQLite table, shared by every worker process pointed at the same file."""
+
+    def __init__(self, path, limits):
+        super().__init__(limits)
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS rate_limit_buckets ("
+                           "name TEXT PRIMARY KEY, level REAL NOT NULL, updated_at REAL NOT NULL)")
+
+    def _transaction(self, fn):
+        with self._lock:
+            # BEGIN IMMEDIATE takes the write lock up front, so two processes can't spend the same budget
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                levels = {name: (level, updated_at) for name, level, updated_at
+                          in self._conn.execute("SELECT name, level, updated_at FROM rate_limit_buckets")}
+                levels, result = fn(dict(levels), time.time())
+                self._conn.executemany("INSERT OR REPLACE INTO rate_limit_buckets (name, level, updated_at) "
+                                       "VALUES (?, ?, ?)", [(name, *state) for name, state in levels.items()])
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            return result
+
+
+class RateLimiter:
+    """
+    Paces outbound LLM calls: each call waits for a concurrency slot in this process and for room in the
+    shared requests/tokens buckets, charged its prompt tokens plus LLM_COMPLETION_TOKENS_ESTIMATE up front
+    and settled with the real count afterwards. Batch calls (see priority()) leave LLM_BATCH_RESERVE of
+    each bucket alone and give way to interactive calls waiting in the same process. A 429 pauses every
+    caller sharing the buckets for its retry-after, rather than letting each retry straight away.
+    """
+
+    def __init__(self, buckets, max_concurrency=LLM_MAX_CONCURRENCY, batch_reserve=LLM_BATCH_RESERVE):
+        self.buckets = buckets
+        self.max_concurrency = max_concurrency
+        self.batch_reserve = batch_reserve
+        self._lock = threading.Lock()
+        self._active = 0
+        self._waiting = {INTERACTIVE: 0, BATCH: 0}
+        self._stats = {"calls": 0, "waited": 0, "wait_seconds": 0.0, "throttled": 0}
+
+    def _try(self, tokens, level):
+        # 0 once a slot and the budget are taken, otherwise how long to wait before trying again
+        with self._lock:
+            if self._active >= self.max_concurrency or (level == BATCH and self._waiting[INTERACTIVE]):
+                return _SLOT_POLL_INTERVAL
+            self._active += 1
+        wait = self.buckets.take({"requests": 1, "tokens": tokens}, self.batch_reserve if level == BATCH else 0.0)
+        if wait:
+            with self._lock:
+                self._active -= 1
+        return wait
+
+    def _waiting_for(self, level, delta):
+        with self._lock:
+            self._waiting[level] += delta
+
+    def _record(self, waited):
+        # waited is None for a call that got through without sleeping
+        with self._lock:
+            self._stats["calls"] += 1
+            if waited is not None:
+                self._stats["waited"] += 1
+                self._stats["wait_seconds"] += waited
+
+    def acquire(self, tokens):
+        level = _priority.get()
+        started, slept = time.perf_counter(), False
+        self._waiting_for(level, 1)
+        try:
+            while True:
+                wait = self._try(tokens, level)
+                if not wait:
+                    break
+                slept = True
+                time.sleep(min(wait, _MAX_SLEEP))
+        finally:
+            self._waiting_for(level, -1)
+        self._record(time.perf_counter() - started if slept else None)
+
+    async def aacquire(self, tokens):
+        level = _priority.get()
+        started, slept = time.perf_counter(), False
+        self._waiting_for(level, 1)
+        try:
+            while True:
+                # The shared buckets may wait on another process's SQLite lock, so not on the event loop
+                wait = await asyncio.to_thread(self._try, tokens, level)
+                if not wait:
+                    break
+                slept = True
+                await asyncio.sleep(min(wait, _MAX_SLEEP))
+        finally:
+            self._waiting_for(level, -1)
+        self._record(time.perf_counter() - started if slept else None)
+
+    def release(self):
+        with self._lock:
+            self._active -= 1
+
+    def settle(self, estimated_tokens, actual_tokens):
+        """Charges (or refunds) the difference between a call's up-front token estimate and its real usage."""
+        if actual_tokens != estimated_tokens:
+            self.buckets.adjust({"tokens": actual_tokens - estimated_tokens})
+
+    async def asettle(self, estimated_tokens, actual_tokens):
+        # Like aacquire(), kept off the event loop in case the buckets wait on another process's SQLite lock
+        await asyncio.to_thread(self.settle, estimated_tokens, actual_tokens)
+
+    def throttled(self, error):
+        """Pauses every caller sharing the buckets after a 429."""
+        with self._lock:
+            self._stats["throttled"] += 1
+        self.buckets.pause(utils.retry.retry_after_seconds(error) or LLM_RATE_LIMIT_PAUSE)
+
+    @contextmanager
+    def slot(self, tokens):
+        """Holds a concurrency slot and tokens' worth of budget for the block, one LLM request."""
+        self.acquire(tokens)
+        try:
+            yield
+        except openai.RateLimitError as e:
+            self.throttled(e)
+            raise
+        finally:
+            self.release()
+
+    @asynccontextmanager
+    async def aslot(self, tokens):
+        await self.aacquire(tokens)
+        try:
+            yield
+        except openai.RateLimitError as e:
+            await asyncio.to_thread(self.throttled, e)
+            raise
+        finally:
+            self.release()
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, "wait_seconds": round(self._stats["wait_seconds"], 3),
+                    "active": self._active, "waiting": dict(self._waiting)}
+
+
+def _buckets():
+    limits = {"requests": LLM_RATE_LIMIT_RPM, "tokens": LLM_RATE_LIMIT_TPM}
+    return SQLiteBuckets(LLM_RATE_LIMIT_DB, limits) if LLM_RATE_LIMIT_DB else MemoryBuckets(limits)
+
+
+limiter = RateLimiter(_buckets())
@@ -0,0 +1,113 @@
+from dotenv import load_dotenv
+import asyncio
+import random
+import time
+import openai
+import os
+
+load_dotenv()
+
+########################################################################################
+#                           RETRIES - BACKOFF, JITTER & RETRY-AFTER                    #
+########################################################################################
+
+LLM_RETRY_ATTEMPTS = int(os.getenv("LLM_RETRY_ATTEMPTS", "4"))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))
+LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", "30"))
+
+# Errors worth another attempt: throttling, dropped connections, timeouts and 5xx responses
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APIConnectionError,
+    openai.APITimeoutError,
+    openai.InternalServerError,
+)
+
+
+def retry_after_seconds(error):
+    """
+    Returns how long the server asked us to wait before retrying, or None.
+    Reads the retry-after-ms / retry-after headers of OpenAI API errors.
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        return None
+    return None
+
+
+def backoff_delay(attempt, error=None):
+    """
+    Returns the seconds to sleep before retry number attempt (starting at 0).
+    A server-provided retry-after wins; otherwise exponential backoff with full jitter, capped at LLM_RETRY_MAX_DELAY.
+    """
+    retry_after = retry_after_seconds(error) if error is not None else None
+    if retry_after is not None:
+        return min(retry_after, LLM_RETRY_MAX_DELAY)
+    return random.uniform(0, min(LLM_RETRY_MAX_DELAY, LLM_RETRY_BASE_DELAY * 2 ** attempt))
+
+
+def retry_call(fn, attempts=None, retry_on=RETRYABLE_ERRORS):
+    """
+    Calls fn(), retrying on the retry_on exceptions with backoff_delay() between attempts.
+
+    Args:
+        fn (callable): The zero-argument function to call.
+        attempts (int): Total number of attempts, defaults to LLM_RETRY_ATTEMPTS.
+        retry_on (tuple): Exception types that trigger a retry; anything else is raised immediately.
+
+    Returns:
+        The return value of fn().
+    """
+    attempts = attempts or LLM_RETRY_ATTEMPTS
+    for attempt in range(attempts):
+        try:
+            return fn()
+        except retry_on as e:
+            if attempt == attempts - 1:
+                raise
+            delay = backoff_delay(attempt, e)
+            print(f"- - - {type(e).__name__} from OpenAI, retrying in {delay:.2f}s ({attempt + 1}/{attempts - 1})")
+            time.sleep(delay)
+
+
+async def aretry_call(afn, attempts=None, retry_on=RETRYABLE_ERRORS):
+    """Async version of retry_call(), awaiting afn() and sleeping without blocking the event loop."""
+    attempts = attempts or LLM_RETRY_ATTEMPTS
+    for attempt in range(attempts):
+        try:
+            return await afn()
+        except retry_on as e:
+            if attempt == attempts - 1:
+                raise
+            delay = backoff_delay(attempt, e)
+            print(f"- - - {type(e).__name__} from OpenAI, retrying in {delay:.2f}s ({attempt + 1}/{attempts - 1})")
+            await asyncio.sleep(delay)
+
+
+async def aretry_stream(agen_fn, attempts=None, retry_on=RETRYABLE_ERRORS):
+    """
+    Yields the chunks of the async generator agen_fn() returns, starting it again with backoff on a transient
+    error only while nothing has been yielded yet; once output has reached the caller, an error is raised as is.
+    """
+    attempts = attempts or LLM_RETRY_ATTEMPTS
+    for attempt in range(attempts):
+        started = False
+        try:
+            async for chunk in agen_fn():
+                started = True
+                yield chunk
+            return
+        except retry_on as e:
+            if started or attempt == attempts - 1:
+                raise
+            delay = backoff_delay(attempt, e)
+            print(f"- - - {type(e).__name__} from OpenAI, retrying in {delay:.2f}s ({attempt + 1}/{attempts - 1})")
+            await asyncio.sleep(delay)
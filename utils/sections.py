@@ -0,0 +1,59 @@
+import re
+
+########################################################################################
+#                           RESUME SECTION DETECTION                                   #
+########################################################################################
+
+# Headings as they appear in cleaned text (one per line, punctuation already stripped)
+SECTION_HEADINGS = {
+    "experience": re.compile(
+        r"^(?:(?:work|professional|relevant|employment|career)\s+)?(?:experience|history|employment|employment\s+history|work\s+history)$",
+        re.IGNORECASE),
+    "education": re.compile(
+        r"^(?:education|academic\s+background|academics|education\s+and\s+training|qualifications)$",
+        re.IGNORECASE),
+    "projects": re.compile(
+        r"^(?:(?:personal|academic|selected|key|technical)\s+)?projects?(?:\s+experience)?$",
+        re.IGNORECASE),
+    "skills": re.compile(
+        r"^(?:(?:technical|core|key|professional)\s+)?(?:skills|competencies|technologies)(?:\s+and\s+\w+)?$",
+        re.IGNORECASE),
+}
+
+# Headings of sections we don't extract, so their text doesn't leak into the previous section
+OTHER_HEADINGS = re.compile(
+    r"^(?:certifications?|awards?|honou?rs|publications|languages|interests|hobbies|references|volunteer(?:ing)?(?:\s+experience)?|activities)$",
+    re.IGNORECASE)
+
+# A heading is a short line on its own
+MAX_HEADING_WORDS = 5
+
+
+def split_sections(text):
+    """
+    Splits cleaned resume text into its main sections by looking for heading lines.
+
+    Args:
+        text (str): Resume text as returned by process_clean_text.
+
+    Returns:
+        dict: Section name ("header", "experience", "education", "projects", "skills") to its text.
+              "header" holds everything before the first heading (name, contact details, objective).
+              Sections without a heading are missing from the dict.
+    """
+    sections = {"header": []}
+    current = "header"
+    for line in text.split("\n"):
+        stripped = line.strip()
+        if stripped and len(stripped.split()) <= MAX_HEADING_WORDS:
+            name = next((name for name, pattern in SECTION_HEADINGS.items() if pattern.match(stripped)), None)
+            if name is not None:
+                current = name
+                sections.setdefault(current, [])
+                continue
+            if OTHER_HEADINGS.match(stripped):
+                current = None
+                continue
+        if current is not None:
+            sections[current].append(line)
+    return {name: "\n".join(lines).strip() for name, lines in sections.items() if "\n".join(lines).strip()}
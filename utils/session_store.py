@@ -0,0 +1,350 @@
+from sqlalchemy import create_engine, event, Column, Float, Integer, MetaData, String, Table, Text
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import OperationalError
+from utils.cache import LRUCache
+from utils.dataclass import ResumeModel
+from dotenv import load_dotenv
+import threading
+import json
+import time
+import uuid
+import os
+
+load_dotenv()
+
+########################################################################################
+#                           PER-SESSION RESUME STORE                                   #
+########################################################################################
+
+# Any SQLAlchemy URL; point every worker (or node) at the same database to share sessions.
+# An empty SESSION_DB_URL keeps sessions in this process only.
+SESSION_DB_URL = os.getenv("SESSION_DB_URL", "sqlite:///sessions.db")
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "1024"))
+# Enhancement memo entries (see SessionMemo) kept in memory across all sessions
+SESSION_MEMO_CACHE_SIZE = int(os.getenv("SESSION_MEMO_CACHE_SIZE", "16384"))
+# Sessions unused for SESSION_TTL seconds expire; reading one keeps it alive, refreshed at most every tenth of the TTL
+SESSION_TTL = float(os.getenv("SESSION_TTL", str(7 * 24 * 3600)))
+# Read-modify-write attempts before a save that keeps losing races gives up
+SESSION_UPDATE_ATTEMPTS = int(os.getenv("SESSION_UPDATE_ATTEMPTS", "5"))
+
+
+class SessionConflictError(Exception):
+    """The session was saved by another request since it was read."""
+
+
+class MemorySessionBackend:
+    """Sessions held in this process only, for a single worker or when no database is configured."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # session_id -> (version, resume_json, updated_at)
+        self._rows = {}
+        # session_id -> {fingerprint: output_json}
+        self._memo = {}
+
+    def state(self, session_id):
+        with self._lock:
+            row = self._rows.get(session_id)
+            return (row[0], row[2]) if row else None
+
+    def touch(self, session_id):
+        with self._lock:
+            row = self._rows.get(session_id)
+            if row:
+                self._rows[session_id] = (row[0], row[1], time.time())
+
+    def load(self, session_id):
+        with self._lock:
+            row = self._rows.get(session_id)
+            return (row[0], row[1]) if row else None
+
+    def save(self, session_id, resume_json, expected_version=None):
+        with self._lock:
+            row = self._rows.get(session_id)
+            if expected_version is not None and (row[0] if row else None) != expected_version:
+                raise SessionConflictError(session_id)
+            version = (row[0] if row else 0) + 1
+            self._rows[session_id] = (version, resume_json, time.time())
+            return version
+
+    def load_memo(self, session_id, fingerprints):
+        with self._lock:
+            memo = self._memo.get(session_id, {})
+            return {fingerprint: memo[fingerprint] for fingerprint in fingerprints if fingerprint in memo}
+
+    def save_memo(self, session_id, entries):
+        with self._lock:
+            self._memo.setdefault(session_id, {}).update(entries)
+
+    def delete(self, session_id):
+        with self._lock:
+            self._rows.pop(session_id, None)
+            self._memo.pop(session_id, None)
+
+    def purge(self, older_than):
+        with self._lock:
+            for session_id in [key for key, row in self._rows.items() if row[2] < older_than]:
+                del self._rows[session_id]
+                self._memo.pop(session_id, None)
+
+
+class SQLSessionBackend:
+    """
+    Sessions in a resume_sessions table through SQLAlchemy, shared by every worker pointed at the database.
+    Each save bumps the row's version; saving with expected_version only succeeds if nobody saved in between.
+    """
+
+    def __init__(self, url):
+        connect_args = {"check_same_thread": False} if url.startswith("sqlite") else {}
+        self.engine = create_engine(url, connect_args=connect_args, pool_pre_ping=True)
+        if url.startswith("sqlite"):
+            event.listen(self.engine, "connect", _sqlite_pragmas)
+        metadata = MetaData()
+        self.table = Table(
+            "resume_sessions", metadata,
+            Column("session_id", String(64), primary_key=True),
+            Column("version", Integer, nullable=False),
+            Column("resume", Text, nullable=False),
+            Column("updated_at", Float, nullable=False, index=True),
+        )
+        self.memo = Table(
+            "enhancement_memo", metadata,
+            Column("session_id", String(64), primary_key=True),
+            Column("fingerprint", String(64), primary_key=True),
+            Column("output", Text, nullable=False),
+            Column("updated_at", Float, nullable=False, index=True),
+        )
+        try:
+            metadata.create_all(self.engine)
+        except OperationalError:
+            # Another worker starting at the same moment created the tables first; they exist now
+            metadata.create_all(self.engine)
+
+    def state(self, session_id):
+        with self.engine.connect() as conn:
+            row = conn.execute(select(self.table.c.version, self.table.c.updated_at)
+                               .where(self.table.c.session_id == session_id)).first()
+            return (row.version, row.updated_at) if row else None
+
+    def touch(self, session_id):
+        # Only updated_at changes, so the version (and anyone's compare-and-set on it) is unaffected
+        now = time.time()
+        with self.engine.begin() as conn:
+            conn.execute(update(self.table).where(self.table.c.session_id == session_id).values(updated_at=now))
+            conn.execute(update(self.memo).where(self.memo.c.session_id == session_id).values(updated_at=now))
+
+    def load(self, session_id):
+        with self.engine.connect() as conn:
+            row = conn.execute(select(self.table.c.version, self.table.c.resume)
+                               .where(self.table.c.session_id == session_id)).first()
+            return (row.version, row.resume) if row else None
+
+    def save(self, session_id, resume_json, expected_version=None):
+        table = self.table
+        with self.engine.begin() as conn:
+            if expected_version is None:
+                current = conn.execute(select(table.c.version).where(table.c.session_id == session_id)).scalar()
+                if current is None:
+                    conn.execute(insert(table).values(session_id=session_id, version=1,
+                                                      resume=resume_json, updated_at=time.time()))
+                    return 1
+                expected_version = current
+            # Compare-and-set on the version, so concurrent writers from other workers can't be lost
+            result = conn.execute(update(table)
+                                  .where(table.c.session_id == session_id, table.c.version == expected_version)
+                                  .values(version=expected_version + 1, resume=resume_json, updated_at=time.time()))
+            if result.rowcount != 1:
+                raise SessionConflictError(session_id)
+            return expected_version + 1
+
+    def load_memo(self, session_id, fingerprints):
+        if not fingerprints:
+            return {}
+        memo = self.memo
+        with self.engine.connect() as conn:
+            rows = conn.execute(select(memo.c.fingerprint, memo.c.output)
+                                .where(memo.c.session_id == session_id, memo.c.fingerprint.in_(list(fingerprints))))
+            return {row.fingerprint: row.output for row in rows}
+
+    def save_memo(self, session_id, entries):
+        if not entries:
+            return
+        memo = self.memo
+        now = time.time()
+        # Delete-then-insert is the upsert every dialect understands
+        with self.engine.begin() as conn:
+            conn.execute(delete(memo).where(memo.c.session_id == session_id, memo.c.fingerprint.in_(list(entries))))
+            conn.execute(insert(memo), [{"session_id": session_id, "fingerprint": fingerprint,
+                                         "output": output, "updated_at": now}
+                                        for fingerprint, output in entries.items()])
+
+    def delete(self, session_id):
+        with self.engine.begin() as conn:
+            conn.execute(delete(self.table).where(self.table.c.session_id == session_id))
+            conn.execute(delete(self.memo).where(self.memo.c.session_id == session_id))
+
+    def purge(self, older_than):
+        with self.engine.begin() as conn:
+            conn.execute(delete(self.table).where(self.table.c.updated_at < older_than))
+            conn.execute(delete(self.memo).where(self.memo.c.updated_at < older_than))
+
+
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL lets the workers read while one of them writes
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
+
+
+class SessionStore:
+    """
+    Resume models keyed by session id: an in-process LRU of parsed models in front of a shared backend.
+    A cached model is only used while its version still matches the backend's, so a session saved
+    by another worker is reloaded rather than served stale. Models are copied on the way in and out,
+    so callers can modify what they get without touching the cache. A session expires ttl seconds
+    after it was last saved or read.
+    """
+
+    def __init__(self, backend, cache_size=SESSION_CACHE_SIZE, ttl=SESSION_TTL):
+        self.backend = backend
+        self.ttl = ttl
+        # session_id -> (version, ResumeModel)
+        self.memory = LRUCache(max_entries=cache_size)
+        # (session_id, fingerprint) -> output; an entry never changes meaning, so it needs no version check
+        self.memo_memory = LRUCache(max_entries=SESSION_MEMO_CACHE_SIZE)
+        self._saves = 0
+
+    def _load(self, session_id):
+        state = self.backend.state(session_id)
+        now = time.time()
+        if state is not None and self.ttl and now - state[1] > self.ttl:
+            # Expired but not purged yet
+            self.backend.delete(session_id)
+            state = None
+        if state is None:
+            self.memory.delete(session_id)
+            return None
+        version, updated_at = state
+        if self.ttl and now - updated_at > self.ttl / 10:
+            self.backend.touch(session_id)
+        cached = self.memory.get(session_id)
+        if cached is not None and cached[0] == version:
+            return cached
+        row = self.backend.load(session_id)
+        if row is None:
+            return None
+        entry = (row[0], ResumeModel.model_validate_json(row[1]))
+        self.memory.set(session_id, entry)
+        return entry
+
+    def get(self, session_id):
+        """Returns a copy of the session's resume model, or None for an unknown session."""
+        entry = self._load(session_id)
+        return entry[1].model_copy(deep=True) if entry else None
+
+    def save(self, session_id, resume_model, expected_version=None):
+        """
+        Stores resume_model as the session's resume, creating the session if needed.
+
+        Returns:
+            int: The session's new version.
+
+        Raises:
+            SessionConflictError: If expected_version is given and the session was saved since.
+        """
+        resume_model = resume_model.model_copy(deep=True)
+        version = self.backend.save(session_id, resume_model.model_dump_json(), expected_version)
+        self.memory.set(session_id, (version, resume_model))
+        self._saves += 1
+        # Expired sessions are cleared out now and then rather than on every write
+        if self.ttl and self._saves % 256 == 0:
+            self.backend.purge(time.time() - self.ttl)
+        return version
+
+    def replace(self, session_id, resume_model):
+        """
+        Stores resume_model as the resume of an existing session; unlike save(), never creates one.
+
+        Returns:
+            int: The session's new version, or None for an unknown or expired session.
+        """
+        if self._load(session_id) is None:
+            return None
+        return self.save(session_id, resume_model)
+
+    def create(self, resume_model):
+        """Stores resume_model under a new session id and returns the id."""
+        session_id = uuid.uuid4().hex
+        self.save(session_id, resume_model)
+        return session_id
+
+    def update(self, session_id, apply):
+        """
+        Applies apply(resume_model) to the session's latest resume and saves it, re-reading and
+        re-applying when another request saved the session in between.
+
+        Returns:
+            ResumeModel: A copy of the saved resume, or None for an unknown session.
+        """
+        for _ in range(SESSION_UPDATE_ATTEMPTS):
+            entry = self._load(session_id)
+            if entry is None:
+                return None
+            version, resume_model = entry[0], entry[1].model_copy(deep=True)
+            apply(resume_model)
+            try:
+                self.save(session_id, resume_model, expected_version=version)
+                return resume_model.model_copy(deep=True)
+            except SessionConflictError:
+                continue
+        raise SessionConflictError(session_id)
+
+    def memo(self, session_id):
+        """Returns the session's SessionMemo."""
+        return SessionMemo(self, session_id)
+
+    def delete(self, session_id):
+        self.backend.delete(session_id)
+        self.memory.delete(session_id)
+
+
+class SessionMemo:
+    """
+    A session's enhancement results keyed by a fingerprint of their inputs (see functions.py),
+    so items the user hasn't changed since they were last enhanced aren't sent to the LLM again.
+    Outputs are anything JSON-serialisable.
+    """
+
+    def __init__(self, store, session_id):
+        self.store = store
+        self.session_id = session_id
+
+    def get_many(self, fingerprints):
+        """Returns {fingerprint: output} for the fingerprints the session has a result for."""
+        found = {}
+        missing = []
+        for fingerprint in set(fingerprints):
+            cached = self.store.memo_memory.get((self.session_id, fingerprint))
+            if cached is not None:
+                found[fingerprint] = json.loads(cached)
+            else:
+                missing.append(fingerprint)
+        for fingerprint, output in self.store.backend.load_memo(self.session_id, missing).items():
+            self.store.memo_memory.set((self.session_id, fingerprint), output)
+            found[fingerprint] = json.loads(output)
+        return found
+
+    def set_many(self, entries):
+        """Records {fingerprint: output} for the session."""
+        encoded = {fingerprint: json.dumps(output) for fingerprint, output in entries.items()}
+        self.store.backend.save_memo(self.session_id, encoded)
+        for fingerprint, output in encoded.items():
+            self.store.memo_memory.set((self.session_id, fingerprint), output)
+
+
+def _backend():
+    return SQLSessionBackend(SESSION_DB_URL) if SESSION_DB_URL else MemorySessionBackend()
+
+
+sessions = SessionStore(_backend())
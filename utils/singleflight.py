@@ -0,0 +1,79 @@
+import threading
+import asyncio
+
+########################################################################################
+#                           SINGLE-FLIGHT CALL COALESCING                              #
+########################################################################################
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key: the first caller runs the function,
+    callers arriving while it is still in flight wait for it and share its result (or exception).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._tasks = {}
+        self._counts = {"calls": 0, "coalesced": 0}
+
+    def do(self, key, fn):
+        """Runs fn() for key, or waits for the identical call already in flight on another thread."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self._counts["coalesced"] += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self._counts["calls"] += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    async def ado(self, key, afn):
+        """
+        Async version of do(). The shared call runs as its own task, so a caller being cancelled
+        (e.g. a client disconnecting) doesn't cancel it for the others.
+        """
+        loop = asyncio.get_running_loop()
+        task_key = (loop, key)
+        with self._lock:
+            task = self._tasks.get(task_key)
+            if task is not None:
+                self._counts["coalesced"] += 1
+            else:
+                task = self._tasks[task_key] = loop.create_task(afn())
+                self._counts["calls"] += 1
+                task.add_done_callback(lambda _: self._forget(task_key))
+        return await asyncio.shield(task)
+
+    def _forget(self, task_key):
+        with self._lock:
+            self._tasks.pop(task_key, None)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counts)
@@ -0,0 +1,42 @@
+from fastapi import HTTPException
+from starlette.responses import PlainTextResponse
+
+########################################################################################
+#                           REQUEST BODY SIZE LIMIT                                    #
+########################################################################################
+
+class MaxBodySizeMiddleware:
+    """
+    ASGI middleware rejecting request bodies larger than max_bytes on the given paths with a 413.
+    A too-large Content-Length is refused before any of the body is read; otherwise the body is
+    counted as it streams in and reading stops as soon as the limit is passed.
+    """
+
+    def __init__(self, app, max_bytes, paths=()):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.paths = tuple(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or (self.paths and scope["path"] not in self.paths):
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope["headers"])
+        content_length = headers.get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > self.max_bytes:
+            response = PlainTextResponse(f"Request body larger than {self.max_bytes} bytes", status_code=413)
+            return await response(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # Raised inside the body parser, which FastAPI turns into the 413 response
+                    raise HTTPException(status_code=413, detail=f"Request body larger than {self.max_bytes} bytes")
+            return message
+
+        await self.app(scope, limited_receive, send)
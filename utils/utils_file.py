@@ -1,53 +1,49 @@
-import re
+import string
 import docx
-from pdfminer.high_level import extract_text
+import utils.pdf_pool
+import utils.docx_text
 import os 
 
-def process_clean_text(text):
-    # Define the regex pattern for special characters
-    pattern = r'[^a-zA-Z0-9\s]'
-
-    # Replace the special characters with whitespace
-    clean_text = re.sub(pattern, ' ', text)
-
-    clean_text = clean_text.strip() 
-
-    final_doc = []
-    for line in clean_text.split("\n"):
-        final_doc.append(" ".join([x.strip() for x in line.split(" ")]))
-
-    clean_text = "\n".join(final_doc)
+# Byte translation table: letters, digits and newlines are kept, every other byte becomes a space
+_KEEP = frozenset((string.ascii_letters + string.digits + "\n").encode("ascii"))
+_CLEAN_TABLE = bytes(byte if byte in _KEEP else ord(" ") for byte in range(256))
 
-    # Define the regex pattern for multiple spaces
-    pattern = r'\s+'
 
-    # Remove multiple spaces in each line of text
-    lines = clean_text.split('\n')
-
-    clean_lines = []
-    for line in lines:
-        clean_line = re.sub(pattern, ' ', line.strip())
-        if clean_line:
-            clean_lines.append(clean_line)
-
-    # Concatenate the cleaned lines into a single string
-    clean_text = '\n'.join(clean_lines)
-
-    return clean_text
-
-def parse_pdf(pdf_file_path):
-    # Extract the text from the PDF file
-    text = extract_text(pdf_file_path)
-    text = process_clean_text(text)
+def process_clean_text(text):
+    """
+    Replaces every character that isn't an ASCII letter or digit with whitespace, collapses
+    whitespace to single spaces, strips each line and drops empty lines.
+    Idempotent, so cleaning already-clean text again returns it unchanged.
+    """
+    # Non-ASCII characters become "?" and then spaces, the same as any other special character
+    data = text.encode("ascii", "replace").translate(_CLEAN_TABLE)
+
+    # Collapse the spaces within each line and drop the lines left empty
+    clean_lines = (b" ".join(line.split()) for line in data.split(b"\n"))
+    return b"\n".join(line for line in clean_lines if line).decode("ascii")
+
+def parse_pdf(pdf_file_path, clean=True):
+    # Extract the text from the PDF file, pages in parallel in the PDF process pool
+    # (clean=False keeps the raw text, e.g. for utils.pre_extract)
+    text = utils.pdf_pool.extract_pdf_text(pdf_file_path)
+    if clean:
+        text = process_clean_text(text)
     return text
 
-def parse_docx(docx_file_path):
-    # Open the docx file
-    doc = docx.Document(docx_file_path)
-    # Extract all paragraphs from the document
-    paragraphs = [para.text for para in doc.paragraphs]
-    text = "\n".join(paragraphs)
-    text = process_clean_text(text)
+def parse_docx(docx_file_path, clean=True):
+    # Stream the paragraphs (tables and text boxes included) out of word/document.xml
+    try:
+        text = utils.docx_text.extract_docx_text(docx_file_path)
+    except utils.docx_text.DocxTextError:
+        # Fall back to python-docx for anything the streaming parser can't read
+        if hasattr(docx_file_path, "seek"):
+            docx_file_path.seek(0)
+        doc = docx.Document(docx_file_path)
+        # Extract all paragraphs from the document
+        paragraphs = [para.text for para in doc.paragraphs]
+        text = "\n".join(paragraphs)
+    if clean:
+        text = process_clean_text(text)
     return text
 
 def convert_filepath_to_json(file_path):